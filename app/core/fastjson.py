@@ -0,0 +1,211 @@
+# app/core/fastjson.py
+"""
+Fast-path JSON for large list responses.
+
+Returning ORM rows with a response_model makes FastAPI validate every row
+into a model instance and serialize it again. For rows we produced
+ourselves that is pure overhead, so list endpoints can instead copy the
+model's fields straight off the rows (RowEncoder) and encode the dicts in
+one call (dumps): orjson when installed, else pydantic-core's encoder,
+which is what response_model would have used and gives identical output
+(UTC datetimes end in "Z", enums and UUIDs as their values).
+
+The response_model stays on the route for the OpenAPI schema; the fast
+path is used unless settings.FAST_JSON is off.
+
+    python -m app.core.fastjson          # serialization benchmark, 10k rows
+
+/analytics/features already bypasses its model: analytics.features_json
+encodes the feature columns directly (the benchmark covers it too).
+"""
+from __future__ import annotations
+import json
+import sys
+from operator import attrgetter
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Type
+
+import pydantic_core
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import AliasChoices, AliasPath, BaseModel
+
+try:  # optional: the fastest encoder
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+_ORJSON_OPTS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+ENCODER = "orjson" if orjson is not None else "pydantic-core"
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode plain data (dicts, lists, datetimes, enums, UUIDs) to compact JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTS)
+    return pydantic_core.to_json(obj)
+
+
+def _source(name: str, field) -> str:
+    alias = field.validation_alias
+    if isinstance(alias, AliasChoices):
+        alias = alias.choices[0]
+    if isinstance(alias, str):
+        return alias
+    if alias is None or isinstance(alias, AliasPath):
+        return field.alias or name
+    return name
+
+
+class RowEncoder:
+    """
+    Dicts shaped like `model` (serialized by alias, as FastAPI does) read
+    directly from ORM rows, without constructing or validating the model.
+    Only for rows that already satisfy it.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        fields = model.model_fields
+        self.model = model
+        self.keys = tuple(f.serialization_alias or f.alias or name for name, f in fields.items())
+        sources = [_source(name, f) for name, f in fields.items()]
+        get = attrgetter(*sources)
+        self._get = get if len(sources) > 1 else (lambda row: (get(row),))
+
+    def rows(self, rows: Iterable[Any]) -> List[Dict[str, Any]]:
+        keys, get = self.keys, self._get
+        return [dict(zip(keys, get(row))) for row in rows]
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def list_response(rows: Iterable[Any], encoder: RowEncoder, response: Optional[Response] = None) -> FastJSONResponse:
+    """
+    A FastJSONResponse of `rows` through `encoder`. Headers that dependencies
+    set on the injected `response` (ETag, ...) are carried over, since FastAPI
+    drops them when an endpoint returns its own Response.
+    """
+    out = FastJSONResponse(encoder.rows(rows))
+    if response is not None:
+        for key, value in response.headers.items():
+            if key not in ("content-length", "content-type"):
+                out.headers[key] = value
+    return out
+
+
+# ---------- benchmark ----------
+
+def _bench(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        best = min(best, perf_counter() - t0)
+    return round(best * 1000, 2)
+
+
+def _feature_columns(n: int, habits: int = 50):
+    """Synthetic FeatureColumns of about n rows (no database needed)."""
+    from datetime import date
+    from types import SimpleNamespace
+
+    from app.services.features import FeatureColumns
+
+    cols = FeatureColumns("bench")
+    for h in range(habits):
+        cols.add_habit(SimpleNamespace(id=h + 1, status="active", difficulty="medium"))
+    base = date(2025, 1, 1).toordinal()
+    for k in range(habits):
+        for d in range(max(1, n // habits)):
+            cols.habit_idx.append(k)
+            cols.day_ordinal.append(base + d)
+            for w, col in cols.rates.items():
+                col.append(((d * 7 + k) % (w + 1)) / (w + 1))
+            cols.current_streak.append(d % 9)
+            for flag in (cols.is_travel, cols.is_exam, cols.is_illness):
+                flag.append(0)
+            cols.context_mask.append(0)
+            cols.slip_7d_flag.append(d % 5 == 0)
+            cols.hour_bucket.append(("morning", "evening", None)[d % 3])
+            q = float("nan") if d % 4 == 0 else 420.0 + d % 60
+            for col in (cols.completion_p10_min, cols.completion_median_min, cols.completion_p90_min):
+                col.append(q)
+    return cols
+
+
+def benchmark(n: int = 10_000, repeat: int = 7) -> Dict[str, Any]:
+    """
+    Best-of-`repeat` milliseconds to serialize n rows per endpoint payload:
+    the response_model path (validate each row into the model, then dump the
+    list) against the fast path, with the stdlib encoder on the same dicts
+    for reference. Features are already encoded straight from their columns.
+    """
+    from datetime import datetime, timedelta, timezone
+    from types import SimpleNamespace
+    from uuid import uuid4
+
+    from pydantic import TypeAdapter
+
+    from app.models.schemas import Difficulty, EventRead, FeaturePublic, HabitRead, HabitStatus
+    from app.services.analytics import features_json
+
+    t0 = datetime(2025, 9, 1, tzinfo=timezone.utc)
+    uid = str(uuid4())
+    samples = {
+        "events": (EventRead, [
+            SimpleNamespace(id=i, habit_id=i % 50, occurred_at_utc=t0 + timedelta(minutes=7 * i),
+                            created_at=t0 + timedelta(minutes=7 * i, seconds=3))
+            for i in range(n)
+        ]),
+        "habits": (HabitRead, [
+            SimpleNamespace(id=i, user_id=uid, name=f"habit {i}", difficulty=Difficulty.medium,
+                            status=HabitStatus.active)
+            for i in range(n)
+        ]),
+    }
+    out: Dict[str, Any] = {"rows": n, "encoder": ENCODER}
+    for label, (model, rows) in samples.items():
+        adapter = TypeAdapter(List[model])
+        encoder = RowEncoder(model)
+        out[label] = {
+            "response_model_ms": _bench(
+                lambda: adapter.dump_json([model.model_validate(r, from_attributes=True) for r in rows], by_alias=True),
+                repeat,
+            ),
+            "fast_path_ms": _bench(lambda: dumps(encoder.rows(rows)), repeat),
+            "stdlib_json_ms": _bench(
+                lambda: json.dumps(encoder.rows(rows), default=str, separators=(",", ":")).encode(), repeat,
+            ),
+        }
+
+    cols = _feature_columns(n)
+    names = {hid: f"habit {hid}" for hid in cols.habit_ids}
+    plain = json.loads(features_json(cols, names))
+    adapter = TypeAdapter(List[FeaturePublic])
+    out["features"] = {
+        "response_model_ms": _bench(lambda: adapter.dump_json(adapter.validate_python(plain)), repeat),
+        "fast_path_ms": _bench(lambda: features_json(cols, names), repeat),
+        "stdlib_json_ms": _bench(lambda: json.dumps(plain, separators=(",", ":")).encode(), repeat),
+    }
+    return out
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    import argparse
+
+    p = argparse.ArgumentParser(description="Benchmark list-response serialization.")
+    p.add_argument("--rows", type=int, default=10_000)
+    p.add_argument("--repeat", type=int, default=7)
+    args = p.parse_args(argv)
+    json.dump(benchmark(args.rows, args.repeat), sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -8,16 +8,59 @@ class Settings(BaseSettings):
     TIMEZONE: str = "UTC"
 
     # Scheduling
-    REMINDER_CRON: Optional[str] = None   # e.g., "0 9 * * *"
-    REMINDER_INTERVAL_MINUTES: int = 15
+    REMINDER_CRON: Optional[str] = None   # e.g., "0 9 * * *"; set = legacy full scan on this cron
+    REMINDER_INTERVAL_MINUTES: int = 15   # legacy; the reminder wheel replaced interval scans
+    # Reminder wheel (app/services/reminder_wheel.py)
+    REMINDER_LOCAL_TIME: str = "09:00"    # users' local reminder time unless they set their own
+    REMINDER_TICK_SECONDS: int = 60
+    REMINDER_CATCHUP_HOURS: int = 6       # slots missed during downtime fire late within this window
+    # Full-scan cycle (run_reminder_cycle): keyset pages of users on a worker pool
+    REMINDER_BATCH_SIZE: int = 500
+    REMINDER_WORKERS: int = 4
+    REMINDER_CYCLE_BUDGET_SECONDS: int = 600  # slower cycles are logged and flagged in /admin/reminders/cycles
+    REMINDER_DUE_CACHE_USERS: int = 10000     # per-user due sets kept in memory for /users/{id}/reminders
+    # Reminder delivery (app/services/outbox.py)
+    REMINDER_SINK: str = "log"            # "log", "stdout", "file:<path>" or an http(s) webhook URL
+    REMINDER_DISPATCH_SECONDS: int = 10
+    REMINDER_DISPATCH_BATCH: int = 200
+    REMINDER_MAX_ATTEMPTS: int = 5
+    REMINDER_RETRY_BASE_SECONDS: int = 30
+    REMINDER_WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+
+    # List endpoints encode rows directly (app/core/fastjson.py) instead of validating them through response_model
+    FAST_JSON: bool = True
 
     # Optional kill switch
     DISABLE_SCHEDULER: bool = False
+    # Only the holder of the "scheduler" lease runs jobs (one process across uvicorn workers)
+    SCHEDULER_LEASE_SECONDS: int = 30       # a dead holder is replaced this long after its last renewal
+    SCHEDULER_HEARTBEAT_SECONDS: int = 10   # renew / try to acquire this often; keep well below the lease
+    # Background jobs (app/services/jobs.py)
+    JOBS_NIGHTLY_CRON: Optional[str] = "30 3 * * *"   # off-peak, in TIMEZONE; empty = only /admin triggers
+    REMINDER_SENT_RETENTION_DAYS: int = 2     # reminder_sent rows only matter for the current local day
+    REMINDER_OUTBOX_RETENTION_DAYS: int = 14  # delivered / dead outbox rows
+    JOB_RUN_RETENTION_DAYS: int = 30
+    JOBS_RESUME_DELAY_SECONDS: float = 60         # a partial run is queued again this long after it stops
+    JOBS_RESUME_DEADLINE_SECONDS: float = 6 * 3600   # ...until this long after the first run of the chain
 
     # Analytics / Feature Engineering
     # Define "hour buckets" for habits. Format: name=startHour-endHour, comma-separated.
     # Wrap-around supported (e.g., "night=22-5").
     TIME_BUCKETS: str = "morning=5-11,afternoon=11-17,evening=17-22,night=22-5"
+    # Rolling completion-rate windows in days, comma-separated (e.g., "3,7,14,30,90").
+    # 7 and 30 are always computed; they back last_7d / last_30d.
+    FEATURE_WINDOWS: str = "7,30"
+    # /analytics/features page size in (habit, day) rows; requests above the max are clamped
+    FEATURE_PAGE_SIZE: int = 1000
+    FEATURE_MAX_PAGE_SIZE: int = 5000
+    # /analytics/features/export limits; larger exports belong to the CLI (python -m app.services.feature_export)
+    FEATURE_EXPORT_MAX_USERS: int = 100
+    FEATURE_EXPORT_MAX_DAYS: int = 366
+
+    # Analytics execution pool (see app/services/pools.py)
+    ANALYTICS_POOL_KIND: str = "thread"       # "thread" or "process"
+    ANALYTICS_POOL_WORKERS: int = 2
+    ANALYTICS_QUEUE_LIMIT: int = 8            # waiting calls beyond this get 503 + Retry-After
 
     # Pydantic v2 config
     model_config = SettingsConfigDict(
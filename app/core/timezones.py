@@ -0,0 +1,260 @@
+# app/core/timezones.py
+"""
+Timezone conversion used by every service.
+
+- get_zone(): cached zoneinfo registry; None/blank/unknown names fall back to
+  DEFAULT_USER_TZ instead of raising, so a bad stored timezone never breaks a
+  read. That is the one zone every service assumes for a user without a
+  valid timezone (analytics, aggregates, features, streaks, reminders).
+- ZoneTable: the zone's UTC-offset transitions precomputed over
+  [TABLE_START, TABLE_END) (probed daily, then bisected to the second). An
+  offset lookup is one bisect; instants outside the table fall back to
+  zoneinfo itself.
+- Batch APIs over plain numbers: local_epochs / local_day_ordinals turn
+  epoch seconds into local wall-clock seconds / day ordinals, and
+  day_bounds_utc turns local days into half-open UTC [start, next start).
+  Local midnights that fall in a gap or overlap resolve like zoneinfo's
+  fold=0 (the offset in effect before the transition).
+
+Microbenchmark (conversions per second, table vs. datetime.astimezone):
+    python -m app.core.timezones --zone America/New_York --n 200000
+"""
+from __future__ import annotations
+import argparse
+import json
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from time import perf_counter
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+UTC = timezone.utc
+DEFAULT_USER_TZ = "America/Phoenix"      # zone assumed for users without a valid timezone (matches the schema default)
+
+TABLE_START = datetime(1970, 1, 1, tzinfo=UTC)
+TABLE_END = datetime(2070, 1, 1, tzinfo=UTC)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()     # local seconds // DAY_SECONDS + this = date ordinal
+DAY_SECONDS = 86400
+_NEG_INF = -(1 << 62)
+
+ZoneLike = Union[str, ZoneInfo, None]
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str) -> Optional[ZoneInfo]:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def get_zone(tz: ZoneLike, default: str = DEFAULT_USER_TZ) -> ZoneInfo:
+    """Cached ZoneInfo for `tz` (name or ZoneInfo); None/blank/unknown -> `default`."""
+    if isinstance(tz, ZoneInfo):
+        return tz
+    z = _zone(tz.strip()) if tz and tz.strip() else None
+    return z if z is not None else _zone(default)
+
+
+def is_valid_zone(name: str) -> bool:
+    return bool(name) and _zone(name) is not None
+
+
+def _offset(zone: ZoneInfo, epoch: int) -> int:
+    return int(datetime.fromtimestamp(epoch, zone).utcoffset().total_seconds())
+
+
+class ZoneTable:
+    """UTC-offset transition table of one zone: offs[i] applies from trans[i]."""
+    __slots__ = ("zone", "trans", "offs", "_lo", "_hi")
+
+    def __init__(self, zone: ZoneInfo):
+        self.zone = zone
+        lo, hi = int(TABLE_START.timestamp()), int(TABLE_END.timestamp())
+        trans = [_NEG_INF]
+        offs = [_offset(zone, lo)]
+        prev = offs[0]
+        t = lo
+        while t < hi:
+            nxt = t + DAY_SECONDS
+            off = _offset(zone, nxt)
+            if off != prev:
+                a, b = t, nxt                      # offset changes in (a, b]: bisect to the second
+                while b - a > 1:
+                    mid = (a + b) // 2
+                    if _offset(zone, mid) == prev:
+                        a = mid
+                    else:
+                        b = mid
+                trans.append(b)
+                offs.append(off)
+                prev = off
+            t = nxt
+        self.trans = array("q", trans)
+        self.offs = array("l", offs)
+        self._lo, self._hi = lo, hi
+
+    def offset_at(self, epoch: float) -> int:
+        """UTC offset in seconds at UTC epoch second `epoch`."""
+        if not self._lo <= epoch < self._hi:
+            return _offset(self.zone, int(epoch // 1))
+        return self.offs[bisect_right(self.trans, epoch) - 1]
+
+    def local_epochs(self, epochs: Iterable[float]) -> array:
+        """Local wall-clock seconds (epoch + offset) for each UTC epoch."""
+        out = array("q")
+        append = out.append
+        trans, offs, lo, hi = self.trans, self.offs, self._lo, self._hi
+        if len(offs) == 1:                      # fixed-offset zone
+            off = offs[0]
+            for e in epochs:
+                e = int(e // 1)
+                append(e + off if lo <= e < hi else e + _offset(self.zone, e))
+            return out
+        # Timestamps arrive clustered, so the last period found usually matches
+        start, end, off = 0, -1, 0
+        last = len(trans) - 1
+        for e in epochs:
+            e = int(e // 1)
+            if not start <= e < end:
+                if not lo <= e < hi:
+                    append(e + _offset(self.zone, e))
+                    continue
+                i = bisect_right(trans, e) - 1
+                start, off = trans[i], offs[i]
+                end = trans[i + 1] if i < last else hi
+            append(e + off)
+        return out
+
+    def utc_of_local(self, local: int) -> int:
+        """UTC epoch of local wall-clock second `local` (fold=0 in gaps/overlaps)."""
+        if not self._lo + DAY_SECONDS * 2 <= local < self._hi - DAY_SECONDS * 2:
+            wall = datetime(1970, 1, 1) + timedelta(seconds=local)
+            return int(wall.replace(tzinfo=self.zone).timestamp())
+        trans, offs = self.trans, self.offs
+        i = max(0, bisect_right(trans, local - 26 * 3600) - 1)   # no zone is more than 26h off UTC
+        last = len(trans) - 1
+        while True:
+            u = local - offs[i]
+            if u < trans[i]:               # skipped wall time: use the pre-transition offset
+                return local - offs[i - 1]
+            if i == last or u < trans[i + 1]:
+                return u
+            i += 1
+
+
+@lru_cache(maxsize=None)
+def _table(zone: ZoneInfo) -> ZoneTable:
+    return ZoneTable(zone)
+
+
+def zone_table(tz: ZoneLike, default: str = DEFAULT_USER_TZ) -> ZoneTable:
+    """Cached transition table for a zone (built on first use)."""
+    return _table(get_zone(tz, default))
+
+
+def epoch_seconds(ts: datetime) -> float:
+    """UTC epoch seconds of an aware (or naive-UTC) datetime."""
+    return (ts if ts.tzinfo is not None else ts.replace(tzinfo=UTC)).timestamp()
+
+
+# ---------- batch APIs ----------
+
+def local_epochs(epochs: Iterable[float], tz: ZoneLike) -> array:
+    """UTC epoch seconds -> local wall-clock seconds since 1970-01-01 00:00 local."""
+    return zone_table(tz).local_epochs(epochs)
+
+
+def local_day_ordinals(epochs: Iterable[float], tz: ZoneLike) -> array:
+    """UTC epoch seconds -> local calendar day as date ordinals."""
+    return array("l", (s // DAY_SECONDS + EPOCH_ORDINAL for s in zone_table(tz).local_epochs(epochs)))
+
+
+def local_days(timestamps: Iterable[datetime], tz: ZoneLike) -> List[date]:
+    """Aware (or naive-UTC) datetimes -> local calendar days."""
+    return [date.fromordinal(o) for o in local_day_ordinals(map(epoch_seconds, timestamps), tz)]
+
+
+def day_bounds_utc(days: Iterable[date], tz: ZoneLike) -> List[Tuple[datetime, datetime]]:
+    """Local days -> UTC [local midnight, next local midnight) pairs."""
+    table = zone_table(tz)
+    out = []
+    for d in days:
+        local = (d.toordinal() - EPOCH_ORDINAL) * DAY_SECONDS
+        out.append((
+            datetime.fromtimestamp(table.utc_of_local(local), UTC),
+            datetime.fromtimestamp(table.utc_of_local(local + DAY_SECONDS), UTC),
+        ))
+    return out
+
+
+# ---------- single-value helpers ----------
+
+def local_day(ts: datetime, tz: ZoneLike) -> date:
+    return date.fromordinal(int(local_day_ordinals((epoch_seconds(ts),), tz)[0]))
+
+
+def day_bounds(d: date, tz: ZoneLike) -> Tuple[datetime, datetime]:
+    return day_bounds_utc((d,), tz)[0]
+
+
+def to_local(ts: datetime, tz: ZoneLike) -> datetime:
+    """Aware local datetime (naive input is taken as UTC)."""
+    return (ts if ts.tzinfo is not None else ts.replace(tzinfo=UTC)).astimezone(get_zone(tz))
+
+
+def localize(wall: datetime, tz: ZoneLike) -> datetime:
+    """Attach `tz` to a naive local wall time (fold=0) and return it in UTC."""
+    return wall.replace(tzinfo=get_zone(tz)).astimezone(UTC)
+
+
+# ---------- microbenchmark ----------
+
+def benchmark(zone: str = "America/New_York", n: int = 200_000) -> dict:
+    """Conversions per second: batch table lookups vs. per-item datetime.astimezone."""
+    z = get_zone(zone)
+    t0 = perf_counter()
+    zone_table(z)
+    build = perf_counter() - t0
+
+    start = int(datetime(2020, 1, 1, tzinfo=UTC).timestamp())
+    step = (int(datetime(2030, 1, 1, tzinfo=UTC).timestamp()) - start) // n
+    epochs = [start + i * step for i in range(n)]
+    stamps = [datetime.fromtimestamp(e, UTC) for e in epochs]
+    days = [date(2020, 1, 1) + timedelta(days=i % 3650) for i in range(n // 10)]
+
+    t = perf_counter()
+    fast = local_day_ordinals(epochs, z)
+    table_s = perf_counter() - t
+    t = perf_counter()
+    slow = [s.astimezone(z).date().toordinal() for s in stamps]
+    naive_s = perf_counter() - t
+    assert list(fast) == slow
+    t = perf_counter()
+    day_bounds_utc(days, z)
+    bounds_s = perf_counter() - t
+
+    return {
+        "zone": zone,
+        "n": n,
+        "transitions": len(zone_table(z).trans) - 1,
+        "table_build_ms": round(build * 1000, 1),
+        "local_day_per_sec": round(n / table_s),
+        "astimezone_per_sec": round(n / naive_s),
+        "day_bounds_per_sec": round(len(days) / bounds_s),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Timezone conversion microbenchmark.")
+    p.add_argument("--zone", default="America/New_York")
+    p.add_argument("--n", type=int, default=200_000)
+    args = p.parse_args(argv)
+    print(json.dumps(benchmark(args.zone, args.n)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
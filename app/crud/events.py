@@ -1,26 +1,25 @@
 # app/crud/events.py
 from typing import Optional, List
-from datetime import datetime, timezone
-from zoneinfo import ZoneInfo
+from datetime import datetime
 
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from fastapi import HTTPException, status
 
+from app.core.timezones import UTC, ZoneLike, localize
 from app.db import EventORM, HabitORM
 from app.models.schemas import HabitStatus
 
 
-def _to_utc_for_user(input_dt: datetime, user_tz: ZoneInfo) -> datetime:
+def _to_utc_for_user(input_dt: datetime, user_tz: ZoneLike) -> datetime:
     """
     Convert an incoming 'occurred_at' to the correct UTC instant:
     - If input has tzinfo, convert to UTC.
     - If input is naive, interpret it as user-local (user_tz) then convert to UTC.
     """
     if input_dt.tzinfo is None:
-        local = input_dt.replace(tzinfo=user_tz)  # localize first
-        return local.astimezone(timezone.utc)
-    return input_dt.astimezone(timezone.utc)
+        return localize(input_dt, user_tz)
+    return input_dt.astimezone(UTC)
 
 
 def create(
@@ -44,10 +43,8 @@ def create(
             detail="Habit is paused; events not allowed",
         )
 
-    tz = ZoneInfo(user_tz or "UTC")
-
     # Single source of truth for the UTC instant
-    occurred_utc = _to_utc_for_user(occurred_at, tz)
+    occurred_utc = _to_utc_for_user(occurred_at, user_tz)
 
     # Idempotence: one event per user-local calendar day
     # local_date = occurred_utc.astimezone(tz).date()
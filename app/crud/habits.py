@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
 from app.db import HabitORM
+from app.services import rollups
 from app.models.schemas import Difficulty, HabitStatus, HabitCreate, HabitPatch
 
 def _canon(s: str) -> str:
@@ -102,6 +103,8 @@ def delete(db: Session, *, habit_id: int, user_id) -> bool:
     habit = get(db, habit_id=habit_id, user_id=owner)
     if not habit:
         return False
+    # per-habit aggregate rows cascade; the user-level rollup totals lose this habit's share
+    rollups.forget_habit(db, habit.id, owner)
     db.delete(habit)
     db.commit()
     return True
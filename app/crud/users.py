@@ -6,6 +6,7 @@ from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
 from app.db import UserORM
+from app.services import aggregates
 
 def _conflict(detail: str):
     raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
@@ -29,10 +30,14 @@ def replace(db: Session, user_id: str, data: Dict[str, Any]) -> Optional[UserORM
     user = db.get(UserORM, user_id)
     if not user:
         return None
+    tz_before = user.timezone
     user.name = data["name"]
     user.email = data["email"]
     user.timezone = data.get("timezone")
     try:
+        if user.timezone != tz_before:
+            # local-time aggregates were bucketed in the old zone
+            aggregates.rebuild_user(db, user_id)
         db.commit()
     except IntegrityError:
         db.rollback(); _conflict("Email already exists.")
@@ -43,9 +48,12 @@ def patch(db: Session, user_id: str, data: Dict[str, Any]) -> Optional[UserORM]:
     user = db.get(UserORM, user_id)
     if not user:
         return None
+    tz_before = user.timezone
     for k, v in data.items():
         setattr(user, k, v)
     try:
+        if user.timezone != tz_before:
+            aggregates.rebuild_user(db, user_id)
         db.commit()
     except IntegrityError:
         db.rollback(); _conflict("Email already exists.")
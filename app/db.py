@@ -6,7 +6,7 @@ from typing import Optional
 from uuid import uuid4
 from datetime import datetime, timezone
 from sqlalchemy import ( 
-    ForeignKey, Integer, Text,  Enum as SAEnum, JSON, Date, CheckConstraint, Index, create_engine, String, DateTime, func,  TypeDecorator, event, UniqueConstraint
+    ForeignKey, Integer, Text,  Enum as SAEnum, JSON, Date, Boolean, Float, CheckConstraint, Index, create_engine, String, DateTime, func,  TypeDecorator, event, UniqueConstraint
 )
 from enum import Enum 
 from sqlalchemy.orm import relationship, DeclarativeBase, Mapped, mapped_column, sessionmaker
@@ -177,4 +177,248 @@ class ContextORM(Base):
     __table_args__ = (
         CheckConstraint("(end_utc IS NULL) OR (end_utc > start_utc)", name="ck_contexts_end_after_start"),
         Index("ix_contexts_user_window", "user_id", "start_utc", "end_utc"),
-    )
\ No newline at end of file
+    )
+
+class HabitHourCountORM(Base):
+    """
+    Completion counters by local hour-of-week, maintained on event insert.
+    One row per (habit, local ISO week, slot) where slot = weekday*24 + hour,
+    so any window of whole or partial weeks folds into a 7×24 grid.
+    """
+    __tablename__ = "habit_hour_counts"
+
+    habit_id: Mapped[int] = mapped_column(
+        ForeignKey("habits.id", ondelete="CASCADE"), primary_key=True
+    )
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True)   # local Monday
+    slot: Mapped[int] = mapped_column(Integer, primary_key=True)       # 0..167
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class HabitRollupORM(Base):
+    """
+    Completed local days per habit, rolled up day → ISO week → month → year.
+    period_start is the first local day of the period (Monday for weeks).
+    """
+    __tablename__ = "habit_rollups"
+
+    habit_id: Mapped[int] = mapped_column(
+        ForeignKey("habits.id", ondelete="CASCADE"), primary_key=True
+    )
+    level: Mapped[str] = mapped_column(String(8), primary_key=True)    # day|week|month|year
+    period_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    completions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class UserRollupORM(Base):
+    """Same rollups summed over all of a user's habits."""
+    __tablename__ = "user_rollups"
+
+    user_id: Mapped[str] = mapped_column(
+        String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    level: Mapped[str] = mapped_column(String(8), primary_key=True)
+    period_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    completions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class HabitTimeSketchORM(Base):
+    """
+    Mergeable histogram of local completion time-of-day per habit, maintained
+    on event insert. period is "all" (lifetime) or an ISO week start
+    ("2025-09-01") so recent windows merge a few weekly rows.
+    """
+    __tablename__ = "habit_time_sketches"
+
+    habit_id: Mapped[int] = mapped_column(
+        ForeignKey("habits.id", ondelete="CASCADE"), primary_key=True
+    )
+    period: Mapped[str] = mapped_column(String(10), primary_key=True)
+    tz: Mapped[str] = mapped_column(String, nullable=False)             # zone the bins were filled in
+    bins: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+
+
+class DailyFeatureORM(Base):
+    """
+    Materialized per-(habit, local day) features with range-independent
+    semantics (streaks run from the habit's first tracked day; time-of-day
+    stats use a trailing 31-day window). Filled by services.feature_store.
+    """
+    __tablename__ = "daily_features"
+
+    habit_id: Mapped[int] = mapped_column(
+        ForeignKey("habits.id", ondelete="CASCADE"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    completed: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    last_7d_rate: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    last_30d_rate: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    current_streak: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    miss_streak: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    median_hour: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)   # bucketed at read time
+    completion_p10_min: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    completion_median_min: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    completion_p90_min: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    window_rates: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)  # {"<days>": rate}
+    is_travel: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    is_exam: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    is_illness: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    context_tags: Mapped[list] = mapped_column(JSON, nullable=False, default=list)  # "custom" + its tags
+
+
+class FeatureWatermarkORM(Base):
+    """
+    High-water mark of daily_features per habit: rows exist from the
+    earliest day read (at most back to the first tracked day) through
+    computed_through; dirty_from marks the earliest day
+    a backfilled event or context change invalidated.
+    """
+    __tablename__ = "feature_watermarks"
+
+    habit_id: Mapped[int] = mapped_column(
+        ForeignKey("habits.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Mapped[str] = mapped_column(
+        String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    tz: Mapped[str] = mapped_column(String, nullable=False)             # zone local days were cut in
+    windows: Mapped[str] = mapped_column(String, nullable=False, default="7,30")  # FEATURE_WINDOWS rows were built with
+    computed_through: Mapped[date] = mapped_column(Date, nullable=False)
+    dirty_from: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+
+
+class ForecastModelORM(Base):
+    """
+    Logistic-regression completion model (P(completed on d+1 | features of d)).
+    The newest active row is served; see services.forecast.
+    """
+    __tablename__ = "forecast_models"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    features: Mapped[list] = mapped_column(JSON, nullable=False)         # names, in coefficient order
+    intercept: Mapped[float] = mapped_column(Float, nullable=False)
+    coefficients: Mapped[list] = mapped_column(JSON, nullable=False)
+    metrics: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(UTCDateTime(), default=utcnow, nullable=False)
+
+
+class ReminderScheduleORM(Base):
+    """
+    Per-user reminder slot: local_minute past local midnight (NULL = the
+    REMINDER_LOCAL_TIME default) and the last local day a reminder fired,
+    so restarts neither repeat nor silently skip a slot.
+    """
+    __tablename__ = "reminder_schedules"
+
+    user_id: Mapped[str] = mapped_column(
+        String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    local_minute: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    last_fired_on: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), default=utcnow, onupdate=utcnow, nullable=False, index=True
+    )
+
+
+class ReminderOutboxORM(Base):
+    """
+    Reminders waiting for (or done with) delivery; one row per habit and
+    local day. Filled by the reminder cycle/wheel, drained by
+    services.outbox.dispatch.
+    """
+    __tablename__ = "reminder_outbox"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[str] = mapped_column(
+        String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    habit_id: Mapped[int] = mapped_column(ForeignKey("habits.id", ondelete="CASCADE"), nullable=False)
+    local_day: Mapped[date] = mapped_column(Date, nullable=False)
+    habit_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    status: Mapped[str] = mapped_column(String(10), nullable=False, default="pending")   # pending | sent | dead
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(UTCDateTime(), default=utcnow, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(UTCDateTime(), default=utcnow, nullable=False)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(UTCDateTime(), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("habit_id", "local_day", name="uq_reminder_outbox_habit_day"),
+        Index("ix_reminder_outbox_due", "status", "next_attempt_at"),
+    )
+
+
+class ReminderSentORM(Base):
+    """
+    Habits already notified per local day: the reminder cycle skips them
+    with a primary-key lookup instead of re-detecting them every run.
+    """
+    __tablename__ = "reminder_sent"
+
+    habit_id: Mapped[int] = mapped_column(
+        ForeignKey("habits.id", ondelete="CASCADE"), primary_key=True
+    )
+    local_day: Mapped[date] = mapped_column(Date, primary_key=True)
+    user_id: Mapped[str] = mapped_column(
+        String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    sent_at: Mapped[datetime] = mapped_column(UTCDateTime(), default=utcnow, nullable=False)
+
+
+class SchedulerLeaseORM(Base):
+    """
+    Named leases (one row per role, e.g. "scheduler"): the holder keeps the
+    role while it renews before expires_at; anyone may take an expired lease.
+    See services.leases.
+    """
+    __tablename__ = "scheduler_leases"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(200), nullable=False)
+    acquired_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
+    renewed_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
+
+
+class JobRunORM(Base):
+    """One run of a background job (services.jobs): when, how it ended, how much it did."""
+    __tablename__ = "job_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job: Mapped[str] = mapped_column(String(50), nullable=False)
+    trigger: Mapped[str] = mapped_column(String(20), nullable=False)       # schedule | admin | manual
+    status: Mapped[str] = mapped_column(String(10), nullable=False)        # running | ok | partial | error
+    started_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(UTCDateTime(), nullable=True)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cursor: Mapped[Optional[str]] = mapped_column(Text, nullable=True)     # where a partial run stopped
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_job_runs_job", "job", "id"),
+    )
+
+
+class UserDataVersionORM(Base):
+    """
+    Counter bumped in the same transaction as every write to a user's data
+    (services.versions); user-scoped GETs derive their ETags from it. The
+    row with user_id "*" versions data shared by everyone (forecast models).
+    """
+    __tablename__ = "user_data_versions"
+
+    user_id: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class AggregateBackfillORM(Base):
+    """
+    Insert-maintained aggregates (services.aggregates) already replayed from
+    the events that predate them; one row per aggregate name.
+    """
+    __tablename__ = "aggregate_backfills"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    events: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    done_at: Mapped[datetime] = mapped_column(UTCDateTime(), default=utcnow, nullable=False)
@@ -0,0 +1,71 @@
+# app/etags.py
+"""
+Conditional GETs for user-scoped reads.
+
+`Depends(user_etag)` computes a strong ETag from what the response is a
+function of: the requested user(s)' data versions (app.services.versions),
+the shared "*" version, the user's local day (streaks, "this week" and
+forecasts roll over at midnight without any write) and the URL. A matching
+If-None-Match is answered 304 right there, after one primary-key read and
+before the endpoint runs any query or computation; otherwise the tag is set
+on the response. Endpoints that build their own Response take the tag as
+the dependency's value and copy it into their headers.
+"""
+from __future__ import annotations
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_user
+from app.core.timezones import get_zone, local_day
+from app.db import get_db
+from app.services.versions import data_versions
+
+CACHE_CONTROL = "private, no-cache"     # clients may keep a copy but must revalidate
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """RFC 9110 If-None-Match: "*" or any listed tag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == tag for t in if_none_match.split(","))
+
+
+def etag_dependency(extra: Optional[Callable[[Request], str]] = None):
+    """
+    Build a conditional-GET dependency. `extra(request)` adds whatever else
+    the response depends on (e.g. the clock, for "active right now" lists).
+    The users are the `user_id` query parameter(s) when given, else the
+    current user.
+    """
+    def user_etag(
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_db),
+        current_user: Any = Depends(get_current_user),
+    ) -> str:
+        user_ids = sorted(set(request.query_params.getlist("user_id"))) or [str(current_user.id)]
+        now = datetime.now(timezone.utc)
+        versions, shared = data_versions(db, user_ids)
+        parts = [request.url.path, str(request.query_params), str(shared)]
+        for uid in user_ids:
+            version, tz_name = versions.get(uid, (0, None))
+            parts.append(f"{uid}:{version}:{local_day(now, get_zone(tz_name)).isoformat()}")
+        if extra is not None:
+            parts.append(extra(request))
+        tag = '"' + hashlib.blake2b("|".join(parts).encode(), digest_size=12).hexdigest() + '"'
+        headers = {"ETag": tag, "Cache-Control": CACHE_CONTROL}
+        if matches(request.headers.get("if-none-match"), tag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return tag
+
+    return user_etag
+
+
+user_etag = etag_dependency()
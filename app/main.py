@@ -4,12 +4,21 @@ from app.auth import router as auth_router
 from contextlib import asynccontextmanager
 from app.db import Base, engine
 from app.services.scheduler import start_scheduler, shutdown_scheduler
+from app.services.pools import shutdown_pools
+from app.services.jobs import shutdown_jobs
+from app.services import aggregates
+from app.services import hour_counts, rollups, sketches, feature_store  # noqa: F401  (register insert-maintained aggregates)
 import logging
 
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Create tables on startup. FastAPI skips @on_event handlers when a lifespan
+    # is given, so this has to live here for new tables to reach app.db.
+    Base.metadata.create_all(bind=engine)
+    # Replay events that predate the aggregates (once per aggregate) before serving them
+    aggregates.backfill_on_startup(engine)
     # start once
     start_scheduler(app)
     try:
@@ -17,15 +26,12 @@ async def lifespan(app: FastAPI):
     finally:
         # clean stop
         shutdown_scheduler(app)
+        shutdown_pools()
+        shutdown_jobs()
 
 # ✅ add lifespan here; keep your title
 app = FastAPI(title="Habitica Data Journal (MVP)", lifespan=lifespan)
 
-# Create tables on startup (this can stay as an event alongside lifespan)
-@app.on_event("startup")
-def startup_create_tables():
-    Base.metadata.create_all(bind=engine)
-
 # Routers
 app.include_router(admin.router)
 app.include_router(users.router)
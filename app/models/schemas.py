@@ -1,11 +1,11 @@
 # app/models/schemas.py
 from __future__ import annotations
 from pydantic import BaseModel, Field, ConfigDict, EmailStr, field_validator, AliasChoices
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
 from datetime import datetime, date, timezone
 from uuid import UUID
 from enum import Enum
-from zoneinfo import ZoneInfo
+from app.core.timezones import is_valid_zone
 from typing import Literal
 
 
@@ -69,9 +69,7 @@ class HabitPatch(BaseModel):
     def validate_timezone_optional(cls, v: Optional[str]) -> Optional[str]:
         if v is None:
             return v
-        try:
-            ZoneInfo(v)
-        except Exception:
+        if not is_valid_zone(v):
             raise ValueError("Invalid IANA timezone string")
         return v
 
@@ -81,6 +79,20 @@ class Streak(BaseModel):
     max: int
     last_completed: Optional[date]
 
+# ---------- Forecast ----------
+class HabitForecast(BaseModel):
+    habit_id: int
+    habit_name: str
+    completed_today: bool
+    p_today: float          # probability of a completion on the user's local today
+    p_tomorrow: float
+
+class Forecast(BaseModel):
+    user_id: str
+    today: date             # user-local
+    model_version: int      # 0 = built-in default coefficients
+    habits: List[HabitForecast]
+
 # ---------- Events ----------
 class EventCreate(BaseModel):
     # Accept either 'occurred_at_utc' (tests/reminders) OR 'occurred_at' (your other tests)
@@ -130,6 +142,17 @@ class ReminderDue(BaseModel):
     habit_id: int
     habit_name: str
 
+class ReminderTimeIn(BaseModel):
+    # Local wall time; null resets to the REMINDER_LOCAL_TIME default
+    local_time: Optional[str] = Field(None, pattern=r"^([01]\d|2[0-3]):[0-5]\d$")
+
+class ReminderSchedule(BaseModel):
+    user_id: str
+    local_time: str
+    is_default: bool
+    timezone: str
+    next_fire_utc: datetime
+
 class ContextFlags(BaseModel):
     travel: bool
     exam: bool
@@ -142,6 +165,8 @@ class FeatureContext(BaseModel):
     travel: bool
     exam: bool
     illness: bool
+    custom: bool = False
+    tags: List[str] = Field(default_factory=list)   # tags of active custom contexts
 
 # public response row (use this in response_model)
 class FeaturePublic(BaseModel):
@@ -158,4 +183,8 @@ class FeaturePublic(BaseModel):
     median_completion_bucket: Optional[str] = None
     context: FeatureContext
     slip: bool
+    completion_time_p10: Optional[str] = None       # "HH:MM" local
+    completion_time_median: Optional[str] = None
+    completion_time_p90: Optional[str] = None
+    window_rates: Optional[Dict[str, float]] = None  # FEATURE_WINDOWS rates keyed "<days>d"
 
@@ -1,13 +1,90 @@
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
 
 from app.db import get_db
-from app.services.reminders import run_reminder_cycle
+from app.services import aggregates
+from app.services.outbox import dispatch, outbox_counts
+from app.services.jobs import get_runner, job_overview, job_runs
+from app.services.leases import current_lease
+from app.services.pools import pool_stats
+from app.services.reminders import cycle_stats, due_cache_stats, run_reminder_cycle
+from app.services.scheduler import LEASE_NAME
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+@router.get("/scheduler")
+def get_scheduler_lease(request: Request, db: Session = Depends(get_db)):
+    """Which process holds the scheduler lease, and whether it is this one."""
+    leader = getattr(request.app.state, "scheduler", None)
+    return {
+        "lease": current_lease(db, LEASE_NAME),
+        "this_process": None if leader is None else {"holder": leader.holder, "is_leader": leader.is_leader},
+    }
+
 @router.post("/reminders/run-once")
 def run_reminders_once(db: Session = Depends(get_db)):
     count = run_reminder_cycle(db, datetime.now(timezone.utc))
     return {"checked": count}
+
+@router.get("/reminders/cycles")
+def get_reminder_cycles():
+    """Duration of recent full reminder cycles against their budget, plus skipped runs."""
+    return cycle_stats()
+
+@router.get("/reminders/due-cache")
+def get_reminder_due_cache():
+    """Size and hit/miss counts of the per-user due-set cache behind /users/{id}/reminders."""
+    return due_cache_stats()
+
+@router.get("/reminders/outbox")
+def get_reminder_outbox(db: Session = Depends(get_db)):
+    """Outbox rows by delivery status."""
+    return outbox_counts(db)
+
+@router.post("/reminders/outbox/dispatch")
+def dispatch_reminder_outbox(db: Session = Depends(get_db)):
+    """Drain the outbox now; returns delivery stats (messages/s included)."""
+    return dispatch(db)
+
+@router.post("/aggregates/rebuild")
+def rebuild_aggregates(
+    user_id: Optional[str] = Query(None, description="Only this user; defaults to everyone"),
+    db: Session = Depends(get_db),
+):
+    """Replay events into the insert-maintained aggregates (backfill / repair)."""
+    if user_id:
+        replayed = aggregates.rebuild_user(db, user_id)
+    else:
+        replayed = aggregates.rebuild_all(db)
+    db.commit()
+    return {"aggregates": aggregates.registered(), "events_replayed": replayed}
+
+@router.get("/pools")
+def get_pools():
+    """Queue depth, admission and wait-time stats for each execution pool."""
+    return pool_stats()
+
+@router.get("/jobs")
+def list_jobs(db: Session = Depends(get_db)):
+    """Registered background jobs by priority, with their budget and last run."""
+    return job_overview(db)
+
+@router.get("/jobs/runs")
+def list_job_runs(
+    job: Optional[str] = Query(None, description="Only this job"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """Run history, newest first: start, end, status, rows processed, error."""
+    return job_runs(db, name=job, limit=limit)
+
+@router.post("/jobs/{name}/run", status_code=status.HTTP_202_ACCEPTED)
+def trigger_job(name: str):
+    """Queue a job on this process's job runner; it runs in the background."""
+    try:
+        queued = get_runner().submit(name, trigger="admin")
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown job: {name}")
+    return {"job": name, "queued": queued}
@@ -1,20 +1,27 @@
 # app/routers/analytics.py
 from __future__ import annotations
-from dataclasses import asdict, is_dataclass  # NEW
+import os
 from datetime import date
-from typing import Any, Optional, List        # MOD
+from typing import Any, Callable, Optional, List
 
-from fastapi import APIRouter, Depends, Query, HTTPException  # MOD
-from sqlalchemy.orm import Session                              # NEW
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 
 from app.auth import get_current_user
-from app.services.analytics import weekly_completion, habit_heatmap, slip_detector
-from app.services.features import build_daily_features                # NEW
-from app.models.schemas import FeaturePublic           # NEW
-from app.db import get_db, HabitORM                                     # NEW  (adjust path if yours differs)
+from app.etags import CACHE_CONTROL, user_etag
+from app.core.settings import settings
+from app.services.analytics import (
+    weekly_completion, habit_heatmap, slip_detector, completion_trend, daily_features_page, dashboard,
+)
+from app.services.feature_export import export_npz_file
+from app.services.feature_store import decode_cursor, encode_cursor
+from app.services.forecast import user_forecast
+from app.services.pools import get_pool, PoolSaturated
+from app.models.schemas import FeaturePublic, Forecast
 
-router = APIRouter(prefix="/analytics", tags=["analytics"])
-DOW3 = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+# Every read here is user-scoped: ETag / If-None-Match (304) before any work
+router = APIRouter(prefix="/analytics", tags=["analytics"], dependencies=[Depends(user_etag)])
 
 def _user_id_from(current_user: Any) -> str:
     """Extract a user id from model/namespace/dict without assuming type."""
@@ -25,96 +32,171 @@ def _user_id_from(current_user: Any) -> str:
     raise ValueError("current_user has no 'id' field")
 
 
+async def _run(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run an analytics service call on the dedicated analytics pool instead of
+    Starlette's shared thread pool; a full queue answers 503 + Retry-After.
+    """
+    try:
+        return await get_pool("analytics").run(fn, *args, **kwargs)
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Analytics is busy; retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 # ---------------- NEW: /analytics/features ----------------
 
 @router.get(
     "/features",
     response_model=List[FeaturePublic],
-    summary="Per-day habit feature rows",
+    summary="Per-day habit feature rows, paged by (habit_id, day)",
 )
-def get_features(
+async def get_features(
+    request: Request,
     start: date = Query(..., description="Inclusive start date (YYYY-MM-DD, local to user)"),
     end: date = Query(..., description="Inclusive end date (YYYY-MM-DD, local to user)"),
     user_id: Optional[str] = Query(
         None,
         description="Optional user UUID string to filter results; defaults to current user."
     ),
-    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(
+        None, ge=1, description="Rows per page; defaults to FEATURE_PAGE_SIZE, capped at FEATURE_MAX_PAGE_SIZE."
+    ),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     current_user: Any = Depends(get_current_user),
+    etag: str = Depends(user_etag),
 ):
+    """
+    Rows come in (habit_id, day) order. When more follow, the response carries
+    an X-Next-Cursor header (and a Link rel="next") to pass back as `cursor`.
+    """
     if start > end:
         raise HTTPException(status_code=400, detail="`start` must be <= `end`")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    page_size = min(limit or settings.FEATURE_PAGE_SIZE, settings.FEATURE_MAX_PAGE_SIZE)
 
     effective_user_id = user_id or _user_id_from(current_user)
-
-    # Build internal rows (dataclasses)
-    rows = build_daily_features(
-        db=db,
-        user_id=effective_user_id,
-        start=start,
-        end=end,
+    # Encoded straight from the feature columns; response_model documents the shape
+    body, next_cursor = await _run(daily_features_page, str(effective_user_id), start, end, limit=page_size, after=after)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if next_cursor is not None:
+        token = encode_cursor(next_cursor)
+        headers["X-Next-Cursor"] = token
+        headers["Link"] = f'<{request.url.include_query_params(cursor=token)}>; rel="next"'
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/features/export", summary="Feature rows as a compressed NumPy .npz")
+async def export_features(
+    start: date = Query(..., description="Inclusive start date (YYYY-MM-DD, local to user)"),
+    end: date = Query(..., description="Inclusive end date (YYYY-MM-DD, local to user)"),
+    user_id: Optional[List[str]] = Query(
+        None,
+        description="User UUID(s) to export (repeatable); defaults to current user."
+    ),
+    current_user: Any = Depends(get_current_user),
+    etag: str = Depends(user_etag),
+):
+    """
+    Typed columns chunked by user (see app.services.feature_export for the
+    layout), streamed from a temporary file. At most FEATURE_EXPORT_MAX_USERS
+    users and FEATURE_EXPORT_MAX_DAYS days per request.
+    """
+    if start > end:
+        raise HTTPException(status_code=400, detail="`start` must be <= `end`")
+    if (end - start).days + 1 > settings.FEATURE_EXPORT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Export at most {settings.FEATURE_EXPORT_MAX_DAYS} days per request")
+    users = list(dict.fromkeys(str(u) for u in (user_id or [_user_id_from(current_user)])))
+    if len(users) > settings.FEATURE_EXPORT_MAX_USERS:
+        raise HTTPException(status_code=400, detail=f"Export at most {settings.FEATURE_EXPORT_MAX_USERS} users per request")
+
+    path = await _run(export_npz_file, users, start, end)
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=f"features_{start}_{end}.npz",
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+        background=BackgroundTask(os.unlink, path),
     )
 
-    if not rows:
-        return []
-
-    # Fetch habit names once
-    habit_ids = {r.habit_id for r in rows}
-    name_rows = (
-        db.query(HabitORM.id, HabitORM.name)
-        .filter(HabitORM.id.in_(habit_ids))
-        .all()
-    )
-    habit_name_by_id = {hid: hname for hid, hname in name_rows}
-
-    # Map internal → public
-    out: List[FeaturePublic] = []
-    for r in rows:
-        out.append({
-            "habit_id": r.habit_id,
-            "habit_name": habit_name_by_id.get(r.habit_id, ""),
-            "day": r.day,  # Pydantic will serialize to "YYYY-MM-DD"
-            "dow": DOW3[r.dow],  # 0..6 -> "Mon".."Sun"
-            "last_7d_completion_rate": r.last_7d_rate,
-            "last_30d_completion_rate": r.last_30d_rate,
-            "current_streak": r.current_streak,
-            "median_completion_bucket": r.hour_bucket,
-            "context": {
-                "travel": r.is_travel,
-                "exam": r.is_exam,
-                "illness": r.is_illness,
-            },
-            "slip": r.slip_7d_flag,
-        })
-
-    return out
+@router.get("/forecast", response_model=Forecast, summary="Completion probabilities for today and tomorrow")
+async def get_forecast(
+    user_id: Optional[str] = Query(None, description="User UUID string; defaults to current user."),
+    current_user: Any = Depends(get_current_user),
+):
+    """Every habit of the user, scored in one batch by the stored forecast model."""
+    effective_user_id = user_id or _user_id_from(current_user)
+    return await _run(user_forecast, str(effective_user_id))
 
 # ---------------- Existing endpoints (unchanged) -----------
 
+@router.get("/dashboard")
+async def get_dashboard(
+    buckets: Optional[str] = Query(None, description="Heatmap bucket spec; defaults to TIME_BUCKETS"),
+    threshold: float = Query(0.15, ge=0.0, le=1.0, description="Slip threshold"),
+    current_user: Any = Depends(get_current_user),
+):
+    """Weekly, heatmap, slips and every habit's streak from one shared event load."""
+    user_id = _user_id_from(current_user)
+    try:
+        return await _run(dashboard, user_id, buckets=buckets, slip_threshold=threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid buckets spec: {e}")
+
+
 @router.get("/weekly")
-def get_weekly(
+async def get_weekly(
     start: Optional[date] = Query(None, description="YYYY-MM-DD (local to user)"),
     end: Optional[date] = Query(None, description="YYYY-MM-DD (local to user)"),
     current_user: Any = Depends(get_current_user),
 ):
     """Return weekly completion % for the current user."""
     user_id = _user_id_from(current_user)
-    return weekly_completion(user_id, start, end)
+    return await _run(weekly_completion, user_id, start, end)
+
+
+@router.get("/trend")
+async def get_trend(
+    granularity: str = Query("month", pattern="^(day|week|month|year)$"),
+    start: Optional[date] = Query(None, description="YYYY-MM-DD (local to user)"),
+    end: Optional[date] = Query(None, description="YYYY-MM-DD (local to user)"),
+    habit_id: Optional[int] = Query(None, description="Scope to one habit; defaults to all of the user's habits"),
+    current_user: Any = Depends(get_current_user),
+):
+    """Return completion totals per day/week/month/year, answered from rollups."""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="`start` must be <= `end`")
+    user_id = _user_id_from(current_user)
+    try:
+        return await _run(completion_trend, user_id, start, end, granularity=granularity, habit_id=habit_id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Habit not found")
 
 
 @router.get("/heatmap")
-def get_heatmap(
+async def get_heatmap(
     start: Optional[date] = Query(None, description="YYYY-MM-DD start"),
     end: Optional[date] = Query(None, description="YYYY-MM-DD end"),
+    buckets: Optional[str] = Query(
+        None, description="Optional bucket spec like 'am=0-12,pm=12-24'; defaults to TIME_BUCKETS"
+    ),
     current_user: Any = Depends(get_current_user),
 ):
     """Return heatmap counts for completions grouped by day-of-week × time-bucket."""
     user_id = _user_id_from(current_user)
-    return habit_heatmap(user_id, start, end)
+    try:
+        return await _run(habit_heatmap, user_id, start, end, buckets=buckets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid buckets spec: {e}")
 
 
 @router.get("/slips")
-def get_slips(
+async def get_slips(
     threshold: float = Query(0.15, ge=0.0, le=1.0),
     w7: int = Query(7, ge=1),
     w30: int = Query(30, ge=7),
@@ -122,17 +204,16 @@ def get_slips(
 ):
     """Return habits that are slipping compared to 30-day baseline."""
     user_id = _user_id_from(current_user)
-    return slip_detector(user_id, window_7_days=w7, window_30_days=w30, slip_threshold=threshold)
+    return await _run(slip_detector, user_id, window_7_days=w7, window_30_days=w30, slip_threshold=threshold)
 
 
 # Alias to satisfy tests that call /analytics/slipping
 @router.get("/slipping")
-def get_slipping(
+async def get_slipping(
     threshold: float = Query(0.15, ge=0.0, le=1.0),
     w7: int = Query(7, ge=1),
     w30: int = Query(30, ge=7),
     current_user: Any = Depends(get_current_user),
 ):
     user_id = _user_id_from(current_user)
-    return slip_detector(user_id, window_7_days=w7, window_30_days=w30, slip_threshold=threshold)
-
+    return await _run(slip_detector, user_id, window_7_days=w7, window_30_days=w30, slip_threshold=threshold)
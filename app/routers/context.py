@@ -1,16 +1,25 @@
 from uuid import UUID
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
 
 from app.models import schemas
 from app.db import get_db
 from app import crud
 from app.auth import get_current_user   # make sure this import exists
+from app.etags import etag_dependency
 
 
 router = APIRouter(prefix="/contexts", tags=["contexts"])
 
+
+def _active_clock(request: Request) -> str:
+    # active_only answers change as windows close, without a write: turn the tag over each minute
+    if request.query_params.get("active_only", "").lower() in ("1", "true", "on", "yes"):
+        return datetime.now(timezone.utc).strftime("%Y%m%d%H%M")
+    return ""
+
 @router.post("", response_model=schemas.ContextRead, status_code=status.HTTP_201_CREATED)
 def create_context(
     payload: schemas.ContextCreate,
@@ -20,7 +29,7 @@ def create_context(
     return crud.context.create_context(db, user_id=current_user.id, payload=payload)
 
 # Replace the old users/{user_id} route with a "me" lister that matches tests
-@router.get("", response_model=List[schemas.ContextRead])
+@router.get("", response_model=List[schemas.ContextRead], dependencies=[Depends(etag_dependency(_active_clock))])
 def list_my_contexts(
     active_only: bool = Query(False, description="Only contexts whose window includes 'now'"),
     db: Session = Depends(get_db),
@@ -8,8 +8,11 @@ from app.models import schemas
 from app.db import get_db, HabitORM
 from app.auth import get_current_user
 from app import crud
+from app.core.fastjson import RowEncoder, list_response
+from app.core.settings import settings
 
 router = APIRouter(prefix="/events", tags=["events"])
+_EVENT_ROWS = RowEncoder(schemas.EventRead)
 
 
 
@@ -24,7 +27,7 @@ def log_event(payload: schemas.EventCreate,
         db,
         habit_id=payload.habit_id,
         occurred_at=payload.occurred_at,
-        user_tz=habit.user.timezone or "UTC",
+        user_tz=habit.user.timezone,     # naive times: local to the user (DEFAULT_USER_TZ if unset)
     )
 
 # List events for a habit in a date range (mounted here but path starts with /habits)
@@ -44,4 +47,6 @@ def list_habit_events(
         return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
 
     items = crud.events.list_for_habit(db, habit_id, start=norm(start), end=norm(end), limit=limit, offset=offset)
+    if settings.FAST_JSON:
+        return list_response(items, _EVENT_ROWS)
     return items
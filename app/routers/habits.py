@@ -1,15 +1,20 @@
 from typing import List
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 import os
 from app.auth import get_current_user
+from app.etags import user_etag
 from app.models import schemas
 from app.db import get_db
 from app import crud
+from app.core.fastjson import RowEncoder, list_response
+from app.core.settings import settings
 from app.services.streaks import compute_streaks, NotFound
+from app.services.forecast import forecast_user
 
 router = APIRouter(prefix="/habits", tags=["habits"])
+_HABIT_ROWS = RowEncoder(schemas.HabitRead)
 
 @router.post("/", response_model=schemas.HabitRead, status_code=status.HTTP_201_CREATED)
 def create_habit(
@@ -75,19 +80,23 @@ def get_habit(
 
     raise HTTPException(status_code=404, detail="Habit not found")
 
-@router.get("/users/me", response_model=List[schemas.HabitRead])
+@router.get("/users/me", response_model=List[schemas.HabitRead], dependencies=[Depends(user_etag)])
 def list_my_habits(
+    response: Response,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
     only_active: bool = Query(False),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
 ):
-    return crud.habits.list_by_user(
+    items = crud.habits.list_by_user(
         db, user_id=current_user.id, only_active=only_active, limit=limit, offset=offset
     )
+    if settings.FAST_JSON:
+        return list_response(items, _HABIT_ROWS, response)   # keeps the ETag set by user_etag
+    return items
 
-@router.get("/{habit_id}/streak", response_model=schemas.Streak)
+@router.get("/{habit_id}/streak", response_model=schemas.Streak, dependencies=[Depends(user_etag)])
 def get_habit_streak(
     habit_id: int,  # <-- int
     db: Session = Depends(get_db),
@@ -101,6 +110,18 @@ def get_habit_streak(
     except NotFound:
         raise HTTPException(404, "Habit not found")
 
+@router.get("/{habit_id}/forecast", response_model=schemas.Forecast)
+def get_habit_forecast(
+    habit_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """Probability this habit is completed on the owner's local today and tomorrow."""
+    try:
+        return forecast_user(db, current_user.id, habit_id=habit_id)
+    except LookupError:
+        raise HTTPException(404, "Habit not found")
+
 @router.patch("/{habit_id}", response_model=schemas.HabitRead)
 def patch_habit(
     habit_id: int,  # <-- int
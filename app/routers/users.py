@@ -1,13 +1,12 @@
 # app/routers/users.py
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from app.db import get_db, UserORM, HabitORM, EventORM, ContextORM
-from sqlalchemy import select, and_, exists, literal, not_, or_
-from zoneinfo import ZoneInfo
+from app.db import get_db, UserORM
 from datetime import datetime, timezone
-from app.models.schemas import UserCreate, User, ReminderDue  # Pydantic models
+from app.models.schemas import UserCreate, User, ReminderDue, ReminderSchedule, ReminderTimeIn  # Pydantic models
 from app import crud
-from app.services.reminders import get_due_habits  
+from app.services.reminders import get_due_habits
+from app.services.reminder_wheel import parse_local_time, reminder_schedule, set_reminder_time
 from typing import List
 from uuid import UUID
 router = APIRouter(prefix="/users", tags=["users"])
@@ -24,18 +23,6 @@ def get_user(user_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="user not found")
     return u
 
-def _is_active(status_value) -> bool:
-    """Accepts Enum or str; returns True iff status is 'active'."""
-    try:
-        # If you have the Enum in schemas, this keeps it flexible
-        from app.models.schemas import HabitStatus
-        if isinstance(status_value, HabitStatus):
-            return status_value == HabitStatus.active
-    except Exception:
-        pass
-    return str(status_value).lower() == "active"
-
-
 @router.get(
     "/{user_id}/reminders",
     response_model=List[ReminderDue],
@@ -49,66 +36,32 @@ def list_user_reminders(
     db: Session = Depends(get_db),
 ):
     # SQLite stores PKs as TEXT → cast UUID to str for lookups
-    user_pk = str(user_id)
-    user = db.get(UserORM, user_pk)
+    user = db.get(UserORM, str(user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Normalize 'as_of' to UTC, then compute user's local 'today' bounds
+    # Served from the per-user due-set cache; computed by the cycle's set-based query on a miss
     now_utc = as_of.astimezone(timezone.utc) if as_of else datetime.now(timezone.utc)
-    tz = ZoneInfo(user.timezone or "UTC")
-    local = now_utc.astimezone(tz)
-    start_local = local.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_local = local.replace(hour=23, minute=59, second=59, microsecond=999_999)
-    start_utc = start_local.astimezone(timezone.utc)
-    end_utc = end_local.astimezone(timezone.utc)
-
-    # If ANY context overlaps today for this user, mute all reminders
-    suppressed = (
-        db.execute(
-            select(literal(1)).where(
-                and_(
-                    ContextORM.user_id == user_pk,
-                    ContextORM.start_utc <= end_utc,
-                    or_(ContextORM.end_utc == None, ContextORM.end_utc >= start_utc),
-                )
-            ).limit(1)
-        ).first()
-        is not None
-    )
-    if suppressed:
-        return []
-
-    # Pull this user's habits
-    habits = db.execute(
-        select(HabitORM.id, HabitORM.name, HabitORM.status).where(HabitORM.user_id == user_pk)
-    ).all()
-
-    result: List[ReminderDue] = []
+    return get_due_habits(db, user, now_utc)
 
-    for hid, hname, status_val in habits:
-        if not _is_active(status_val):
-            continue
 
-        # Any event for THIS habit in today's local window?
-        has_event = (
-            db.execute(
-                select(literal(1)).where(
-                    and_(
-                        EventORM.habit_id == hid,
-                        EventORM.occurred_at_utc >= start_utc,
-                        EventORM.occurred_at_utc <= end_utc,
-                    )
-                ).limit(1)
-            ).first()
-            is not None
-        )
-        if has_event:
-            continue
+@router.get("/{user_id}/reminder-time", response_model=ReminderSchedule)
+def get_reminder_time(user_id: UUID, db: Session = Depends(get_db)):
+    user = db.get(UserORM, str(user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return reminder_schedule(db, user)
 
-        result.append(ReminderDue(habit_id=hid, habit_name=hname))
 
-    return result
+@router.put("/{user_id}/reminder-time", response_model=ReminderSchedule)
+def put_reminder_time(user_id: UUID, body: ReminderTimeIn, db: Session = Depends(get_db)):
+    """Set the user's local reminder time ("HH:MM"); null goes back to the default."""
+    user = db.get(UserORM, str(user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    set_reminder_time(db, user.id, None if body.local_time is None else parse_local_time(body.local_time))
+    db.commit()
+    return reminder_schedule(db, user)
 @router.put("/{user_id}", response_model=User)
 def replace_user(user_id: str, body: UserCreate, db: Session = Depends(get_db)):
     u = crud.users.replace(db, user_id, {"name": body.name, "email": body.email, "timezone": body.timezone})
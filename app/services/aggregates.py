@@ -0,0 +1,198 @@
+# app/services/aggregates.py
+"""
+Insert-maintained aggregates over events.
+
+Modules register an aggregate with `register(...)`. A single `after_flush`
+listener hands every batch of newly inserted EventORM rows to each registered
+aggregate, already resolved to the owner's local time, so aggregates commit
+in the same transaction as the events that feed them.
+
+Events that predate an aggregate never pass through that listener, so app
+startup calls backfill_on_startup(): every registered aggregate not yet
+recorded in `aggregate_backfills` is replayed once from the events table.
+"""
+from __future__ import annotations
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.timezones import get_zone
+from app.db import AggregateBackfillORM, EventORM, HabitORM, UserORM
+
+logger = logging.getLogger(__name__)
+
+_backfills = AggregateBackfillORM.__table__
+BACKFILL_LEASE = "aggregates:backfill"
+BACKFILL_LEASE_SECONDS = 3600
+
+
+@dataclass(frozen=True)
+class InsertedEvent:
+    habit_id: int
+    user_id: str
+    occurred_at_utc: datetime
+    local: datetime                 # occurred_at in the owner's timezone
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    name: str
+    on_insert: Callable[[Session, List[InsertedEvent]], None]
+    clear: Callable[[Session, str, List[int]], None]    # drop a user's rows (user_id, habit_ids)
+
+
+_REGISTRY: Dict[str, Aggregate] = {}
+
+
+def register(
+    name: str,
+    *,
+    on_insert: Callable[[Session, List[InsertedEvent]], None],
+    clear: Callable[[Session, str, List[int]], None],
+) -> None:
+    _REGISTRY[name] = Aggregate(name=name, on_insert=on_insert, clear=clear)
+
+
+def registered() -> List[str]:
+    return sorted(_REGISTRY)
+
+
+# ---------- helpers ----------
+
+def _zone(tz_str: Optional[str]) -> ZoneInfo:
+    return get_zone(tz_str)
+
+
+def _owners(session: Session, habit_ids: Iterable[int]) -> Dict[int, Tuple[str, ZoneInfo]]:
+    """habit_id → (user_id, user tz) in one query."""
+    ids = set(habit_ids)
+    if not ids:
+        return {}
+    rows = session.execute(
+        select(HabitORM.id, HabitORM.user_id, UserORM.timezone)
+        .outerjoin(UserORM, HabitORM.user_id == UserORM.id)
+        .where(HabitORM.id.in_(ids))
+    ).all()
+    return {hid: (uid, _zone(tz)) for hid, uid, tz in rows}
+
+
+def _resolve(session: Session, pairs: List[Tuple[int, datetime]]) -> List[InsertedEvent]:
+    owners = _owners(session, (hid for hid, _ in pairs))
+    out: List[InsertedEvent] = []
+    for hid, ts in pairs:
+        owner = owners.get(hid)
+        if owner is None:
+            continue
+        user_id, tz = owner
+        ts = ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+        out.append(InsertedEvent(habit_id=hid, user_id=user_id, occurred_at_utc=ts, local=ts.astimezone(tz)))
+    return out
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context) -> None:
+    if not _REGISTRY:
+        return
+    pairs = [
+        (obj.habit_id, obj.occurred_at_utc)
+        for obj in session.new
+        if isinstance(obj, EventORM) and obj.occurred_at_utc is not None
+    ]
+    if not pairs:
+        return
+    batch = _resolve(session, pairs)
+    if not batch:
+        return
+    for agg in list(_REGISTRY.values()):
+        agg.on_insert(session, batch)
+
+
+# ---------- rebuilds ----------
+
+def rebuild_user(session: Session, user_id: str, names: Optional[Iterable[str]] = None) -> int:
+    """
+    Recompute the named (default: all) aggregates for one user from the events
+    table. Needed after a timezone change or to backfill pre-existing data.
+    Returns the number of events replayed. Caller commits.
+    """
+    aggs = [_REGISTRY[n] for n in (names or _REGISTRY)]
+    session.flush()  # pending timezone / event changes must be visible to the replay
+    habit_ids = list(session.execute(
+        select(HabitORM.id).where(HabitORM.user_id == str(user_id))
+    ).scalars().all())
+
+    for agg in aggs:
+        agg.clear(session, str(user_id), habit_ids)
+    if not habit_ids:
+        return 0
+
+    pairs = session.execute(
+        select(EventORM.habit_id, EventORM.occurred_at_utc).where(EventORM.habit_id.in_(habit_ids))
+    ).all()
+    batch = _resolve(session, [(hid, ts) for hid, ts in pairs])
+    if batch:
+        for agg in aggs:
+            agg.on_insert(session, batch)
+    return len(batch)
+
+
+def rebuild_all(session: Session, names: Optional[Iterable[str]] = None) -> int:
+    """Rebuild aggregates for every user. Returns total events replayed. Caller commits."""
+    names = list(names) if names is not None else None
+    total = 0
+    for user_id in session.execute(select(UserORM.id)).scalars().all():
+        total += rebuild_user(session, user_id, names)
+    return total
+
+
+def backfill(session: Session) -> Dict[str, int]:
+    """
+    Replay existing events into every registered aggregate this database has
+    not been backfilled for, and record them. Returns {name: events
+    replayed}; empty when all are current. Caller commits.
+    """
+    done = set(session.execute(select(_backfills.c.name)).scalars())
+    todo = [n for n in sorted(_REGISTRY) if n not in done]
+    if not todo:
+        return {}
+    replayed = rebuild_all(session, todo)
+    session.execute(
+        sqlite_insert(_backfills)
+        .values([{"name": n, "events": replayed} for n in todo])
+        .on_conflict_do_nothing(index_elements=[_backfills.c.name])
+    )
+    return {n: replayed for n in todo}
+
+
+def backfill_on_startup(bind) -> Dict[str, int]:
+    """
+    Run backfill() once across processes: the worker holding the backfill
+    lease does it, the others leave it to that one.
+    """
+    from app.services import leases
+
+    holder = leases.default_holder()
+    with Session(bind) as session:
+        got = leases.acquire(session, BACKFILL_LEASE, holder, BACKFILL_LEASE_SECONDS)
+        session.commit()
+        if not got:
+            logger.info("Aggregate backfill running in another process; skipping")
+            return {}
+        try:
+            result = backfill(session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            leases.release(session, BACKFILL_LEASE, holder)
+            session.commit()
+    if result:
+        logger.info("Backfilled aggregates %s from existing events", result)
+    return result
@@ -1,13 +1,27 @@
 # app/services/analytics.py
 from __future__ import annotations
+import json
+from collections import defaultdict
 from datetime import datetime, date, timedelta, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+from time import perf_counter
 from zoneinfo import ZoneInfo
 
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.core.timezones import (
+    DAY_SECONDS, EPOCH_ORDINAL, epoch_seconds, local_day_ordinals, local_epochs,
+)
 from app.db import engine, EventORM, HabitORM
+from app.services.hour_counts import hour_of_week_counts
+from app.services.rollups import trend as rollup_trend
+from app.services.context_flags import CUSTOM, EXAM, ILLNESS, TRAVEL
+from app.services.features import FeatureColumns
+from app.services.feature_store import FeatureCursor, load_feature_page
+from app.services.streaks import latest_streaks, user_zone
+from app.services.sketches import TimeOfDaySketch, load_sketches, minute_to_hhmm
+from app.services.time_buckets import bucket_table
 
 # If your DB exposes these; otherwise we gracefully fall back.
 try:
@@ -24,24 +38,8 @@ def _monday_of(d: date) -> date:
     return d - timedelta(days=d.weekday())
 
 def _user_tz(session: Session, user_id: str | int) -> ZoneInfo:
-    """Look up user's timezone; default to America/Phoenix if missing/invalid."""
-    if UserORM is not None:
-        u = session.get(UserORM, user_id)
-        tz_str = getattr(u, "timezone", None)
-        if tz_str:
-            try:
-                return ZoneInfo(tz_str)
-            except Exception:
-                pass
-    return ZoneInfo("America/Phoenix")
-
-def _to_utc_bounds(local_d: date, tz: ZoneInfo, end_of_day: bool) -> datetime:
-    """Convert a local date boundary to UTC datetime for querying."""
-    if end_of_day:
-        dt_local = datetime(local_d.year, local_d.month, local_d.day, 23, 59, 59, 999_999, tzinfo=tz)
-    else:
-        dt_local = datetime(local_d.year, local_d.month, local_d.day, 0, 0, 0, 0, tzinfo=tz)
-    return dt_local.astimezone(timezone.utc)
+    """Look up user's timezone; DEFAULT_USER_TZ if missing/invalid (same zone as streaks)."""
+    return user_zone(session, user_id)
 
 def _ensure_aware(dt: datetime) -> datetime:
     """Cope with naive timestamps by assuming UTC."""
@@ -63,6 +61,9 @@ def weekly_completion(
     - Dedup multiple events per (habit, local calendar day).
     - Denominator = (# active habits) × (# days in that week intersecting [start, end]).
     - If start/end not provided, defaults to the current week + previous week.
+
+    Served from the insert-maintained rollups: full weeks read one row each,
+    partial edge weeks read their day rows.
     """
     with Session(engine) as session:
         tz = _user_tz(session, user_id)
@@ -74,73 +75,69 @@ def weekly_completion(
             start = end_week_start - timedelta(days=7)
             end = end_week_start + timedelta(days=6)
 
-        # Query window in UTC
-        start_utc = _to_utc_bounds(start, tz, end_of_day=False)
-        end_utc = _to_utc_bounds(end, tz, end_of_day=True)
+        buckets = rollup_trend(session, user_id=str(user_id), start=start, end=end, granularity="week")
 
-        # 1) Fetch events for this user in the window
-        rows = session.execute(
-            select(EventORM.habit_id, EventORM.occurred_at_utc)
-            .join(HabitORM, EventORM.habit_id == HabitORM.id)
-            .where(HabitORM.user_id == user_id)
-            .where(EventORM.occurred_at_utc >= start_utc)
-            .where(EventORM.occurred_at_utc <= end_utc)
-        ).all()
+    return [
+        {"week_start": b["period_start"], "completion_pct": b["completion_pct"]}
+        for b in buckets
+    ]
 
-        # 2) Dedup to one hit per (habit, local_date), bucket by week start (local Monday)
-        hits_by_week: dict[date, set[tuple[str | int, date]]] = {}
-        for habit_id, occurred_at in rows:
-            occurred_at = _ensure_aware(occurred_at)
-            local_day = occurred_at.astimezone(tz).date()
-            week = _monday_of(local_day)
-            hits_by_week.setdefault(week, set()).add((habit_id, local_day))
 
-        # 3) Count active habits (fallback to *all* if no status enum)
-        if HabitStatus is not None and hasattr(HabitStatus, "ACTIVE"):
-            active_habits = session.execute(
-                select(HabitORM.id).where(
-                    HabitORM.user_id == user_id,
-                    HabitORM.status == HabitStatus.ACTIVE
-                )
-            ).all()
-        else:
-            active_habits = session.execute(
-                select(HabitORM.id).where(HabitORM.user_id == user_id)
-            ).all()
-        active_count = len(active_habits)
-
-        # 4) Build weekly results across the requested range
-        results: List[Dict[str, Any]] = []
-        week_cursor = _monday_of(start)
-        last_week = _monday_of(end)
-
-        while week_cursor <= last_week:
-            # Days of this week that intersect [start, end]
-            days_in_week = [week_cursor + timedelta(days=i) for i in range(7)]
-            days_in_range = [d for d in days_in_week if start <= d <= end]
-
-            opportunities = active_count * len(days_in_range)
-            completions = len(hits_by_week.get(week_cursor, set()))
-            pct = (completions / opportunities) if opportunities else 0.0
-
-            results.append({
-                "week_start": week_cursor.isoformat(),
-                "completion_pct": pct,
-            })
-            week_cursor += timedelta(days=7)
+def completion_trend(
+    user_id: str | int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = "month",
+    habit_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Completion totals per day/week/month/year for the user (or one habit).
+    Defaults to the trailing 365 days ending today (user-local).
+    """
+    with Session(engine) as session:
+        tz = _user_tz(session, user_id)
 
-        return results
+        if start is None or end is None:
+            end = datetime.now(timezone.utc).astimezone(tz).date()
+            start = end - timedelta(days=364)
+
+        if habit_id is not None:
+            owner = session.execute(
+                select(HabitORM.id).where(HabitORM.id == habit_id, HabitORM.user_id == str(user_id))
+            ).first()
+            if owner is None:
+                raise LookupError("habit not found")
+
+        buckets = rollup_trend(
+            session, user_id=str(user_id), start=start, end=end,
+            granularity=granularity, habit_id=habit_id,
+        )
+
+    return {
+        "user_id": str(user_id),
+        "habit_id": habit_id,
+        "granularity": granularity,
+        "window": {"start": start.isoformat(), "end": end.isoformat()},
+        "buckets": buckets,
+    }
 
 
 def habit_heatmap(
     user_id: str | int,
     start: Optional[date] = None,
-    end: Optional[date] = None
+    end: Optional[date] = None,
+    buckets: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Group events into day-of-week × time-bucket counts.
     Useful for building a heatmap visualization (what times you succeed most).
+
+    Reads the insert-maintained hour-of-week counters and folds them through a
+    24-entry hour→bucket table built from TIME_BUCKETS (or `buckets`, same format),
+    so the cost is O(168) per habit-week regardless of event volume.
     """
+    bucket_names, table = bucket_table(buckets)
+
     with Session(engine) as session:
         tz = _user_tz(session, user_id)
 
@@ -150,53 +147,59 @@ def habit_heatmap(
             start = today_local - timedelta(days=30)
             end = today_local
 
-        start_utc = _to_utc_bounds(start, tz, end_of_day=False)
-        end_utc = _to_utc_bounds(end, tz, end_of_day=True)
-
-        rows = session.execute(
-            select(EventORM.occurred_at_utc)
-            .join(HabitORM, EventORM.habit_id == HabitORM.id)
-            .where(HabitORM.user_id == user_id)
-            .where(EventORM.occurred_at_utc >= start_utc)
-            .where(EventORM.occurred_at_utc <= end_utc)
+        grid = hour_of_week_counts(session, start=start, end=end, user_id=user_id)
+        habit_ids = session.execute(
+            select(HabitORM.id).where(HabitORM.user_id == str(user_id))
         ).scalars().all()
+        times = TimeOfDaySketch()
+        for sk in load_sketches(session, habit_ids, since=start, until=end, tz=str(tz)).values():
+            times.merge(sk)
 
-        # Buckets
-        dow_keys = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-        buckets = ["morning", "afternoon", "evening"]
-        counts = {d: {b: 0 for b in buckets} for d in dow_keys}
-
-        def bucket_for_hour(h: int) -> str:
-            if 5 <= h <= 11:
-                return "morning"
-            if 12 <= h <= 17:
-                return "afternoon"
-            return "evening"
-
-        total = 0
-        for ts in rows:
-            ts = _ensure_aware(ts).astimezone(tz)
-            dow = dow_keys[ts.weekday()]
-            b = bucket_for_hour(ts.hour)
-            counts[dow][b] += 1
-            total += 1
-
-        percent_of_dow = {}
-        for d in dow_keys:
-            day_total = sum(counts[d].values())
-            percent_of_dow[d] = {
-                b: (counts[d][b] / day_total if day_total else 0.0)
-                for b in buckets
-            }
+    return _heatmap_payload(user_id, start, end, grid, bucket_names, table, times)
 
-        return {
-            "user_id": str(user_id),
-            "window": {"start": start.isoformat(), "end": end.isoformat()},
-            "counts": counts,
-            "percent_of_dow": percent_of_dow,  # <-- added to satisfy test
-            "total_events": total,
+
+def _heatmap_payload(
+    user_id: str | int,
+    start: date,
+    end: date,
+    grid: List[int],
+    bucket_names: Tuple[str, ...],
+    table: Tuple[Optional[str], ...],
+    times: Optional[TimeOfDaySketch] = None,
+) -> Dict[str, Any]:
+    """
+    Fold a 168-slot hour-of-week grid into day-of-week × bucket counts, plus
+    p10/median/p90 local completion times when a sketch is supplied.
+    """
+    dow_keys = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    counts = {d: {b: 0 for b in bucket_names} for d in dow_keys}
+
+    total = 0
+    for slot, n in enumerate(grid):
+        if not n:
+            continue
+        total += n
+        b = table[slot % 24]
+        if b is not None:
+            counts[dow_keys[slot // 24]][b] += n
+
+    percent_of_dow = {}
+    for d in dow_keys:
+        day_total = sum(counts[d].values())
+        percent_of_dow[d] = {
+            b: (counts[d][b] / day_total if day_total else 0.0)
+            for b in bucket_names
         }
 
+    return {
+        "user_id": str(user_id),
+        "window": {"start": start.isoformat(), "end": end.isoformat()},
+        "counts": counts,
+        "percent_of_dow": percent_of_dow,  # <-- added to satisfy test
+        "total_events": total,
+        "completion_time": (times or TimeOfDaySketch()).summary(),
+    }
+
 
 def slip_detector(
     user_id: str | int,
@@ -207,7 +210,6 @@ def slip_detector(
     with Session(engine) as session:
         tz = _user_tz(session, user_id)
         now = datetime.now(timezone.utc)
-        w7_start = now - timedelta(days=window_7_days)
         w30_start = now - timedelta(days=window_30_days)
 
         # active habits
@@ -237,33 +239,259 @@ def slip_detector(
             .where(EventORM.occurred_at_utc <= now)
         ).all()
 
-        grouped: dict[str, list[datetime]] = {}
-        for hid, ts in events:
-            if hid in habit_map:
-                grouped.setdefault(hid, []).append(_ensure_aware(ts))
+        return {
+            "user_id": str(user_id),
+            "slipping": _slipping(habit_map, events, tz, now, window_7_days, window_30_days, slip_threshold),
+        }
 
-        slipping = []
-        for hid, ts_list in grouped.items():
-            local_ts = [ts.astimezone(tz) for ts in ts_list]
 
-            def distinct_days(since: datetime) -> int:
-                return len({ts.date() for ts in local_ts if ts >= since.astimezone(tz)})
+def _slipping(
+    habit_map: Dict[Any, Any],
+    events: List[Tuple[Any, datetime]],
+    tz: ZoneInfo,
+    now: datetime,
+    window_7_days: int,
+    window_30_days: int,
+    slip_threshold: float,
+) -> List[Dict[str, Any]]:
+    """Habits whose short-window completion rate dropped below the long window's."""
+    w7_start = now - timedelta(days=window_7_days)
+    w30_start = now - timedelta(days=window_30_days)
+
+    grouped: dict[str, list[datetime]] = {}
+    for hid, ts in events:
+        ts = _ensure_aware(ts)
+        if hid in habit_map and w30_start <= ts <= now:
+            grouped.setdefault(hid, []).append(ts)
+
+    slipping = []
+    for hid, ts_list in grouped.items():
+        epochs = [epoch_seconds(ts) for ts in ts_list]
+        local_days = local_day_ordinals(epochs, tz)
+
+        def distinct_days(since: datetime) -> int:
+            s = epoch_seconds(since)
+            return len({o for e, o in zip(epochs, local_days) if e >= s})
+
+        days_7 = distinct_days(w7_start)
+        days_30 = distinct_days(w30_start)
+
+        pct_7 = days_7 / window_7_days
+        pct_30 = days_30 / window_30_days
+        delta = pct_7 - pct_30
+
+        if (pct_30 - pct_7) >= slip_threshold:
+            slipping.append({
+                "habit_id": hid,  # keep native type (int)
+                "name": habit_map[hid].name,
+                "pct_7d": round(pct_7, 3),
+                "pct_30d": round(pct_30, 3),
+                "delta": round(delta, 3),
+            })
 
-            days_7 = distinct_days(w7_start)
-            days_30 = distinct_days(w30_start)
+    slipping.sort(key=lambda r: r["delta"])
+    return slipping
 
-            pct_7 = days_7 / window_7_days
-            pct_30 = days_30 / window_30_days
-            delta = pct_7 - pct_30
 
-            if (pct_30 - pct_7) >= slip_threshold:
-                slipping.append({
-                    "habit_id": hid,  # keep native type (int)
-                    "name": habit_map[hid].name,
-                    "pct_7d": round(pct_7, 3),
-                    "pct_30d": round(pct_30, 3),
-                    "delta": round(delta, 3),
-                })
 
-        slipping.sort(key=lambda r: r["delta"])
-        return {"user_id": str(user_id), "slipping": slipping}
+def _weekly_from_days(
+    completed: set[tuple[Any, date]], habit_count: int, start: date, end: date
+) -> List[Dict[str, Any]]:
+    """weekly_completion over an in-memory set of (habit_id, local_day) completions."""
+    hits_by_week: Dict[date, int] = defaultdict(int)
+    for _, d in completed:
+        if start <= d <= end:
+            hits_by_week[_monday_of(d)] += 1
+
+    results: List[Dict[str, Any]] = []
+    week_cursor = _monday_of(start)
+    while week_cursor <= end:
+        days_in_range = sum(1 for i in range(7) if start <= week_cursor + timedelta(days=i) <= end)
+        opportunities = habit_count * days_in_range
+        completions = hits_by_week.get(week_cursor, 0)
+        results.append({
+            "week_start": week_cursor.isoformat(),
+            "completion_pct": (completions / opportunities) if opportunities else 0.0,
+        })
+        week_cursor += timedelta(days=7)
+    return results
+
+
+def dashboard(
+    user_id: str | int,
+    buckets: Optional[str] = None,
+    slip_threshold: float = 0.15,
+) -> Dict[str, Any]:
+    """
+    Home-screen payload: weekly completion, heatmap, slips and per-habit streaks
+    with each endpoint's default window, computed from ONE load of the user's
+    habits and events (timezone resolved once). Each section is timed.
+    """
+    bucket_names, table = bucket_table(buckets)
+    timings: Dict[str, float] = {}
+
+    t0 = perf_counter()
+    with Session(engine) as session:
+        tz = _user_tz(session, user_id)
+        habits = session.execute(
+            select(HabitORM).where(HabitORM.user_id == str(user_id))
+        ).scalars().all()
+        habit_map = {h.id: h for h in habits}
+        names = {h.id: h.name for h in habits}
+        # Widest window needed is full history (max streak), so one unbounded scan
+        events = session.execute(
+            select(EventORM.habit_id, EventORM.occurred_at_utc)
+            .join(HabitORM, EventORM.habit_id == HabitORM.id)
+            .where(HabitORM.user_id == str(user_id))
+        ).all() if habits else []
+
+    now = datetime.now(timezone.utc)
+    today_local = now.astimezone(tz).date()
+    # local wall-clock seconds per event: day = s // DAY_SECONDS, time of day = s % DAY_SECONDS
+    local = list(zip((hid for hid, _ in events), local_epochs((epoch_seconds(ts) for _, ts in events), tz)))
+    days_by_habit: Dict[Any, set] = defaultdict(set)
+    for hid, s in local:
+        days_by_habit[hid].add(date.fromordinal(s // DAY_SECONDS + EPOCH_ORDINAL))
+    timings["load"] = perf_counter() - t0
+
+    # weekly: previous + current week
+    t = perf_counter()
+    week_start = _monday_of(today_local) - timedelta(days=7)
+    week_end = _monday_of(today_local) + timedelta(days=6)
+    completed = {(hid, d) for hid, ds in days_by_habit.items() for d in ds}
+    weekly = _weekly_from_days(completed, len(habits), week_start, week_end)
+    timings["weekly"] = perf_counter() - t
+
+    # heatmap: last 30 days
+    t = perf_counter()
+    hm_start, hm_end = today_local - timedelta(days=30), today_local
+    grid = [0] * 168
+    minutes = []
+    lo, hi = hm_start.toordinal(), hm_end.toordinal()
+    for _, s in local:
+        o = s // DAY_SECONDS + EPOCH_ORDINAL
+        if lo <= o <= hi:
+            minute = s % DAY_SECONDS // 60
+            grid[(o - 1) % 7 * 24 + minute // 60] += 1     # ordinal 1 is a Monday
+            minutes.append(minute)
+    times = TimeOfDaySketch.from_minutes(minutes)
+    heatmap = _heatmap_payload(user_id, hm_start, hm_end, grid, bucket_names, table, times)
+    timings["heatmap"] = perf_counter() - t
+
+    # slips: 7d vs 30d
+    t = perf_counter()
+    slipping = _slipping(habit_map, events, tz, now, 7, 30, slip_threshold)
+    timings["slips"] = perf_counter() - t
+
+    # streaks: same zone and default as /habits/{id}/streak (as of the latest completed day)
+    t = perf_counter()
+    streaks = []
+    for h in habits:
+        s = latest_streaks(days_by_habit.get(h.id, ()))
+        streaks.append({"habit_id": h.id, "name": names[h.id], **s})
+    timings["streaks"] = perf_counter() - t
+
+    return {
+        "user_id": str(user_id),
+        "weekly": weekly,
+        "heatmap": heatmap,
+        "slips": {"user_id": str(user_id), "slipping": slipping},
+        "streaks": streaks,
+        "timings_ms": {k: round(v * 1000, 3) for k, v in timings.items()},
+    }
+
+
+DOW3 = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def _json(v: Any) -> str:
+    return json.dumps(v, ensure_ascii=False, separators=(",", ":"))
+
+
+def features_json(cols: FeatureColumns, habit_names: Dict[int, str]) -> bytes:
+    """
+    Encode feature columns as the public FeaturePublic JSON array directly:
+    habit-, day- and value-constant fragments are encoded once, and each row
+    only formats its own numbers/flags (no per-row dict or model instance).
+    """
+    if not len(cols):
+        return b"[]"
+
+    heads, mids = [], []
+    for k, hid in enumerate(cols.habit_ids):
+        heads.append(f'{{"habit_id":{hid},"habit_name":{_json(habit_names.get(hid, ""))},')
+        mids.append(f'"difficulty":{_json(cols.difficulty[k] or "medium")},"active":{_json(cols.active[k])},')
+
+    day_parts: Dict[int, str] = {}
+    for o in set(cols.day_ordinal):
+        day_parts[o] = f'"day":"{date.fromordinal(o).isoformat()}","dow":"{DOW3[(o - 1) % 7]}",'
+    buckets = {b: _json(b) for b in set(cols.hour_bucket)}
+    tails: Dict[Tuple[Optional[float], ...], str] = {}
+
+    def tail(i: int) -> str:
+        key = tuple(
+            None if v != v else v   # NaN -> None so "no completions" rows share one entry
+            for v in (cols.completion_p10_min[i], cols.completion_median_min[i], cols.completion_p90_min[i])
+        )
+        t = tails.get(key)
+        if t is None:
+            p10, p50, p90 = key
+            t = tails[key] = (
+                f'"completion_time_p10":{_json(minute_to_hhmm(p10))},'
+                f'"completion_time_median":{_json(minute_to_hhmm(p50))},'
+                f'"completion_time_p90":{_json(minute_to_hhmm(p90))},'
+            )
+        return t
+
+    windows = [(f'"{w}d":', col) for w, col in cols.rates.items()]
+
+    def rates(i: int) -> str:
+        return '"window_rates":{' + ",".join(f"{key}{col[i]!r}" for key, col in windows) + "}}"
+
+    tf = ("false", "true")
+    labels = cols.context_labels
+    contexts: Dict[int, str] = {}
+
+    def context(m: int) -> str:
+        c = contexts.get(m)
+        if c is None:
+            tags = [t for t in labels.tags(m) if t != "custom"]
+            c = contexts[m] = _json({
+                "travel": bool(m & TRAVEL), "exam": bool(m & EXAM), "illness": bool(m & ILLNESS),
+                "custom": bool(m & CUSTOM), "tags": tags,
+            })
+        return c
+
+    r7, r30, streak = cols.last_7d_rate, cols.last_30d_rate, cols.current_streak
+    cmask, slip = cols.context_mask, cols.slip_7d_flag
+    hb = cols.hour_bucket
+    parts = [
+        f'{heads[k]}{day_parts[o]}"last_7d_completion_rate":{r7[i]!r},'
+        f'"last_30d_completion_rate":{r30[i]!r},"current_streak":{streak[i]},'
+        f'"hour_bucket":{buckets[hb[i]]},{mids[k]}"median_completion_bucket":{buckets[hb[i]]},'
+        f'"context":{context(cmask[i])},'
+        f'"slip":{tf[slip[i]]},{tail(i)}{rates(i)}'
+        for i, (k, o) in enumerate(zip(cols.habit_idx, cols.day_ordinal))
+    ]
+    return ("[" + ",".join(parts) + "]").encode("utf-8")
+
+
+def daily_features_page(
+    user_id: str, start: date, end: date, *, limit: int, after: Optional[FeatureCursor] = None
+) -> Tuple[bytes, Optional[FeatureCursor]]:
+    """
+    One page of the public /analytics/features payload for a user, already
+    JSON-encoded, plus the cursor of the next page (None on the last one).
+    Opens its own session (like the other analytics entry points) so it can run
+    on a worker thread or process; only the encoded bytes cross back.
+    """
+    with Session(engine) as session:
+        cols, next_cursor = load_feature_page(session, user_id, start, end, limit=limit, after=after)
+        session.commit()   # keep whatever was materialized for the next read
+        if not len(cols):
+            return b"[]", None
+        name_rows = session.execute(
+            select(HabitORM.id, HabitORM.name).where(HabitORM.id.in_(cols.habit_ids))
+        ).all()
+
+    return features_json(cols, {hid: hname for hid, hname in name_rows}), next_cursor
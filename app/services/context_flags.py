@@ -0,0 +1,166 @@
+# app/services/context_flags.py
+"""
+Per-local-day context bitmasks.
+
+Every context contributes one or more labels: its kind (travel, exam,
+illness, custom) and, for custom contexts, the tags in its `data`
+("tag": "conference" or "tags": ["conference", "move"]). Each label owns one
+bit; a day's mask is the OR of the labels of every context covering it.
+
+context_masks() sweeps the contexts once: each clipped interval becomes an
+open event on its first day and a close event after its last, and a single
+pass over the days keeps per-bit open counts. That is O(contexts + days)
+instead of expanding every context day by day.
+
+Shared by features (context flags/tags), the feature store and reminders
+(any active context mutes the day).
+"""
+from __future__ import annotations
+from array import array
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.core.timezones import ZoneLike, day_bounds, local_day
+from app.db import ContextORM
+from app.models.schemas import ContextKind
+
+BUILTIN_LABELS: Tuple[str, ...] = tuple(k.value for k in ContextKind)   # fixed bits 0..3
+TRAVEL, EXAM, ILLNESS, CUSTOM = (1 << i for i in range(len(BUILTIN_LABELS)))
+FLAG_LABELS: Tuple[str, ...] = ("travel", "exam", "illness")              # have their own feature columns
+MAX_LABELS = 64
+
+
+def context_labels(ctx: ContextORM) -> Tuple[str, ...]:
+    """Labels a context sets: its kind, plus normalized data tags for custom contexts."""
+    kind = ContextKind(getattr(ctx.kind, "value", ctx.kind))
+    if kind is not ContextKind.custom:
+        return (kind.value,)
+    data = ctx.data or {}
+    raw = data.get("tags") or []
+    if isinstance(raw, str):
+        raw = [raw]
+    if data.get("tag"):
+        raw = [data["tag"], *raw]
+    tags = []
+    for t in raw:
+        t = str(t).strip().lower()
+        if t and t not in BUILTIN_LABELS and t not in tags:
+            tags.append(t)
+    return (kind.value, *tags)
+
+
+class ContextLabels:
+    """Label <-> bit registry; the built-in kinds always hold bits 0..3."""
+    __slots__ = ("names", "_bits")
+
+    def __init__(self, names: Sequence[str] = BUILTIN_LABELS):
+        self.names: List[str] = []
+        self._bits: Dict[str, int] = {}
+        for n in (*BUILTIN_LABELS, *names):
+            self.bit(n)
+
+    def bit(self, label: str) -> int:
+        b = self._bits.get(label)
+        if b is None:
+            if len(self.names) >= MAX_LABELS:
+                raise ValueError(f"more than {MAX_LABELS} distinct context labels")
+            b = self._bits[label] = 1 << len(self.names)
+            self.names.append(label)
+        return b
+
+    def encode(self, labels: Iterable[str]) -> int:
+        m = 0
+        for label in labels:
+            m |= self.bit(label)
+        return m
+
+    def decode(self, mask: int) -> Tuple[str, ...]:
+        return tuple(n for i, n in enumerate(self.names) if mask >> i & 1)
+
+    def tags(self, mask: int) -> Tuple[str, ...]:
+        """Labels of `mask` other than the travel/exam/illness flags."""
+        return self.decode(mask & ~(TRAVEL | EXAM | ILLNESS))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class ContextMasks:
+    """Day masks for [start, end]; days outside the range read as 0."""
+    __slots__ = ("start", "end", "labels", "masks")
+
+    def __init__(self, start: date, end: date, labels: Optional[ContextLabels] = None):
+        self.start = start
+        self.end = end
+        self.labels = labels or ContextLabels()
+        self.masks = array("Q", bytes(8 * max(0, (end - start).days + 1)))
+
+    def __getitem__(self, d: date) -> int:
+        i = (d - self.start).days
+        return self.masks[i] if 0 <= i < len(self.masks) else 0
+
+    def any(self, d: date) -> bool:
+        return self[d] != 0
+
+    def flags(self, d: date) -> Dict[str, bool]:
+        m = self[d]
+        return {"travel": bool(m & TRAVEL), "exam": bool(m & EXAM), "illness": bool(m & ILLNESS)}
+
+    def tags(self, d: date) -> Tuple[str, ...]:
+        return self.labels.tags(self[d])
+
+
+def context_masks(
+    contexts: Iterable[ContextORM], tz: ZoneLike, start: date, end: date, labels: Optional[ContextLabels] = None
+) -> ContextMasks:
+    """Sweep `contexts` into local-day (in `tz`) label masks over [start, end]."""
+    out = ContextMasks(start, end, labels)
+    n = len(out.masks)
+    opens: Dict[int, List[int]] = defaultdict(list)
+    closes: Dict[int, List[int]] = defaultdict(list)
+    for c in contexts:
+        if c.start_utc is None:
+            continue
+        lo = max(0, (local_day(c.start_utc, tz) - start).days)
+        hi = n - 1 if c.end_utc is None else min(n - 1, (local_day(c.end_utc, tz) - start).days)
+        if lo > hi:
+            continue
+        for label in context_labels(c):
+            b = out.labels.bit(label)
+            opens[lo].append(b)
+            closes[hi + 1].append(b)
+
+    if not opens:
+        return out
+    open_count: Dict[int, int] = defaultdict(int)
+    mask = 0
+    masks = out.masks
+    for i in range(min(opens), n):
+        for b in closes.get(i, ()):
+            open_count[b] -= 1
+            if not open_count[b]:
+                mask &= ~b
+        for b in opens.get(i, ()):
+            open_count[b] += 1
+            mask |= b
+        masks[i] = mask
+    return out
+
+
+def load_context_masks(
+    session: Session, user_id: str, tz: ZoneLike, start: date, end: date, labels: Optional[ContextLabels] = None
+) -> ContextMasks:
+    """context_masks over the user's contexts that touch local days [start, end]."""
+    lo, hi = day_bounds(start, tz)[0], day_bounds(end, tz)[1]
+    contexts = session.execute(
+        select(ContextORM).where(
+            ContextORM.user_id == str(user_id),
+            ContextORM.start_utc < hi,
+            or_(ContextORM.end_utc.is_(None), ContextORM.end_utc >= lo),
+        )
+    ).scalars().all()
+    return context_masks(contexts, tz, start, end, labels)
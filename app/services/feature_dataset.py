@@ -0,0 +1,200 @@
+# app/services/feature_dataset.py
+"""
+Parallel multi-user feature dataset builder.
+
+Users are split into fixed-size chunks. The parent brings each chunk's rows
+in the materialized feature store up to date just before submitting it (the
+only writer), and a spawn-based process pool reads them back with
+load_feature_columns, so the dataset matches /analytics/features, the .npz
+export and training. Every worker opens its own read-only SQLite connection
+(`mode=ro`, `query_only`) to the database file, so workers never contend for
+the writer lock or share a connection with the parent. Chunks are submitted
+a bounded distance ahead and yielded strictly in input order, so memory
+stays flat however many users there are.
+
+CLI (prints throughput):
+    python -m app.services.feature_dataset --start 2025-01-01 --end 2025-12-31 --workers 8
+"""
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.db import UserORM, engine as app_engine
+from app.services.feature_store import load_feature_columns, materialize_user
+from app.services.features import FeatureColumns
+
+DEFAULT_CHUNK = 200
+
+_ro_engine: Optional[Engine] = None
+
+
+def read_only_engine(db_path: str) -> Engine:
+    """Engine over an existing SQLite file that refuses writes."""
+    ro = create_engine(
+        f"sqlite:///file:{os.path.abspath(db_path)}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+    )
+
+    @event.listens_for(ro, "connect")
+    def _query_only(dbapi_connection, conn_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return ro
+
+
+def _init_worker(db_path: str) -> None:
+    global _ro_engine
+    app_engine.dispose(close=False)      # never reuse a connection inherited from the parent
+    _ro_engine = read_only_engine(db_path)
+
+
+def _materialize_chunk(writer: Engine, user_ids: Sequence[str], start: date, end: date, tz_name: Optional[str]) -> None:
+    with Session(writer) as session:
+        for uid in user_ids:
+            materialize_user(session, uid, through=end, since=start, tz_name=tz_name)
+        session.commit()
+
+
+def _build_chunk(user_ids: Sequence[str], start: date, end: date, tz_name: Optional[str]) -> List[Tuple[str, FeatureColumns]]:
+    with Session(_ro_engine) as session:
+        return [(uid, load_feature_columns(session, uid, start, end, tz_name, materialize=False)) for uid in user_ids]
+
+
+def default_db_path() -> str:
+    return app_engine.url.database or "app.db"
+
+
+def iter_dataset(
+    user_ids: Sequence[str],
+    start: date,
+    end: date,
+    *,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK,
+    tz_name: Optional[str] = None,
+    db_path: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Iterator[Tuple[str, FeatureColumns]]:
+    """
+    Yield (user_id, FeatureColumns) for every user, in the order given.
+
+    workers=None uses os.cpu_count(); workers<=1 reads in this process (same
+    read-only connection, no pool). Missing store rows are materialized
+    first, through a writable connection of the parent. If `stats` is passed it is filled with
+    users/rows/seconds/users_per_sec/rows_per_sec once iteration finishes.
+    """
+    if start > end:
+        raise ValueError("start must be <= end")
+    db_path = db_path or default_db_path()
+    workers = (os.cpu_count() or 1) if workers is None else max(1, workers)
+    chunks = [list(user_ids[i:i + chunk_size]) for i in range(0, len(user_ids), max(1, chunk_size))]
+    writer = app_engine if os.path.abspath(db_path) == os.path.abspath(default_db_path()) \
+        else create_engine(f"sqlite:///{os.path.abspath(db_path)}")
+
+    t0 = perf_counter()
+    n_users = n_rows = 0
+
+    def results() -> Iterator[List[Tuple[str, FeatureColumns]]]:
+        if workers == 1:
+            global _ro_engine
+            prev, _ro_engine = _ro_engine, read_only_engine(db_path)
+            try:
+                for chunk in chunks:
+                    _materialize_chunk(writer, chunk, start, end, tz_name)
+                    yield _build_chunk(chunk, start, end, tz_name)
+            finally:
+                _ro_engine.dispose()
+                _ro_engine = prev
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(db_path,),
+        ) as pool:
+            ahead = 2 * workers          # bounded read-ahead keeps memory flat
+            pending: deque = deque()
+            it = iter(chunks)
+            for chunk in it:
+                _materialize_chunk(writer, chunk, start, end, tz_name)
+                pending.append(pool.submit(_build_chunk, chunk, start, end, tz_name))
+                if len(pending) >= ahead:
+                    break
+            while pending:
+                done = pending.popleft().result()
+                nxt = next(it, None)
+                if nxt is not None:
+                    _materialize_chunk(writer, nxt, start, end, tz_name)
+                    pending.append(pool.submit(_build_chunk, nxt, start, end, tz_name))
+                yield done
+
+    try:
+        for chunk_result in results():
+            for uid, cols in chunk_result:
+                n_users += 1
+                n_rows += len(cols)
+                yield uid, cols
+    finally:
+        if writer is not app_engine:
+            writer.dispose()
+
+    if stats is not None:
+        seconds = perf_counter() - t0
+        stats.update({
+            "workers": workers,
+            "chunks": len(chunks),
+            "users": n_users,
+            "rows": n_rows,
+            "seconds": round(seconds, 3),
+            "users_per_sec": round(n_users / seconds, 1) if seconds else 0.0,
+            "rows_per_sec": round(n_rows / seconds, 1) if seconds else 0.0,
+        })
+
+
+def build_dataset(user_ids: Sequence[str], start: date, end: date, **kwargs: Any) -> Dict[str, Any]:
+    """Build every user's features, discarding them; returns the throughput stats."""
+    stats: Dict[str, Any] = {}
+    for _ in iter_dataset(user_ids, start, end, stats=stats, **kwargs):
+        pass
+    return stats
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Build daily features for many users in parallel.")
+    p.add_argument("--start", required=True, type=date.fromisoformat)
+    p.add_argument("--end", required=True, type=date.fromisoformat)
+    p.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK)
+    p.add_argument("--db", default=None, help="SQLite file (default: the app database)")
+    args = p.parse_args(argv)
+
+    db_path = args.db or default_db_path()
+    ro = read_only_engine(db_path)
+    with Session(ro) as session:
+        users = list(session.execute(select(UserORM.id).order_by(UserORM.id)).scalars())
+    ro.dispose()
+
+    stats = build_dataset(
+        users, args.start, args.end,
+        workers=args.workers, chunk_size=args.chunk_size, db_path=db_path,
+    )
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,328 @@
+# app/services/feature_export.py
+"""
+Columnar binary export of daily feature rows for model training.
+
+Rows for one or many users are written user by user (one chunk per user,
+located through `user_offsets`) into typed NumPy `.npy` column files:
+
+    <out>/habit_id.npy, day.npy, last_7d_rate.npy, ..., users.npy, user_offsets.npy
+
+The writer only needs the standard library (.npy is a small header plus raw
+little-endian data), so the API does not depend on NumPy. Uncompressed
+directories can be memory-mapped by a training job with
+`np.load(path, mmap_mode="r")` (see `load_feature_export`). With
+`compress=True` the same members are packed into a deflated `.npz` instead,
+which is smaller to ship but is decompressed on read rather than mapped.
+
+CLI:
+    python -m app.services.feature_export --start 2025-01-01 --end 2025-12-31 --out features/
+"""
+from __future__ import annotations
+import argparse
+import ast
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+from array import array
+from datetime import date
+from time import perf_counter
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import Base, engine, UserORM
+from app.services.context_flags import ContextLabels
+from app.services.features import FeatureColumns
+from app.services.feature_store import load_feature_columns
+from app.services.windows import feature_windows
+
+try:  # optional: only needed to *read* an export
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+_HEADER_LEN = 128           # fixed so the row count can be patched in after streaming
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# name -> (numpy descr, array typecode)
+COLUMNS: Dict[str, tuple] = {
+    "habit_id": ("<i8", "q"),
+    "day": ("<M8[D]", "q"),              # days since 1970-01-01
+    "dow": ("|i1", "b"),                 # 0=Mon .. 6=Sun
+    "last_7d_rate": ("<f8", "d"),
+    "last_30d_rate": ("<f8", "d"),
+    "current_streak": ("<i4", "i"),
+    "hour_bucket": ("<i2", "h"),         # code into hour_bucket_labels, -1 = none
+    "difficulty": ("<i2", "h"),          # code into difficulty_labels, -1 = none
+    "active": ("|b1", "b"),
+    "is_travel": ("|b1", "b"),
+    "is_exam": ("|b1", "b"),
+    "is_illness": ("|b1", "b"),
+    "slip_7d_flag": ("|b1", "b"),
+    "context_mask": ("<u8", "Q"),        # bit i = context_labels[i] active that day
+    "completion_p10_min": ("<f8", "d"),  # NaN = no completions
+    "completion_median_min": ("<f8", "d"),
+    "completion_p90_min": ("<f8", "d"),
+}
+# Plus one "rate_<w>d" <f8 column per extra FEATURE_WINDOWS window (see _columns).
+
+
+def _columns(windows) -> Dict[str, tuple]:
+    out = dict(COLUMNS)
+    for w in windows:
+        if w not in (7, 30):
+            out[f"rate_{w}d"] = ("<f8", "d")
+    return out
+
+
+# ---------- .npy writing ----------
+
+def _npy_header(descr: str, shape: tuple) -> bytes:
+    d = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (descr, shape)
+    pad = _HEADER_LEN - len(_NPY_MAGIC) - 2 - len(d) - 1
+    if pad < 0:
+        raise ValueError("npy header too long")
+    body = (d + " " * pad + "\n").encode("latin1")
+    return _NPY_MAGIC + len(body).to_bytes(2, "little") + body
+
+
+def _le(arr: array) -> array:
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+
+class _NpyColumnWriter:
+    """Appends typed chunks to a 1-D .npy file; the shape is written on close."""
+
+    def __init__(self, path: str, descr: str, typecode: str):
+        self.descr = descr
+        self.typecode = typecode
+        self.n = 0
+        self._f: BinaryIO = open(path, "wb")
+        self._f.write(_npy_header(descr, (0,)))
+
+    def append(self, chunk: array) -> None:
+        if chunk.typecode != self.typecode:
+            chunk = array(self.typecode, chunk)
+        _le(chunk).tofile(self._f)
+        self.n += len(chunk)
+
+    def close(self) -> None:
+        self._f.seek(0)
+        self._f.write(_npy_header(self.descr, (self.n,)))
+        self._f.close()
+
+
+def _write_npy(path: str, descr: str, typecode: str, values: Iterable) -> None:
+    w = _NpyColumnWriter(path, descr, typecode)
+    w.append(array(typecode, values))
+    w.close()
+
+
+def _write_npy_strings(path: str, values: Sequence[str]) -> None:
+    width = max((len(v) for v in values), default=1) or 1
+    with open(path, "wb") as f:
+        f.write(_npy_header(f"<U{width}", (len(values),)))
+        for v in values:
+            f.write(v.ljust(width, "\0").encode("utf-32-le"))
+
+
+# ---------- export ----------
+
+def _codes(labels: List[Optional[str]], index: Dict[str, int]) -> List[int]:
+    out = []
+    for label in labels:
+        if label is None:
+            out.append(-1)
+            continue
+        if label not in index:
+            index[label] = len(index)
+        out.append(index[label])
+    return out
+
+
+def _remap_masks(masks: Sequence[int], local: ContextLabels, shared: ContextLabels) -> array:
+    """Re-express one user's context masks in the export-wide label bits."""
+    bits = [shared.bit(n) for n in local.names]
+    out: Dict[int, int] = {}
+    for m in set(masks):
+        out[m] = sum(b for i, b in enumerate(bits) if m >> i & 1)
+    return array("Q", (out[m] for m in masks))
+
+
+def _append_user(writers: Dict[str, _NpyColumnWriter], cols: FeatureColumns,
+                 bucket_index: Dict[str, int], difficulty_index: Dict[str, int],
+                 context_labels: ContextLabels) -> None:
+    hidx, ords = cols.habit_idx, cols.day_ordinal
+    bucket_codes = _codes(cols.hour_bucket, bucket_index)
+    difficulty_codes = _codes(cols.difficulty, difficulty_index)
+
+    def per_habit(values: Sequence) -> Iterable:
+        return (values[k] for k in hidx)
+
+    w = writers
+    w["habit_id"].append(array("q", per_habit(cols.habit_ids)))
+    w["day"].append(array("q", (o - _EPOCH_ORDINAL for o in ords)))
+    w["dow"].append(array("b", ((o - 1) % 7 for o in ords)))
+    w["last_7d_rate"].append(cols.last_7d_rate)
+    w["last_30d_rate"].append(cols.last_30d_rate)
+    w["current_streak"].append(cols.current_streak)
+    w["hour_bucket"].append(array("h", bucket_codes))
+    w["difficulty"].append(array("h", per_habit(difficulty_codes)))
+    w["active"].append(array("b", per_habit(cols.active)))
+    w["is_travel"].append(cols.is_travel)
+    w["is_exam"].append(cols.is_exam)
+    w["is_illness"].append(cols.is_illness)
+    w["slip_7d_flag"].append(cols.slip_7d_flag)
+    w["context_mask"].append(_remap_masks(cols.context_mask, cols.context_labels, context_labels))
+    w["completion_p10_min"].append(cols.completion_p10_min)
+    w["completion_median_min"].append(cols.completion_median_min)
+    w["completion_p90_min"].append(cols.completion_p90_min)
+    for days, col in cols.rates.items():
+        if days not in (7, 30):
+            w[f"rate_{days}d"].append(col)
+
+
+def _write_columns(directory: str, user_ids: Sequence[str], start: date, end: date,
+                   tz_name: Optional[str]) -> Dict[str, Any]:
+    writers = {
+        name: _NpyColumnWriter(os.path.join(directory, f"{name}.npy"), descr, tc)
+        for name, (descr, tc) in _columns(feature_windows()).items()
+    }
+    bucket_index: Dict[str, int] = {}
+    difficulty_index: Dict[str, int] = {}
+    context_labels = ContextLabels()
+    offsets = [0]
+    try:
+        with Session(engine) as session:
+            for uid in user_ids:
+                cols = load_feature_columns(session, uid, start, end, tz_name)
+                session.commit()
+                _append_user(writers, cols, bucket_index, difficulty_index, context_labels)
+                offsets.append(offsets[-1] + len(cols))
+    finally:
+        for w in writers.values():
+            w.close()
+
+    _write_npy(os.path.join(directory, "user_offsets.npy"), "<i8", "q", offsets)
+    _write_npy_strings(os.path.join(directory, "users.npy"), list(user_ids))
+    _write_npy_strings(os.path.join(directory, "hour_bucket_labels.npy"), list(bucket_index))
+    _write_npy_strings(os.path.join(directory, "difficulty_labels.npy"), list(difficulty_index))
+    _write_npy_strings(os.path.join(directory, "context_labels.npy"), context_labels.names)
+    return {"users": len(user_ids), "rows": offsets[-1]}
+
+
+def all_user_ids() -> List[str]:
+    with Session(engine) as session:
+        return list(session.execute(select(UserORM.id).order_by(UserORM.id)).scalars())
+
+
+def export_features(
+    out: str | BinaryIO,
+    user_ids: Sequence[str],
+    start: date,
+    end: date,
+    *,
+    tz_name: Optional[str] = None,
+    compress: bool = False,
+) -> Dict[str, Any]:
+    """
+    Export feature rows for `user_ids` over [start, end].
+
+    compress=False: `out` is a directory of memory-mappable .npy columns.
+    compress=True:  `out` is a path or binary file object receiving a .npz.
+    Returns {"users", "rows", "seconds", "rows_per_sec"}.
+    """
+    if start > end:
+        raise ValueError("start must be <= end")
+    t0 = perf_counter()
+    if not compress:
+        os.makedirs(out, exist_ok=True)
+        summary = _write_columns(out, user_ids, start, end, tz_name)
+    else:
+        tmp = tempfile.mkdtemp(prefix="features-")
+        try:
+            summary = _write_columns(tmp, user_ids, start, end, tz_name)
+            with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+                for name in sorted(os.listdir(tmp)):
+                    zf.write(os.path.join(tmp, name), arcname=name)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    seconds = perf_counter() - t0
+    summary["seconds"] = round(seconds, 3)
+    summary["rows_per_sec"] = round(summary["rows"] / seconds, 1) if seconds else 0.0
+    return summary
+
+
+def export_npz_file(user_ids: Sequence[str], start: date, end: date, tz_name: Optional[str] = None) -> str:
+    """
+    Compressed export written to a temporary .npz; returns its path, which the
+    caller deletes (endpoint helper: the response streams the file instead of
+    holding the archive in memory; picklable for process pools).
+    """
+    fd, path = tempfile.mkstemp(prefix="features-", suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            export_features(f, user_ids, start, end, tz_name=tz_name, compress=True)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+# ---------- reading (training side) ----------
+
+def read_npy_shape(path: str) -> tuple:
+    """Shape of a .npy file without NumPy (used by tooling/tests)."""
+    with open(path, "rb") as f:
+        if f.read(len(_NPY_MAGIC)) != _NPY_MAGIC:
+            raise ValueError(f"{path} is not a v1 .npy file")
+        n = int.from_bytes(f.read(2), "little")
+        return ast.literal_eval(f.read(n).decode("latin1"))["shape"]
+
+
+def load_feature_export(path: str, *, mmap: bool = True) -> Dict[str, Any]:
+    """
+    Load an export as {column: ndarray}. Directories are memory-mapped
+    read-only when `mmap` is set; .npz archives are decompressed into memory.
+    Requires NumPy.
+    """
+    if np is None:
+        raise RuntimeError("numpy is required to read feature exports")
+    if os.path.isdir(path):
+        mode = "r" if mmap else None
+        return {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode=mode)
+            for name in os.listdir(path) if name.endswith(".npy")
+        }
+    with np.load(path) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+# ---------- CLI ----------
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Export daily feature rows as NumPy columns.")
+    p.add_argument("--start", required=True, type=date.fromisoformat)
+    p.add_argument("--end", required=True, type=date.fromisoformat)
+    p.add_argument("--out", required=True, help="output directory (or .npz file with --compress)")
+    p.add_argument("--user", action="append", dest="users", help="user id (repeatable); default: all users")
+    p.add_argument("--compress", action="store_true", help="write a deflated .npz instead of .npy columns")
+    args = p.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)   # same as app startup; the CLI runs without it
+    users = args.users or all_user_ids()
+    summary = export_features(args.out, users, args.start, args.end, compress=args.compress)
+    print(json.dumps({"out": args.out, **summary}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,546 @@
+# app/services/feature_store.py
+"""
+Incrementally materialized daily features (`daily_features`).
+
+Rows are stored with range-independent semantics so a stored day never
+depends on which window asked for it:
+  - current/miss streaks run continuously from the habit's first tracked day
+    (min of its creation day and its first event); earlier days are untracked
+    and read back as empty rows,
+  - rates for every FEATURE_WINDOWS window and completion-time quantiles use
+    trailing windows ending at the day (the same warm-up build_daily_features
+    uses); changing FEATURE_WINDOWS recomputes each habit in full,
+  - the hour bucket is stored as the median hour and labelled at read time,
+    so TIME_BUCKETS changes need no recompute.
+
+Each habit has a watermark: rows exist up to `computed_through`, and
+`dirty_from` records the earliest day a backfilled event or context change
+invalidated. Materializing only computes days past the watermark plus the
+dirty span, seeded from the stored row of the day before. A habit's rows
+start at the first day a read asked for, not at its first tracked day;
+reading earlier days extends them backwards. All rows of a user are cut in
+the user's timezone.
+"""
+from __future__ import annotations
+import base64
+import binascii
+from collections import defaultdict, deque
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import Collection, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import and_, delete, event, func, insert, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.core.timezones import DAY_SECONDS, EPOCH_ORDINAL, day_bounds, epoch_seconds, get_zone, local_day, local_epochs
+from app.db import ContextORM, DailyFeatureORM, EventORM, FeatureWatermarkORM, HabitORM
+from app.services import aggregates
+from app.services.context_flags import EXAM, ILLNESS, TRAVEL, ContextMasks, load_context_masks
+from app.services.features import FeatureColumns, feature_tz_name
+from app.services.sketches import BIN_MINUTES, N_BINS, TimeOfDaySketch
+from app.services.time_buckets import hour_to_bucket, parse_time_buckets
+from app.services.windows import feature_windows, rolling_rates, warmup_days
+
+WARMUP_DAYS = 30        # trailing days before `day` seen by the time-of-day window (and at least the rates)
+SLIP_MISSES = 3
+
+_rows = DailyFeatureORM.__table__
+_marks = FeatureWatermarkORM.__table__
+_NAN = float("nan")
+
+
+def _days(start: date, end: date) -> Iterable[date]:
+    d = start
+    while d <= end:
+        yield d
+        d += timedelta(days=1)
+
+
+# ---------- materialization ----------
+
+def _compute_rows(
+    habit_id: int,
+    frm: date,
+    until: date,
+    done: Set[date],
+    minutes_by_day: Dict[date, List[int]],
+    contexts: ContextMasks,
+    streak: int,
+    misses: int,
+    windows: Tuple[int, ...],
+) -> List[dict]:
+    warm = max(WARMUP_DAYS, warmup_days(windows))
+    series = [1 if d in done else 0 for d in _days(frm - timedelta(days=warm), until)]
+    rates = rolling_rates(series, windows, warm)
+    hist = [0] * N_BINS
+    window: deque = deque()
+
+    def push(d: date) -> None:
+        bins = [m // BIN_MINUTES for m in minutes_by_day.get(d, ())]
+        for b in bins:
+            hist[b] += 1
+        window.append(bins)
+
+    for d in _days(frm - timedelta(days=WARMUP_DAYS), frm - timedelta(days=1)):
+        push(d)
+
+    out = []
+    for i, d in enumerate(_days(frm, until)):
+        c = 1 if d in done else 0
+        push(d)
+        streak = streak + 1 if c else 0
+        misses = 0 if c else misses + 1
+
+        sk = TimeOfDaySketch(hist)
+        q10, q50, q90 = sk.quantile(0.10), sk.quantile(0.50), sk.quantile(0.90)
+        m = contexts[d]
+        out.append({
+            "habit_id": habit_id,
+            "day": d,
+            "completed": bool(c),
+            "last_7d_rate": rates[7][i],
+            "last_30d_rate": rates[30][i],
+            "window_rates": {str(w): r[i] for w, r in rates.items() if w not in (7, 30)},
+            "current_streak": streak,
+            "miss_streak": misses,
+            "median_hour": int(q50 // 60) if q50 is not None else None,
+            "completion_p10_min": q10,
+            "completion_median_min": q50,
+            "completion_p90_min": q90,
+            "is_travel": bool(m & TRAVEL),
+            "is_exam": bool(m & EXAM),
+            "is_illness": bool(m & ILLNESS),
+            "context_tags": list(contexts.labels.tags(m)),
+        })
+
+        for b in window.popleft():
+            hist[b] -= 1
+    return out
+
+
+def _load_days(
+    session: Session, habit_ids: List[int], tz, lo: date, hi: date
+) -> Tuple[Dict[int, Set[date]], Dict[int, Dict[date, List[int]]]]:
+    """Completed local days and completion minutes per habit over [lo, hi]."""
+    done: Dict[int, Set[date]] = defaultdict(set)
+    minutes: Dict[int, Dict[date, List[int]]] = defaultdict(lambda: defaultdict(list))
+    events = session.execute(
+        select(EventORM.habit_id, EventORM.occurred_at_utc).where(
+            EventORM.habit_id.in_(habit_ids),
+            EventORM.occurred_at_utc >= day_bounds(lo, tz)[0],
+            EventORM.occurred_at_utc < day_bounds(hi, tz)[1],
+        )
+    ).all()
+    for (hid, _), s in zip(events, local_epochs((epoch_seconds(ts) for _, ts in events), tz)):
+        d = date.fromordinal(s // DAY_SECONDS + EPOCH_ORDINAL)
+        done[hid].add(d)
+        minutes[hid][d].append(s % DAY_SECONDS // 60)
+    return done, minutes
+
+
+def _seed_from_events(done: Set[date], frm: date, first: date) -> Tuple[int, int]:
+    """(current streak, miss streak) at the end of the day before `frm`, from its completed days."""
+    streak, d = 0, frm - timedelta(days=1)
+    while d in done:
+        streak += 1
+        d -= timedelta(days=1)
+    if streak:
+        return streak, 0
+    before = [x for x in done if x < frm]
+    return 0, (frm - (max(before) + timedelta(days=1) if before else first)).days
+
+
+def materialize_user(
+    session: Session,
+    user_id: str,
+    *,
+    through: date,
+    since: Optional[date] = None,
+    tz_name: Optional[str] = None,
+    habit_ids: Optional[Collection[int]] = None,
+) -> int:
+    """
+    Bring every habit of the user (or just `habit_ids`) up to date through
+    `through` (local days in the user's timezone, else DEFAULT_USER_TZ), with
+    rows from `since` on (default: the habit's first tracked day). Days
+    before a habit's stored rows are only written when `since` asks for
+    them; their streaks are seeded from its earlier events. Returns the
+    number of rows written. Does not commit.
+
+    Rows are stored in one zone per user: a `tz_name` other than the user's
+    raises ValueError instead of recomputing them in it.
+    """
+    tz_key = feature_tz_name(session, user_id)
+    if tz_name and tz_name != tz_key:
+        raise ValueError(f"features of user {user_id} are stored in {tz_key}, not {tz_name}")
+    tz = get_zone(tz_key)
+    windows = feature_windows()
+    windows_key = ",".join(map(str, windows))
+
+    q = select(HabitORM.id, HabitORM.created_at).where(HabitORM.user_id == user_id)
+    if habit_ids is not None:
+        q = q.where(HabitORM.id.in_(list(habit_ids)))
+    habits = session.execute(q).all()
+    if not habits:
+        return 0
+    ids = [hid for hid, _ in habits]
+    marks = {m.habit_id: m for m in session.execute(select(_marks).where(_marks.c.habit_id.in_(ids))).all()}
+    stored_from = dict(session.execute(
+        select(_rows.c.habit_id, func.min(_rows.c.day))
+        .where(_rows.c.habit_id.in_(list(marks)))
+        .group_by(_rows.c.habit_id)
+    ).all()) if marks else {}
+    first_event = dict(session.execute(
+        select(EventORM.habit_id, func.min(EventORM.occurred_at_utc))
+        .where(EventORM.habit_id.in_(ids))
+        .group_by(EventORM.habit_id)
+    ).all())
+
+    # (from, until, first tracked day, full recompute?) per habit that needs work
+    plans: Dict[int, Tuple[date, date, date, bool]] = {}
+    for hid, created_at in habits:
+        first = local_day(created_at, tz)
+        if hid in first_event:
+            first = min(first, local_day(first_event[hid], tz))
+        want = first if since is None else min(max(first, since), through)
+        m = marks.get(hid)
+        if m is None or m.tz != tz_key or m.windows != windows_key:
+            plans[hid] = (want, through, first, True)
+            continue
+        until = max(through, m.computed_through)
+        lo = stored_from.get(hid, first)
+        if want < lo:                   # extend the stored rows backwards
+            plans[hid] = (want, until, first, True)
+            continue
+        frm = m.computed_through + timedelta(days=1)
+        if m.dirty_from is not None:
+            frm = min(frm, m.dirty_from)
+        frm = max(frm, lo)
+        if frm <= through:
+            plans[hid] = (frm, until, first, False)
+
+    if not plans:
+        return 0
+
+    # Streak state carried from the stored day before each incremental span
+    carry: Dict[int, Tuple[int, int]] = {}
+    seeds = {hid: frm - timedelta(days=1) for hid, (frm, _, first, full) in plans.items() if not full and frm > first}
+    if seeds:
+        for hid, d, streak, misses in session.execute(
+            select(_rows.c.habit_id, _rows.c.day, _rows.c.current_streak, _rows.c.miss_streak)
+            .where(_rows.c.habit_id.in_(list(seeds)), _rows.c.day.in_(set(seeds.values())))
+        ).all():
+            if seeds[hid] == d:
+                carry[hid] = (streak, misses)
+
+    # ... else from the habit's events before the span (first touch, backwards extension, gaps)
+    unseeded = [hid for hid, (frm, _, first, _) in plans.items() if hid not in carry and frm > first]
+    if unseeded:
+        before: Dict[int, Set[date]] = defaultdict(set)
+        for hid, ts in session.execute(
+            select(EventORM.habit_id, EventORM.occurred_at_utc).where(
+                EventORM.habit_id.in_(unseeded),
+                EventORM.occurred_at_utc < day_bounds(max(plans[hid][0] for hid in unseeded), tz)[0],
+            )
+        ).all():
+            before[hid].add(local_day(ts, tz))
+        for hid in unseeded:
+            frm, _, first, _ = plans[hid]
+            carry[hid] = _seed_from_events(before[hid], frm, first)
+
+    warm = max(WARMUP_DAYS, warmup_days(windows))
+    done, minutes = _load_days(
+        session, list(plans), tz,
+        min(frm for frm, _, _, _ in plans.values()) - timedelta(days=warm),
+        max(until for _, until, _, _ in plans.values()),
+    )
+
+    masks = load_context_masks(
+        session, user_id, tz,
+        min(frm for frm, _, _, _ in plans.values()),
+        max(until for _, until, _, _ in plans.values()),
+    )
+
+    written = 0
+    for hid, (frm, until, first, full) in plans.items():
+        if full:
+            session.execute(delete(_rows).where(_rows.c.habit_id == hid))
+        else:
+            session.execute(delete(_rows).where(_rows.c.habit_id == hid, _rows.c.day >= frm))
+        streak, misses = carry.get(hid, (0, 0))
+        rows = _compute_rows(hid, frm, until, done[hid], minutes[hid], masks, streak, misses, windows) if frm <= until else []
+        if rows:
+            session.execute(insert(_rows), rows)
+            written += len(rows)
+
+        # upsert: another worker may have created the watermark since `marks` was read
+        values = {"tz": tz_key, "windows": windows_key, "computed_through": until, "dirty_from": None}
+        stmt = sqlite_insert(_marks).values(habit_id=hid, user_id=user_id, **values)
+        session.execute(stmt.on_conflict_do_update(index_elements=[_marks.c.habit_id], set_=values))
+    return written
+
+
+def compute_rows(
+    session: Session, user_id: str, habit_ids: Sequence[int], frm: date, until: date
+) -> Dict[int, Dict[date, dict]]:
+    """
+    Rows of [frm, until] per habit, computed from its events like
+    materialize_user but never stored, so they include events the store has
+    not caught up with. Streaks are seeded from the events of the warm-up
+    window before `frm` (at least WARMUP_DAYS), so streaks and miss streaks
+    are only exact up to its length. Days before a habit's first tracked day
+    are left out, as in the store.
+    """
+    tz = get_zone(feature_tz_name(session, user_id))
+    windows = feature_windows()
+    lo = frm - timedelta(days=max(WARMUP_DAYS, warmup_days(windows)))
+    habits = session.execute(
+        select(HabitORM.id, HabitORM.created_at, func.min(EventORM.occurred_at_utc))
+        .outerjoin(EventORM, EventORM.habit_id == HabitORM.id)
+        .where(HabitORM.id.in_(list(habit_ids)))
+        .group_by(HabitORM.id)
+    ).all()
+    done, minutes = _load_days(session, [hid for hid, _, _ in habits], tz, lo, until)
+    masks = load_context_masks(session, user_id, tz, frm, until)
+
+    out: Dict[int, Dict[date, dict]] = {}
+    for hid, created_at, first_event in habits:
+        first = local_day(created_at, tz)
+        if first_event is not None:
+            first = min(first, local_day(first_event, tz))
+        start = max(frm, first)
+        streak, misses = _seed_from_events(done[hid], start, first) if start > first else (0, 0)
+        rows = _compute_rows(hid, start, until, done[hid], minutes[hid], masks, streak, misses, windows)
+        out[hid] = {r["day"]: r for r in rows}
+    return out
+
+
+# ---------- invalidation ----------
+
+def _mark_dirty(session: Session, habit_ids: Iterable[int], when: Dict[int, List[datetime]]) -> None:
+    """Lower dirty_from to the earliest local day touched, for already-computed days."""
+    ids = list(habit_ids)
+    if not ids:
+        return
+    for hid, tz_key, through, dirty in session.execute(
+        select(_marks.c.habit_id, _marks.c.tz, _marks.c.computed_through, _marks.c.dirty_from)
+        .where(_marks.c.habit_id.in_(ids))
+    ).all():
+        day = min(local_day(ts, tz_key) for ts in when[hid])
+        if day <= through and (dirty is None or day < dirty):
+            session.execute(update(_marks).where(_marks.c.habit_id == hid).values(dirty_from=day))
+
+
+def _on_insert(session: Session, events: List[aggregates.InsertedEvent]) -> None:
+    when: Dict[int, List[datetime]] = defaultdict(list)
+    for e in events:
+        when[e.habit_id].append(e.occurred_at_utc)
+    _mark_dirty(session, list(when), when)
+
+
+def _clear(session: Session, user_id: str, habit_ids: List[int]) -> None:
+    if habit_ids:
+        session.execute(delete(_rows).where(_rows.c.habit_id.in_(habit_ids)))
+        session.execute(delete(_marks).where(_marks.c.habit_id.in_(habit_ids)))
+
+
+aggregates.register("daily_features", on_insert=_on_insert, clear=_clear)
+
+
+@event.listens_for(Session, "after_flush")
+def _contexts_changed(session: Session, flush_context) -> None:
+    """A new, ended or removed context invalidates its user's days from its start."""
+    starts: Dict[str, datetime] = {}
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, ContextORM) and obj.start_utc is not None:
+            prev = starts.get(obj.user_id)
+            starts[obj.user_id] = obj.start_utc if prev is None else min(prev, obj.start_utc)
+    for user_id, start_utc in starts.items():
+        ids = session.execute(select(_marks.c.habit_id).where(_marks.c.user_id == user_id)).scalars().all()
+        _mark_dirty(session, ids, {hid: [start_utc] for hid in ids})
+
+
+# ---------- reads ----------
+
+# A page position: the (habit_id, day) of the last row already returned.
+FeatureCursor = Tuple[int, date]
+
+
+def encode_cursor(cursor: FeatureCursor) -> str:
+    """Opaque, URL-safe form of a page position."""
+    hid, d = cursor
+    return base64.urlsafe_b64encode(f"{hid}:{d.isoformat()}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> FeatureCursor:
+    """Inverse of encode_cursor; raises ValueError on anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        hid, d = raw.split(":")
+        return int(hid), date.fromisoformat(d)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {token!r}") from e
+
+
+def plan_page(
+    habit_ids: Sequence[int], start: date, end: date, *, after: Optional[FeatureCursor], limit: int
+) -> Tuple[List[Tuple[int, date, date]], Optional[FeatureCursor]]:
+    """
+    Split the (habit_id, day) grid of `habit_ids` (ascending) x [start, end]
+    into the next page of at most `limit` rows after `after`. Returns the
+    page's (habit_id, first day, last day) spans and the cursor of its last
+    row, or None when nothing follows it.
+    """
+    assert limit >= 1, "limit must be positive"
+    spans: List[Tuple[int, date, date]] = []
+    left = limit
+    for hid in habit_ids:
+        lo = start
+        if after is not None:
+            if hid < after[0]:
+                continue
+            if hid == after[0]:
+                lo = max(start, after[1] + timedelta(days=1))
+        if lo > end:
+            continue
+        if not left:
+            last_hid, _, last_day = spans[-1]
+            return spans, (last_hid, last_day)
+        hi = min(end, lo + timedelta(days=left - 1))
+        spans.append((hid, lo, hi))
+        left -= (hi - lo).days + 1
+        if hi < end:
+            return spans, (hid, hi)
+    return spans, None
+
+
+def load_feature_columns(
+    session: Session,
+    user_id: str,
+    start: date,
+    end: date,
+    tz_name: Optional[str] = None,
+    *,
+    materialize: bool = True,
+) -> FeatureColumns:
+    """
+    Range read of materialized features for [start, end], materializing any
+    missing or invalidated days first (caller commits). Days before a habit's
+    first tracked day come back as empty rows. Raises ValueError for a
+    `tz_name` other than the user's timezone.
+
+    materialize=False reads the stored rows as they are, for read-only
+    sessions whose caller materialized the range beforehand.
+    """
+    assert start <= end, "start must be <= end"
+    if materialize:
+        materialize_user(session, user_id, through=end, since=start, tz_name=tz_name)
+    habits = session.query(HabitORM).filter(HabitORM.user_id == user_id).all()
+    return _read_columns(session, user_id, [(h, start, end) for h in habits], tz_name)
+
+
+def load_feature_page(
+    session: Session,
+    user_id: str,
+    start: date,
+    end: date,
+    *,
+    limit: int,
+    after: Optional[FeatureCursor] = None,
+    tz_name: Optional[str] = None,
+) -> Tuple[FeatureColumns, Optional[FeatureCursor]]:
+    """
+    One page of load_feature_columns' rows in (habit_id, day) order: at most
+    `limit` rows after cursor `after`. Only the page's habits are
+    materialized, and only through the page's last day; its rows are the
+    only ones read. Returns the columns and the cursor of the next page
+    (None on the last page). Caller commits.
+    """
+    assert start <= end, "start must be <= end"
+    ids = session.execute(
+        select(HabitORM.id).where(HabitORM.user_id == user_id).order_by(HabitORM.id)
+    ).scalars().all()
+    spans, next_cursor = plan_page(ids, start, end, after=after, limit=limit)
+    if not spans:
+        return FeatureColumns(user_id), None
+
+    materialize_user(
+        session, user_id, through=max(hi for _, _, hi in spans), since=min(lo for _, lo, _ in spans),
+        tz_name=tz_name, habit_ids=[hid for hid, _, _ in spans],
+    )
+    habits = {h.id: h for h in session.query(HabitORM).filter(HabitORM.id.in_([hid for hid, _, _ in spans]))}
+    return _read_columns(session, user_id, [(habits[hid], lo, hi) for hid, lo, hi in spans], tz_name), next_cursor
+
+
+def _read_columns(
+    session: Session, user_id: str, spans: Sequence[Tuple[HabitORM, date, date]], tz_name: Optional[str]
+) -> FeatureColumns:
+    """Stored rows of each (habit, first day, last day) span as columns, in span order."""
+    cols = FeatureColumns(user_id)
+    if not spans:
+        return cols
+
+    # Spans sharing a day range share one condition (a page has at most two others)
+    by_range: Dict[Tuple[date, date], List[int]] = defaultdict(list)
+    for h, lo, hi in spans:
+        by_range[(lo, hi)].append(h.id)
+    stored: Dict[int, Dict[date, tuple]] = defaultdict(dict)
+    for r in session.execute(
+        select(_rows).where(or_(*(
+            and_(_rows.c.habit_id.in_(ids), _rows.c.day >= lo, _rows.c.day <= hi)
+            for (lo, hi), ids in by_range.items()
+        )))
+    ).all():
+        stored[r.habit_id][r.day] = r
+
+    buckets = parse_time_buckets(settings.TIME_BUCKETS)
+    untracked: Optional[ContextMasks] = None
+    labels = cols.context_labels
+
+    for h, start, end in spans:
+        k = cols.add_habit(h)
+        rows = stored.get(h.id, {})
+        for d in _days(start, end):
+            cols.habit_idx.append(k)
+            cols.day_ordinal.append(d.toordinal())
+            r = rows.get(d)
+            if r is None:
+                if untracked is None:
+                    untracked = load_context_masks(
+                        session, user_id, feature_tz_name(session, user_id, tz_name),
+                        min(lo for _, lo, _ in spans), max(hi for _, _, hi in spans), labels,
+                    )
+                m = untracked[d]
+                for col in cols.rates.values():
+                    col.append(0.0)
+                cols.current_streak.append(0)
+                cols.slip_7d_flag.append(False)
+                cols.is_travel.append(bool(m & TRAVEL))
+                cols.is_exam.append(bool(m & EXAM))
+                cols.is_illness.append(bool(m & ILLNESS))
+                cols.context_mask.append(m)
+                cols.hour_bucket.append(None)
+                cols.completion_p10_min.append(_NAN)
+                cols.completion_median_min.append(_NAN)
+                cols.completion_p90_min.append(_NAN)
+                continue
+
+            extra = r.window_rates or {}
+            for w, col in cols.rates.items():
+                col.append(r.last_7d_rate if w == 7 else r.last_30d_rate if w == 30 else extra.get(str(w), 0.0))
+            cols.current_streak.append(r.current_streak)
+            cols.slip_7d_flag.append(r.miss_streak >= SLIP_MISSES)
+            cols.is_travel.append(r.is_travel)
+            cols.is_exam.append(r.is_exam)
+            cols.is_illness.append(r.is_illness)
+            cols.context_mask.append(
+                (TRAVEL if r.is_travel else 0) | (EXAM if r.is_exam else 0) | (ILLNESS if r.is_illness else 0)
+                | labels.encode(r.context_tags or ())
+            )
+            cols.hour_bucket.append(hour_to_bucket(r.median_hour, buckets) if r.median_hour is not None else None)
+            cols.completion_p10_min.append(_NAN if r.completion_p10_min is None else r.completion_p10_min)
+            cols.completion_median_min.append(_NAN if r.completion_median_min is None else r.completion_median_min)
+            cols.completion_p90_min.append(_NAN if r.completion_p90_min is None else r.completion_p90_min)
+    return cols
@@ -1,46 +1,28 @@
 # app/services/features.py
 from __future__ import annotations
-from collections import deque, defaultdict
+from array import array
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime, date, timedelta
-from statistics import median
 from typing import Dict, Iterable, List, Optional, Tuple
 
-import pytz
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.core.settings import settings
-from app.db import HabitORM, EventORM, ContextORM
-
-
-# ---------- Helpers: time-bucket parsing ----------
-
-
-
-def _parse_time_buckets(spec: str) -> List[Tuple[str, int, int]]:
-    parts = [p.strip() for p in spec.split(",") if p.strip()]
-    out: List[Tuple[str, int, int]] = []
-    for p in parts:
-        name, rng = p.split("=")
-        s, e = rng.split("-")
-        out.append((name.strip(), int(s), int(e)))
-    return out
-
-
-def hour_to_bucket(hour: int, buckets: List[Tuple[str, int, int]]) -> Optional[str]:
-    for name, start_h, end_h in buckets:
-        if start_h < end_h:
-            if start_h <= hour < end_h:
-                return name
-        else:  # wrap-around like 22-5
-            if hour >= start_h or hour < end_h:
-                return name
-    return None
+from app.core.timezones import DAY_SECONDS, EPOCH_ORDINAL, DEFAULT_USER_TZ, day_bounds, epoch_seconds, get_zone, is_valid_zone, local_epochs
+from app.db import HabitORM, EventORM, ContextORM, UserORM
+from app.services.time_buckets import parse_time_buckets as _parse_time_buckets, hour_to_bucket
+from app.services.context_flags import EXAM, ILLNESS, TRAVEL, ContextLabels, context_masks
+from app.services.sketches import TimeOfDaySketch, load_sketches
+from app.services.windows import feature_windows, rolling_rates, warmup_days
 
 
 # ---------- Feature rows ----------
 
-@dataclass
+_NAN = float("nan")
+
+@dataclass(slots=True)
 class FeatureRow:
     user_id: str
     habit_id: int
@@ -56,6 +38,179 @@ class FeatureRow:
     is_exam: bool
     is_illness: bool
     slip_7d_flag: bool              # True if 3 consecutive misses up to 'day'
+    # local completion time-of-day quantiles (minutes after midnight)
+    completion_p10_min: Optional[float] = None
+    completion_median_min: Optional[float] = None
+    completion_p90_min: Optional[float] = None
+    # completion rate per FEATURE_WINDOWS window (days -> rate), incl. 7 and 30
+    window_rates: Optional[Dict[int, float]] = None
+    # active context labels beyond travel/exam/illness ("custom" and its tags)
+    context_tags: Tuple[str, ...] = ()
+
+
+class FeatureColumns:
+    """
+    Struct-of-arrays form of the daily feature rows. Per-row values live in
+    typed arrays (completion-time quantiles use NaN for "none"); values that
+    are constant for a habit (difficulty, active) are stored once per habit and
+    reached through `habit_idx`. `context_mask` holds every active context
+    label of the day as bits of `context_labels`.
+    Indexing yields a FeatureRowView, so callers written against FeatureRow
+    keep working without a per-row object being materialized up front.
+    """
+    __slots__ = (
+        "user_id",
+        # per habit
+        "habit_ids", "difficulty", "active",
+        # per row
+        "habit_idx", "day_ordinal", "last_7d_rate", "last_30d_rate", "current_streak",
+        "is_travel", "is_exam", "is_illness", "slip_7d_flag", "hour_bucket",
+        "completion_p10_min", "completion_median_min", "completion_p90_min",
+        "rates", "context_mask", "context_labels",
+    )
+
+    def __init__(self, user_id: str, windows: Optional[Tuple[int, ...]] = None):
+        self.user_id = user_id
+        self.habit_ids: List[int] = []
+        self.difficulty: List[Optional[str]] = []
+        self.active: List[bool] = []
+
+        self.habit_idx = array("i")
+        self.day_ordinal = array("l")
+        # one rate column per window; last_7d/last_30d are the 7 and 30 entries
+        self.rates: Dict[int, array] = {w: array("d") for w in (windows or feature_windows())}
+        self.last_7d_rate = self.rates[7]
+        self.last_30d_rate = self.rates[30]
+        self.current_streak = array("i")
+        self.is_travel = array("b")
+        self.is_exam = array("b")
+        self.is_illness = array("b")
+        self.context_mask = array("Q")
+        self.context_labels = ContextLabels()
+        self.slip_7d_flag = array("b")
+        self.hour_bucket: List[Optional[str]] = []
+        self.completion_p10_min = array("d")
+        self.completion_median_min = array("d")
+        self.completion_p90_min = array("d")
+
+    def add_habit(self, h: HabitORM) -> int:
+        """Record a habit's constant attributes; returns its habit_idx."""
+        status_str = str(getattr(getattr(h, "status", None), "value", getattr(h, "status", None)) or "").lower()
+        diff_val = getattr(h, "difficulty", None)
+        self.habit_ids.append(h.id)
+        self.difficulty.append(str(getattr(diff_val, "value", diff_val)) if diff_val is not None else None)
+        self.active.append(status_str == "active")
+        return len(self.habit_ids) - 1
+
+    def __len__(self) -> int:
+        return len(self.habit_idx)
+
+    def __getitem__(self, i: int) -> "FeatureRowView":
+        n = len(self.habit_idx)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("feature row index out of range")
+        return FeatureRowView(self, i)
+
+    def __iter__(self):
+        return (FeatureRowView(self, i) for i in range(len(self.habit_idx)))
+
+    def to_rows(self) -> List[FeatureRow]:
+        """Materialize FeatureRow objects (compatibility path)."""
+        hids, hidx = self.habit_ids, self.habit_idx
+        return [
+            FeatureRow(
+                user_id=self.user_id,
+                habit_id=hids[k],
+                day=date.fromordinal(o),
+                last_7d_rate=self.last_7d_rate[i],
+                last_30d_rate=self.last_30d_rate[i],
+                current_streak=self.current_streak[i],
+                dow=(o - 1) % 7,
+                hour_bucket=self.hour_bucket[i],
+                difficulty=self.difficulty[k],
+                active=self.active[k],
+                is_travel=bool(self.is_travel[i]),
+                is_exam=bool(self.is_exam[i]),
+                is_illness=bool(self.is_illness[i]),
+                slip_7d_flag=bool(self.slip_7d_flag[i]),
+                completion_p10_min=_nan_none(self.completion_p10_min[i]),
+                completion_median_min=_nan_none(self.completion_median_min[i]),
+                completion_p90_min=_nan_none(self.completion_p90_min[i]),
+                window_rates={w: col[i] for w, col in self.rates.items()},
+                context_tags=self.context_labels.tags(self.context_mask[i]),
+            )
+            for i, (k, o) in enumerate(zip(hidx, self.day_ordinal))
+        ]
+
+
+def _nan_none(v: float) -> Optional[float]:
+    return None if v != v else v
+
+
+def _row_field(name: str, cast=None) -> property:
+    def get(self: "FeatureRowView"):
+        v = getattr(self._cols, name)[self._i]
+        return cast(v) if cast is not None else v
+    return property(get)
+
+
+def _habit_field(name: str) -> property:
+    def get(self: "FeatureRowView"):
+        c = self._cols
+        return getattr(c, name)[c.habit_idx[self._i]]
+    return property(get)
+
+
+class FeatureRowView:
+    """Read-only, FeatureRow-compatible view of row `i` of a FeatureColumns."""
+    __slots__ = ("_cols", "_i")
+
+    def __init__(self, cols: FeatureColumns, i: int):
+        self._cols = cols
+        self._i = i
+
+    @property
+    def user_id(self) -> str:
+        return self._cols.user_id
+
+    @property
+    def habit_id(self) -> int:
+        c = self._cols
+        return c.habit_ids[c.habit_idx[self._i]]
+
+    @property
+    def day(self) -> date:
+        return date.fromordinal(self._cols.day_ordinal[self._i])
+
+    @property
+    def window_rates(self) -> Dict[int, float]:
+        i = self._i
+        return {w: col[i] for w, col in self._cols.rates.items()}
+
+    @property
+    def context_tags(self) -> Tuple[str, ...]:
+        c = self._cols
+        return c.context_labels.tags(c.context_mask[self._i])
+
+    @property
+    def dow(self) -> int:
+        return (self._cols.day_ordinal[self._i] - 1) % 7   # ordinal 1 is a Monday
+
+    last_7d_rate = _row_field("last_7d_rate")
+    last_30d_rate = _row_field("last_30d_rate")
+    current_streak = _row_field("current_streak")
+    is_travel = _row_field("is_travel", bool)
+    is_exam = _row_field("is_exam", bool)
+    is_illness = _row_field("is_illness", bool)
+    slip_7d_flag = _row_field("slip_7d_flag", bool)
+    hour_bucket = _row_field("hour_bucket")
+    completion_p10_min = _row_field("completion_p10_min", _nan_none)
+    completion_median_min = _row_field("completion_median_min", _nan_none)
+    completion_p90_min = _row_field("completion_p90_min", _nan_none)
+    difficulty = _habit_field("difficulty")
+    active = _habit_field("active")
 
 
 # ---------- Core utilities ----------
@@ -67,18 +222,12 @@ def _daterange(start: date, end: date) -> Iterable[date]:
         d += timedelta(days=1)
 
 
-def _to_local_day(ts_utc: datetime, tz: pytz.BaseTzInfo) -> date:
-    return ts_utc.replace(tzinfo=pytz.UTC).astimezone(tz).date()
-
-
-def _median_completion_hour(event_ts_list: List[datetime], tz: pytz.BaseTzInfo) -> Optional[int]:
-    if not event_ts_list:
-        return None
-    hours = []
-    for ts in event_ts_list:
-        local = ts.replace(tzinfo=pytz.UTC).astimezone(tz)
-        hours.append(local.hour)
-    return int(median(hours)) if hours else None
+def feature_tz_name(db: Session, user_id: str, tz_name: Optional[str] = None) -> str:
+    """Zone local days are cut in: `tz_name`, else the user's timezone, else DEFAULT_USER_TZ."""
+    if tz_name:
+        return tz_name
+    user_tz = db.execute(select(UserORM.timezone).where(UserORM.id == str(user_id))).scalar()
+    return user_tz if user_tz and is_valid_zone(user_tz) else DEFAULT_USER_TZ
 
 
 # ---------- Public: build_daily_features ----------
@@ -91,17 +240,36 @@ def build_daily_features(
     tz_name: Optional[str] = None,
 ) -> List[FeatureRow]:
     """
-    Build one row per (habit, day) in [start, end], using a single bulk query
-    for events (with 30d backfill) and one for contexts. Features are computed
-    in Python for portability and performance.
+    Build one row per (habit, day) in [start, end]. Row-object wrapper around
+    build_daily_features_columnar for callers that want FeatureRow instances.
+    """
+    return build_daily_features_columnar(db, user_id, start, end, tz_name).to_rows()
+
+
+def build_daily_features_columnar(
+    db: Session,
+    user_id: str,
+    start: date,
+    end: date,
+    tz_name: Optional[str] = None,
+) -> FeatureColumns:
+    """
+    Build the (habit, day) feature grid for [start, end] as columns, using a
+    single bulk query for events (with enough backfill for the longest
+    FEATURE_WINDOWS window) and one for contexts. Features are computed in
+    Python for portability and performance.
     """
     assert start <= end, "start must be <= end"
 
-    tz = pytz.timezone(tz_name or settings.TIMEZONE)
+    tz = get_zone(feature_tz_name(db, user_id, tz_name))
     buckets = _parse_time_buckets(settings.TIME_BUCKETS)  # dynamic (respects monkeypatch/.env)
+    windows = feature_windows()
 
-    # Backfill to support last_7d and last_30d rolling stats
-    backfill_start = start - timedelta(days=30)
+    # Backfill so every rolling window is full on `start`; completion-time
+    # quantiles keep their own 30-day lookback.
+    warmup = max(30, warmup_days(windows))
+    backfill_start = start - timedelta(days=warmup)
+    sketch_since = start - timedelta(days=30)
 
     # ---- Bulk load habits for the user
     habits: List[HabitORM] = (
@@ -110,122 +278,97 @@ def build_daily_features(
         .all()
     )
     habit_ids = [h.id for h in habits]
+    cols = FeatureColumns(user_id, windows)
     if not habit_ids:
-        return []
+        return cols
 
     # ---- Bulk load events within [backfill_start, end + 1 day)
     events: List[EventORM] = (
         db.query(EventORM)
         .filter(EventORM.habit_id.in_(habit_ids))
-        .filter(EventORM.occurred_at_utc >= datetime.combine(backfill_start, datetime.min.time()))
-        .filter(EventORM.occurred_at_utc < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        .filter(EventORM.occurred_at_utc >= day_bounds(backfill_start, tz)[0])
+        .filter(EventORM.occurred_at_utc < day_bounds(end, tz)[1])
         .all()
     )
 
-    # Collapse to per-(habit, local_day) completion flag and collect completion hours
+    # Collapse to per-(habit, local_day) completion flag and collect completion minutes
     per_day_completed: Dict[Tuple[int, date], bool] = {}
-    completion_ts_by_habit: Dict[int, List[datetime]] = defaultdict(list)
+    completion_minutes_by_habit: Dict[int, List[int]] = defaultdict(list)
 
-    for ev in events:
+    sketch_since_ord = sketch_since.toordinal()
+    wall = local_epochs((epoch_seconds(ev.occurred_at_utc) for ev in events), tz)
+    for ev, s in zip(events, wall):
         # Presence of an event == completed for that local day
-        local_day = _to_local_day(ev.occurred_at_utc, tz)
-        key = (ev.habit_id, local_day)
-        per_day_completed[key] = True
-        completion_ts_by_habit[ev.habit_id].append(ev.occurred_at_utc)
+        o = s // DAY_SECONDS + EPOCH_ORDINAL
+        per_day_completed[(ev.habit_id, date.fromordinal(o))] = True
+        if o >= sketch_since_ord:
+            completion_minutes_by_habit[ev.habit_id].append(s % DAY_SECONDS // 60)
 
-    # ---- Bulk load contexts for the user (UTC → local-day flags)
+    # ---- Bulk load contexts for the user (UTC → local-day label masks)
     contexts: List[ContextORM] = (
         db.query(ContextORM)
         .filter(ContextORM.user_id == user_id)
         .all()
     )
 
-    context_flags_by_day: Dict[date, Dict[str, bool]] = defaultdict(
-        lambda: {"travel": False, "exam": False, "illness": False}
-    )
-    for c in contexts:
-        if c.start_utc is None:
-            continue
-        c_start_local = c.start_utc.replace(tzinfo=pytz.UTC).astimezone(tz).date()
-        c_end_local = (
-            c.end_utc.replace(tzinfo=pytz.UTC).astimezone(tz).date()
-            if c.end_utc is not None else None
-        )
-        win_start = max(start, c_start_local)
-        win_end = min(end, c_end_local) if c_end_local is not None else end
-        if win_start > win_end:
-            continue
-
-        kind_name = str(getattr(c.kind, "value", c.kind)).lower()
-        key = "travel" if "travel" in kind_name else \
-              "exam" if "exam" in kind_name else \
-              "illness" if "illness" in kind_name else None
-        if key:
-            for d in _daterange(win_start, win_end):
-                context_flags_by_day[d][key] = True
-
-    # Compute per-habit observed median completion hour (last 30d window)
+    masks = context_masks(contexts, tz, start, end, cols.context_labels).masks
+
+    # Per-habit completion-time quantiles over exactly [sketch_since, end], merged
+    # from the insert-maintained weekly sketches plus the edge days' events.
+    # Habits whose sketches were filled in a different zone fall back to the
+    # events already loaded.
+    sketch_by_habit = load_sketches(db, habit_ids, since=sketch_since, until=end, tz=str(tz))
+    quantiles_by_habit: Dict[int, Tuple[Optional[float], Optional[float], Optional[float]]] = {}
     median_hour_by_habit: Dict[int, Optional[int]] = {}
     for h in habits:
-        mh = _median_completion_hour(completion_ts_by_habit.get(h.id, []), tz)
-        median_hour_by_habit[h.id] = mh
+        sk = sketch_by_habit.get(h.id)
+        if sk is None:
+            sk = TimeOfDaySketch.from_minutes(completion_minutes_by_habit.get(h.id, ()))
+        q10, q50, q90 = sk.quantile(0.10), sk.quantile(0.50), sk.quantile(0.90)
+        quantiles_by_habit[h.id] = (q10, q50, q90)
+        median_hour_by_habit[h.id] = int(q50 // 60) if q50 is not None else None
+
+    # Build columns
+    days = list(_daterange(start, end))
+    day_ordinals = [d.toordinal() for d in days]
+    travel_col = array("b", (bool(m & TRAVEL) for m in masks))
+    exam_col = array("b", (bool(m & EXAM) for m in masks))
+    illness_col = array("b", (bool(m & ILLNESS) for m in masks))
+
+    all_days = list(_daterange(backfill_start, end))
+    for k, h in enumerate(habits):
+        mhour = median_hour_by_habit[h.id]
+        q10, q50, q90 = quantiles_by_habit[h.id]
+        cols.add_habit(h)
 
-    # Build rows
-    rows: List[FeatureRow] = []
+        # Rolling rates for every window from one prefix sum over warm-up + window
+        flags = [1 if (h.id, d) in per_day_completed else 0 for d in all_days]
+        for w, rates in rolling_rates(flags, windows, warmup).items():
+            cols.rates[w].extend(rates)
 
-    for h in habits:
-        win7: deque[int] = deque([], maxlen=7)
-        win30: deque[int] = deque([], maxlen=30)
+        # Warm-up seeds current_streak only, so day-1 streak is correct
         current_streak = 0
-
-        mhour = median_hour_by_habit[h.id]
-        hbkt = hour_to_bucket(mhour, buckets) if mhour is not None else None
-
-        # 1) Warm-up: seed windows & current_streak ONLY
-        for d in _daterange(backfill_start, start - timedelta(days=1)):
-            completed = 1 if per_day_completed.get((h.id, d), False) else 0
-            win7.append(completed)
-            win30.append(completed)
-            # keep streak historically so day-1 streak is correct
+        for completed in flags[:warmup]:
             current_streak = current_streak + 1 if completed else 0
 
         # Reset miss streak at the start of the requested window
         miss_streak = 0
-
-        # 2) Emit rows for [start..end]
-        for d in _daterange(start, end):
-            completed = 1 if per_day_completed.get((h.id, d), False) else 0
-
-            win7.append(completed)
-            win30.append(completed)
-            last7 = sum(win7) / len(win7)
-            last30 = sum(win30) / len(win30)
-
+        for completed in flags[warmup:]:
             current_streak = current_streak + 1 if completed else 0
             miss_streak = 0 if completed else (miss_streak + 1)
-            slip_flag = miss_streak >= 3
-
-            flags = context_flags_by_day[d]
-            status_str = str(getattr(getattr(h, "status", None), "value", getattr(h, "status", None)) or "").lower()
-            active_val = status_str == "active"
-            diff_val = getattr(h, "difficulty", None)
-            difficulty_str = str(getattr(diff_val, "value", diff_val)) if diff_val is not None else None
-
-            rows.append(FeatureRow(
-                user_id=user_id,
-                habit_id=h.id,
-                day=d,
-                last_7d_rate=round(last7, 4),
-                last_30d_rate=round(last30, 4),
-                current_streak=current_streak,
-                dow=d.weekday(),
-                hour_bucket=hbkt,
-                difficulty=difficulty_str,
-                active=active_val,
-                is_travel=flags["travel"],
-                is_exam=flags["exam"],
-                is_illness=flags["illness"],
-                slip_7d_flag=slip_flag,
-            ))
-
-    return rows
+            cols.current_streak.append(current_streak)
+            cols.slip_7d_flag.append(miss_streak >= 3)
+
+        cols.habit_idx.extend([k] * len(days))
+        cols.day_ordinal.extend(day_ordinals)
+        cols.is_travel.extend(travel_col)
+        cols.is_exam.extend(exam_col)
+        cols.is_illness.extend(illness_col)
+        cols.context_mask.extend(masks)
+        n = len(days)
+        cols.hour_bucket.extend([hour_to_bucket(mhour, buckets) if mhour is not None else None] * n)
+        cols.completion_p10_min.extend(array("d", [_NAN if q10 is None else q10]) * n)
+        cols.completion_median_min.extend(array("d", [_NAN if q50 is None else q50]) * n)
+        cols.completion_p90_min.extend(array("d", [_NAN if q90 is None else q90]) * n)
+
+    return cols
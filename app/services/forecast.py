@@ -0,0 +1,303 @@
+# app/services/forecast.py
+"""
+Completion-probability forecasts from a stored logistic-regression model.
+
+Serving computes each habit's feature rows for yesterday and today with
+the daily_features kernel (feature_store.compute_rows), turns them into a
+small feature matrix and scores it in one vectorized NumPy expression:
+
+    p_today    = P(completed today    | features of yesterday)
+    p_tomorrow = P(completed tomorrow | features of today)
+
+Serving never writes, and it does not wait for the nightly
+features:materialize job: the rows come from one range read of the
+habits' events over the store's warm-up window, which determines every
+model input (streaks are capped at STREAK_CAP days). An event logged a
+minute ago therefore already moves p_tomorrow, and a habit done today has
+p_today = 1.
+
+The model is the newest active `forecast_models` row, loaded once per
+process (reload_model() drops the cache; save_model() does it for you).
+Without one, DEFAULT_MODEL's hand-set coefficients are served. NumPy is
+optional: without it the same model is scored in plain Python.
+
+Training (fits on app.services.training examples, stores + activates):
+    python -m app.services.forecast --start 2025-01-01 --end 2025-06-30 --validation-from 2025-06-01
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.timezones import get_zone, local_day
+from app.db import Base, ForecastModelORM, HabitORM, engine
+from app.services.feature_store import compute_rows
+from app.services.features import feature_tz_name
+
+try:  # optional: vectorized scoring / fitting
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+FEATURES: Tuple[str, ...] = ("rate_7d", "rate_30d", "streak", "slip", "weekend", "context")
+STREAK_CAP = 30
+SLIP_MISSES = 3
+
+
+def feature_vector(
+    rate_7d: float, rate_30d: float, streak: int, slip: bool, target_dow: int, context: bool
+) -> List[float]:
+    """Model inputs for predicting day `target_dow` from the features of the day before it."""
+    return [
+        rate_7d,
+        rate_30d,
+        min(streak, STREAK_CAP) / STREAK_CAP,
+        1.0 if slip else 0.0,
+        1.0 if target_dow >= 5 else 0.0,
+        1.0 if context else 0.0,
+    ]
+
+
+@dataclass(frozen=True)
+class ForecastModel:
+    version: int                    # forecast_models.id; 0 = DEFAULT_MODEL
+    features: Tuple[str, ...]
+    intercept: float
+    coefficients: Tuple[float, ...]
+    _coef: Any = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if tuple(self.features) != FEATURES:
+            raise ValueError(f"model features {self.features} do not match {FEATURES}")
+        if np is not None:
+            object.__setattr__(self, "_coef", np.asarray(self.coefficients, dtype=np.float64))
+
+    def score(self, rows: Sequence[Sequence[float]]) -> List[float]:
+        """Probabilities for a batch of feature vectors."""
+        if not rows:
+            return []
+        if np is not None:
+            z = np.asarray(rows, dtype=np.float64) @ self._coef + self.intercept
+            return (1.0 / (1.0 + np.exp(-z))).tolist()
+        b, w = self.intercept, self.coefficients
+        return [1.0 / (1.0 + math.exp(-(b + sum(c * x for c, x in zip(w, r))))) for r in rows]
+
+
+DEFAULT_MODEL = ForecastModel(
+    version=0,
+    features=FEATURES,
+    intercept=-2.0,
+    coefficients=(2.5, 1.5, 1.0, -0.8, -0.2, -0.7),
+)
+
+_model: Optional[ForecastModel] = None
+_model_lock = threading.Lock()
+
+
+def _load_model(session: Session) -> ForecastModel:
+    row = session.execute(
+        select(ForecastModelORM).where(ForecastModelORM.active.is_(True))
+        .order_by(ForecastModelORM.id.desc()).limit(1)
+    ).scalar_one_or_none()
+    if row is None:
+        return DEFAULT_MODEL
+    return ForecastModel(
+        version=row.id, features=tuple(row.features),
+        intercept=row.intercept, coefficients=tuple(row.coefficients),
+    )
+
+
+def get_model(session: Optional[Session] = None) -> ForecastModel:
+    """The serving model, loaded on first use and then kept for the process."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if session is not None:
+                    _model = _load_model(session)
+                else:
+                    with Session(engine) as s:
+                        _model = _load_model(s)
+    return _model
+
+
+def reload_model() -> None:
+    global _model
+    with _model_lock:
+        _model = None
+
+
+def save_model(
+    session: Session, intercept: float, coefficients: Sequence[float], *, metrics: Optional[Dict[str, Any]] = None
+) -> ForecastModelORM:
+    """Store a model as the active one (older rows are deactivated) and commit."""
+    session.query(ForecastModelORM).filter(ForecastModelORM.active.is_(True)).update({"active": False})
+    row = ForecastModelORM(
+        features=list(FEATURES), intercept=float(intercept),
+        coefficients=[float(c) for c in coefficients], metrics=metrics or {}, active=True,
+    )
+    session.add(row)
+    session.commit()
+    reload_model()
+    return row
+
+
+# ---------- serving ----------
+
+def _row_vector(r: Dict[str, Any], target: date) -> List[float]:
+    context = r["is_travel"] or r["is_exam"] or r["is_illness"] or bool(r["context_tags"])
+    return feature_vector(
+        r["last_7d_rate"], r["last_30d_rate"], r["current_streak"], r["miss_streak"] >= SLIP_MISSES,
+        target.weekday(), context,
+    )
+
+
+def _untracked_vector(target: date) -> List[float]:
+    return feature_vector(0.0, 0.0, 0, False, target.weekday(), False)
+
+
+def forecast_user(
+    session: Session,
+    user_id: str,
+    *,
+    habit_id: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Forecast payload for the user's habits (or one habit; LookupError if the
+    user has no such habit). Read-only; days before a habit was tracked
+    score as untracked.
+    """
+    q = select(HabitORM.id, HabitORM.name).where(HabitORM.user_id == str(user_id)).order_by(HabitORM.id)
+    if habit_id is not None:
+        q = q.where(HabitORM.id == habit_id)
+    habits = session.execute(q).all()
+    if habit_id is not None and not habits:
+        raise LookupError("habit not found")
+
+    tz = get_zone(feature_tz_name(session, str(user_id)))
+    today = local_day(now or datetime.now(timezone.utc), tz)
+    yesterday, tomorrow = today - timedelta(days=1), today + timedelta(days=1)
+    model = get_model(session)
+    if not habits:
+        return {"user_id": str(user_id), "today": today, "model_version": model.version, "habits": []}
+
+    computed = compute_rows(session, str(user_id), [hid for hid, _ in habits], yesterday, today)
+
+    rows: List[List[float]] = []
+    done_today = set()
+    for hid, _ in habits:
+        y, d = computed[hid].get(yesterday), computed[hid].get(today)
+        rows.append(_row_vector(y, today) if y is not None else _untracked_vector(today))
+        rows.append(_row_vector(d, tomorrow) if d is not None else _untracked_vector(tomorrow))
+        if d is not None and d["completed"]:
+            done_today.add(hid)
+    probs = model.score(rows)
+
+    out = []
+    for k, (hid, name) in enumerate(habits):
+        done = hid in done_today
+        out.append({
+            "habit_id": hid,
+            "habit_name": name,
+            "completed_today": done,
+            "p_today": 1.0 if done else round(probs[2 * k], 4),
+            "p_tomorrow": round(probs[2 * k + 1], 4),
+        })
+    return {"user_id": str(user_id), "today": today, "model_version": model.version, "habits": out}
+
+
+def user_forecast(user_id: str, habit_id: Optional[int] = None) -> Dict[str, Any]:
+    """forecast_user on its own session (analytics pool entry point)."""
+    with Session(engine) as session:
+        return forecast_user(session, user_id, habit_id=habit_id)
+
+
+# ---------- training ----------
+
+def example_vector(features: Dict[str, Any]) -> List[float]:
+    """Model inputs of a training example (features of d, label on d + 1)."""
+    context = features["is_travel"] or features["is_exam"] or features["is_illness"] or bool(features["context_tags"])
+    return feature_vector(
+        features["rate_7d"], features["rate_30d"], features["current_streak"],
+        features["slip_7d_flag"], (features["dow"] + 1) % 7, context,
+    )
+
+
+def fit_logistic(X: Any, y: Any, *, l2: float = 1.0, iters: int = 50, tol: float = 1e-8) -> Tuple[float, List[float]]:
+    """L2-regularized logistic regression by Newton's method (IRLS). Requires NumPy."""
+    if np is None:
+        raise RuntimeError("numpy is required to fit forecast models")
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    A = np.hstack([np.ones((X.shape[0], 1)), X])
+    w = np.zeros(A.shape[1])
+    reg = np.full(A.shape[1], l2)
+    reg[0] = 0.0                                   # intercept is not penalized
+    for _ in range(iters):
+        p = 1.0 / (1.0 + np.exp(-(A @ w)))
+        grad = A.T @ (p - y) + reg * w
+        H = (A * (p * (1 - p))[:, None]).T @ A + np.diag(reg)
+        step = np.linalg.solve(H, grad)
+        w -= step
+        if float(np.abs(step).max()) < tol:
+            break
+    return float(w[0]), w[1:].tolist()
+
+
+def log_loss(model: ForecastModel, X: Sequence[Sequence[float]], y: Sequence[int]) -> float:
+    eps = 1e-12
+    p = model.score(X)
+    return sum(-(t * math.log(max(q, eps)) + (1 - t) * math.log(max(1 - q, eps))) for q, t in zip(p, y)) / max(1, len(y))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from app.services.feature_export import all_user_ids
+    from app.services.training import TRAIN, VALIDATION, iter_examples
+
+    p = argparse.ArgumentParser(description="Fit and activate the completion forecast model.")
+    p.add_argument("--start", required=True, type=date.fromisoformat)
+    p.add_argument("--end", required=True, type=date.fromisoformat)
+    p.add_argument("--validation-from", type=date.fromisoformat, default=None)
+    p.add_argument("--l2", type=float, default=1.0)
+    p.add_argument("--dry-run", action="store_true", help="report metrics without storing the model")
+    args = p.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)   # same as app startup; the CLI runs without it
+    data: Dict[Optional[str], Tuple[List[List[float]], List[int]]] = {}
+    with Session(engine) as session:
+        for ex in iter_examples(session, all_user_ids(), args.start, args.end,
+                                horizons=(1,), validation_from=args.validation_from):
+            X, y = data.setdefault(ex.split, ([], []))
+            X.append(example_vector(ex.features))
+            y.append(int(ex.labels[1]))
+
+    train_X, train_y = data.get(TRAIN if args.validation_from else None, ([], []))
+    if not train_y:
+        print(json.dumps({"error": "no training examples"}))
+        return 1
+    intercept, coef = fit_logistic(train_X, train_y, l2=args.l2)
+    fitted = ForecastModel(version=-1, features=FEATURES, intercept=intercept, coefficients=tuple(coef))
+    metrics: Dict[str, Any] = {"train_examples": len(train_y), "train_log_loss": round(log_loss(fitted, train_X, train_y), 5)}
+    if VALIDATION in data:
+        vX, vy = data[VALIDATION]
+        metrics.update(validation_examples=len(vy), validation_log_loss=round(log_loss(fitted, vX, vy), 5),
+                       default_validation_log_loss=round(log_loss(DEFAULT_MODEL, vX, vy), 5))
+
+    version = None
+    if not args.dry_run:
+        with Session(engine) as session:
+            version = save_model(session, intercept, coef, metrics=metrics).id
+    print(json.dumps({"version": version, "intercept": intercept, "coefficients": coef, **metrics}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
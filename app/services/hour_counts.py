@@ -0,0 +1,75 @@
+# app/services/hour_counts.py
+from __future__ import annotations
+from collections import Counter
+from datetime import date, timedelta
+from typing import Iterable, List
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.db import HabitHourCountORM, HabitORM
+from app.services import aggregates
+
+SLOTS = 7 * 24
+_table = HabitHourCountORM.__table__
+
+
+def _monday_of(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def _on_insert(session: Session, events: List[aggregates.InsertedEvent]) -> None:
+    counts = Counter(
+        (e.habit_id, _monday_of(e.local.date()), e.local.weekday() * 24 + e.local.hour)
+        for e in events
+    )
+    stmt = sqlite_insert(_table).values([
+        {"habit_id": hid, "week_start": week, "slot": slot, "count": n}
+        for (hid, week, slot), n in counts.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.habit_id, _table.c.week_start, _table.c.slot],
+        set_={"count": _table.c.count + stmt.excluded["count"]},
+    )
+    session.execute(stmt)
+
+
+def _clear(session: Session, user_id: str, habit_ids: List[int]) -> None:
+    if habit_ids:
+        session.execute(delete(_table).where(_table.c.habit_id.in_(habit_ids)))
+
+
+aggregates.register("hour_counts", on_insert=_on_insert, clear=_clear)
+
+
+# ---------- reads ----------
+
+def hour_of_week_counts(
+    session: Session,
+    *,
+    start: date,
+    end: date,
+    user_id: str | None = None,
+    habit_ids: Iterable[int] | None = None,
+) -> List[int]:
+    """
+    Sum counters into a 168-slot grid (slot = weekday*24 + hour) for local days
+    in [start, end]. Reads at most 168 rows per habit per week in the window.
+    """
+    q = (
+        select(_table.c.week_start, _table.c.slot, func.sum(_table.c.count))
+        .where(_table.c.week_start >= _monday_of(start), _table.c.week_start <= _monday_of(end))
+        .group_by(_table.c.week_start, _table.c.slot)
+    )
+    if user_id is not None:
+        q = q.join(HabitORM, HabitORM.id == _table.c.habit_id).where(HabitORM.user_id == str(user_id))
+    if habit_ids is not None:
+        q = q.where(_table.c.habit_id.in_(list(habit_ids)))
+
+    grid = [0] * SLOTS
+    for week, slot, n in session.execute(q).all():
+        # Edge weeks: keep only slots whose local day falls inside the window
+        if start <= week + timedelta(days=slot // 24) <= end:
+            grid[slot] += int(n)
+    return grid
@@ -0,0 +1,398 @@
+# app/services/jobs.py
+"""
+Background jobs: named, prioritized, time-boxed, with a run history.
+
+A job is a function (session, JobContext) -> Optional[str] registered with
+@job(name, priority=..., budget_seconds=..., nightly=...). It works in small
+committed slices, adds what it processed with ctx.add(n) and checks
+ctx.out_of_time() between slices; when the budget runs out it returns a
+cursor, the run is recorded as "partial" and the next run of that job
+resumes from ctx.cursor. Budgets are cooperative: a slice is never cut off.
+The runner queues a partial job again JOBS_RESUME_DELAY_SECONDS later (so
+other jobs and requests get their turn in between) until it finishes or
+JOBS_RESUME_DEADLINE_SECONDS have passed since its first run; after that
+it waits for its next scheduled run.
+
+Runs go through the process-wide JobRunner: a priority queue (lower number
+first) drained by one worker thread, so scheduled and /admin-triggered work
+never runs in a request handler and never runs two jobs at once in a
+process. A per-job lease (services.leases) keeps the same job from running
+in two processes. Every run is a row in `job_runs` (start, end, status,
+rows processed, cursor, error).
+
+The scheduler submits every nightly job at JOBS_NIGHTLY_CRON; run one now
+with POST /admin/jobs/{name}/run.
+"""
+from __future__ import annotations
+import itertools
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import delete, select, text, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.core.timezones import get_zone, local_day
+from app.db import JobRunORM, ReminderOutboxORM, ReminderSentORM, UserORM
+from app.services import aggregates, leases, rollups
+
+logger = logging.getLogger("scheduler")
+
+_runs = JobRunORM.__table__
+RUNNING, OK, PARTIAL, ERROR = "running", "ok", "partial", "error"
+
+
+class JobContext:
+    """What a running job sees: its resume cursor, its deadline and a row counter."""
+
+    def __init__(self, cursor: Optional[str], budget_seconds: float):
+        self.cursor = cursor
+        self.budget_seconds = budget_seconds
+        self.rows = 0
+        self._deadline = monotonic() + budget_seconds
+
+    def add(self, rows: int) -> None:
+        self.rows += int(rows)
+
+    def out_of_time(self) -> bool:
+        return monotonic() >= self._deadline
+
+
+JobFn = Callable[[Session, JobContext], Optional[str]]
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    fn: JobFn
+    priority: int
+    budget_seconds: float
+    nightly: bool
+    description: str
+
+
+_REGISTRY: Dict[str, Job] = {}
+
+
+def job(name: str, *, priority: int = 50, budget_seconds: float = 300, nightly: bool = False):
+    """Register the decorated function as a job (lower priority runs first)."""
+    def wrap(fn: JobFn) -> JobFn:
+        doc = (fn.__doc__ or "").strip().splitlines()
+        _REGISTRY[name] = Job(name, fn, priority, float(budget_seconds), nightly, doc[0] if doc else "")
+        return fn
+    return wrap
+
+
+def registered() -> List[Job]:
+    return sorted(_REGISTRY.values(), key=lambda j: (j.priority, j.name))
+
+
+def get_job(name: str) -> Job:
+    """Raises KeyError for unknown names."""
+    return _REGISTRY[name]
+
+
+# ---------- running ----------
+
+def _resume_cursor(db: Session, name: str) -> Optional[str]:
+    """The cursor of the job's last finished run, if that run stopped early."""
+    row = db.execute(
+        select(_runs.c.status, _runs.c.cursor)
+        .where(_runs.c.job == name, _runs.c.status != RUNNING)
+        .order_by(_runs.c.id.desc()).limit(1)
+    ).first()
+    return row.cursor if row is not None and row.status == PARTIAL else None
+
+
+def run_job(name: str, *, trigger: str = "manual", session_factory=None) -> Dict[str, Any]:
+    """
+    Run one job to completion or budget in this thread and record the run.
+    Returns the run as a dict; status "skipped" (not recorded) when another
+    process is already running the job.
+    """
+    from app.db import SessionLocal
+
+    spec = get_job(name)
+    session_factory = session_factory or SessionLocal
+    holder = leases.default_holder()
+    lease = f"job:{name}"
+    with session_factory() as db:
+        got = leases.acquire(db, lease, holder, spec.budget_seconds + settings.SCHEDULER_LEASE_SECONDS)
+        db.commit()
+        if not got:
+            return {"job": name, "status": "skipped"}
+        try:
+            # we hold the job's lease, so a run still marked running died with its process
+            db.execute(update(_runs).where(_runs.c.job == name, _runs.c.status == RUNNING).values(
+                status=ERROR, error="interrupted", finished_at=datetime.now(timezone.utc),
+            ))
+            ctx = JobContext(_resume_cursor(db, name), spec.budget_seconds)
+            run_id = db.execute(_runs.insert().values(
+                job=name, trigger=trigger, status=RUNNING, started_at=datetime.now(timezone.utc), rows=0,
+            )).inserted_primary_key[0]
+            db.commit()
+
+            values: Dict[str, Any]
+            try:
+                cursor = spec.fn(db, ctx)
+                db.commit()
+                values = {"status": PARTIAL if cursor else OK, "cursor": cursor}
+            except Exception as e:
+                db.rollback()
+                logger.exception("Job %s failed", name)
+                values = {"status": ERROR, "cursor": ctx.cursor, "error": f"{type(e).__name__}: {e}"[:1000]}
+            values.update(rows=ctx.rows, finished_at=datetime.now(timezone.utc))
+            db.execute(update(_runs).where(_runs.c.id == run_id).values(**values))
+            db.commit()
+            run = dict(db.execute(select(_runs).where(_runs.c.id == run_id)).mappings().one())
+        finally:
+            leases.release(db, lease, holder)
+            db.commit()
+    logger.info("Job %s finished: %s, %s rows", name, run["status"], run["rows"])
+    return run
+
+
+class JobRunner:
+    """Priority queue of job names drained by one daemon thread."""
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._queued: Set[str] = set()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._timers: Dict[str, threading.Timer] = {}
+        self._chain_started: Dict[str, float] = {}     # first run of each job's current partial chain
+        self.current: Optional[str] = None
+
+    def submit(self, name: str, *, trigger: str = "manual") -> bool:
+        """Queue a job; False if it is already waiting. Raises KeyError for unknown jobs."""
+        spec = get_job(name)
+        with self._lock:
+            if name in self._queued:
+                return False
+            self._queued.add(name)
+            self._queue.put((spec.priority, next(self._seq), name, trigger))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="jobs", daemon=True)
+                self._thread.start()
+        return True
+
+    def _work(self) -> None:
+        while True:
+            _, _, name, trigger = self._queue.get()
+            if name is None:
+                self._queue.task_done()
+                return
+            with self._lock:
+                self._queued.discard(name)
+            self.current = name
+            self._chain_started.setdefault(name, monotonic())
+            status = ERROR
+            try:
+                status = run_job(name, trigger=trigger, session_factory=self._session_factory)["status"]
+            except Exception:
+                logger.exception("Job %s could not be run", name)
+            finally:
+                self.current = None
+                self._after_run(name, status)
+                self._queue.task_done()
+
+    def _after_run(self, name: str, status: str) -> None:
+        """Queue a partial run's continuation, unless its chain is past the deadline."""
+        started = self._chain_started.get(name, monotonic())
+        if status != PARTIAL:
+            self._chain_started.pop(name, None)
+            return
+        if monotonic() - started >= settings.JOBS_RESUME_DEADLINE_SECONDS:
+            logger.warning("Job %s still partial after %ss; resuming at its next run",
+                           name, settings.JOBS_RESUME_DEADLINE_SECONDS)
+            self._chain_started.pop(name, None)
+            return
+        delay = settings.JOBS_RESUME_DELAY_SECONDS
+        if delay <= 0:
+            self.submit(name, trigger="resume")
+            return
+        timer = threading.Timer(delay, self._resume, args=(name,))
+        timer.daemon = True
+        with self._lock:
+            self._timers[name] = timer
+        timer.start()
+
+    def _resume(self, name: str) -> None:
+        with self._lock:
+            if self._timers.pop(name, None) is None:        # cancelled by shutdown
+                return
+        self.submit(name, trigger="resume")
+
+    def queued(self) -> List[str]:
+        with self._lock:
+            return sorted(self._queued, key=lambda n: (get_job(n).priority, n))
+
+    def join(self) -> None:
+        """Block until every queued job has run."""
+        self._queue.join()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            timers, self._timers = list(self._timers.values()), {}
+        for timer in timers:
+            timer.cancel()
+        if thread is not None and thread.is_alive():
+            self._queue.put((float("inf"), next(self._seq), None, None))
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> JobRunner:
+    """The process-wide job runner."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner()
+    return _runner
+
+
+def shutdown_jobs() -> None:
+    global _runner
+    with _runner_lock:
+        if _runner is not None:
+            _runner.shutdown()
+            _runner = None
+
+
+def submit_nightly(trigger: str = "schedule") -> List[str]:
+    """Queue every nightly job (the scheduler's JOBS_NIGHTLY_CRON entry point)."""
+    runner = get_runner()
+    return [j.name for j in registered() if j.nightly and runner.submit(j.name, trigger=trigger)]
+
+
+def job_runs(db: Session, *, name: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Most recent runs first."""
+    q = select(_runs).order_by(_runs.c.id.desc()).limit(limit)
+    if name is not None:
+        q = q.where(_runs.c.job == name)
+    return [dict(r) for r in db.execute(q).mappings()]
+
+
+def job_overview(db: Session) -> List[Dict[str, Any]]:
+    """Every registered job with its settings and last run."""
+    runner = get_runner()
+    queued = set(runner.queued())
+    out = []
+    for j in registered():
+        last = job_runs(db, name=j.name, limit=1)
+        out.append({
+            "name": j.name,
+            "description": j.description,
+            "priority": j.priority,
+            "budget_seconds": j.budget_seconds,
+            "nightly": j.nightly,
+            "queued": j.name in queued,
+            "running": runner.current == j.name,
+            "last_run": last[0] if last else None,
+        })
+    return out
+
+
+# ---------- nightly jobs ----------
+
+def _user_slices(db: Session, ctx: JobContext, work: Callable[[str], int]) -> Optional[str]:
+    """Call work(user_id) user by user in id order from ctx.cursor, committing each; cursor if out of time."""
+    q = select(UserORM.id).order_by(UserORM.id)
+    if ctx.cursor:
+        q = q.where(UserORM.id > ctx.cursor)
+    for uid in db.execute(q).scalars().all():
+        ctx.add(work(uid))
+        db.commit()
+        ctx.cursor = uid
+        if ctx.out_of_time():
+            return uid
+    return None
+
+
+@job("rollups:rebuild", priority=10, budget_seconds=900, nightly=True)
+def rebuild_rollups(db: Session, ctx: JobContext) -> Optional[str]:
+    """Replay the rollups of users whose totals drifted from their habits'; rows = events replayed.
+
+    Rollups are written in the same transaction as the events they count,
+    habit deletes subtract their share and timezone changes replay the user,
+    so nothing drifts through the app and a nightly full replay would only
+    redo identical work. This checks each user's yearly totals instead and
+    replays just the users that disagree (rows written out of band);
+    POST /admin/aggregates/rebuild still forces a full replay.
+    """
+    def work(uid: str) -> int:
+        return aggregates.rebuild_user(db, uid, ["rollups"]) if rollups.totals_drifted(db, uid) else 0
+
+    return _user_slices(db, ctx, work)
+
+
+@job("features:materialize", priority=20, budget_seconds=900, nightly=True)
+def materialize_features(db: Session, ctx: JobContext) -> Optional[str]:
+    """Bring every user's daily feature rows up to their local today; rows = rows written."""
+    from app.services.feature_store import materialize_user
+    from app.services.features import feature_tz_name
+
+    now = datetime.now(timezone.utc)
+
+    def work(uid: str) -> int:
+        today = local_day(now, get_zone(feature_tz_name(db, uid)))
+        # a first touch starts at yesterday; reads extend the rows backwards as they need them
+        return materialize_user(db, uid, through=today, since=today - timedelta(days=1))
+
+    return _user_slices(db, ctx, work)
+
+
+PRUNE_CHUNK = 5000
+
+
+def _prune_chunks(db: Session, ctx: JobContext, table, key, where) -> Optional[str]:
+    """Delete matching rows PRUNE_CHUNK at a time by primary key; "more" if out of time."""
+    while True:
+        ids = [tuple(r) for r in db.execute(select(*key).where(where).limit(PRUNE_CHUNK)).all()]
+        if not ids:
+            return None
+        cond = key[0].in_([i[0] for i in ids]) if len(key) == 1 else tuple_(*key).in_(ids)
+        ctx.add(db.execute(delete(table).where(cond)).rowcount)
+        db.commit()
+        if ctx.out_of_time():
+            return "more"
+
+
+@job("maintenance:prune", priority=30, budget_seconds=300, nightly=True)
+def prune_history(db: Session, ctx: JobContext) -> Optional[str]:
+    """Drop reminder_sent, delivered/dead outbox rows and job runs past retention; rows = rows deleted."""
+    now = datetime.now(timezone.utc)
+    sent, outbox = ReminderSentORM.__table__, ReminderOutboxORM.__table__
+    sent_cutoff = (now - timedelta(days=settings.REMINDER_SENT_RETENTION_DAYS)).date()
+    outbox_cutoff = now - timedelta(days=settings.REMINDER_OUTBOX_RETENTION_DAYS)
+    steps = [
+        (sent, [sent.c.habit_id, sent.c.local_day], sent.c.local_day < sent_cutoff),
+        (outbox, [outbox.c.id], outbox.c.status.in_(["sent", "dead"]) & (outbox.c.created_at < outbox_cutoff)),
+        (_runs, [_runs.c.id], (_runs.c.started_at < now - timedelta(days=settings.JOB_RUN_RETENTION_DAYS))
+         & (_runs.c.status != RUNNING)),
+    ]
+    for table, key, where in steps:
+        if _prune_chunks(db, ctx, table, key, where):
+            return "more"
+    return None
+
+
+@job("maintenance:optimize", priority=90, budget_seconds=120, nightly=True)
+def optimize_indexes(db: Session, ctx: JobContext) -> Optional[str]:
+    """Refresh the query planner's index statistics (SQLite PRAGMA optimize)."""
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(text("PRAGMA optimize"))
+    return None
@@ -0,0 +1,73 @@
+# app/services/leases.py
+"""
+Database leases: at most one live holder per named role.
+
+A lease row (scheduler_leases) names its holder and an expiry. acquire() is
+a single upsert that succeeds when the row is free, already ours (a renewal)
+or expired, so two processes racing for the role cannot both win. A holder
+that dies simply stops renewing; once its lease expires the next process to
+try takes over. release() expires the lease at once for a clean hand-over.
+
+Expiry compares the processes' clocks, so they should share one (same host,
+or NTP); the lease length leaves room for small skew.
+"""
+from __future__ import annotations
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.db import SchedulerLeaseORM
+
+_leases = SchedulerLeaseORM.__table__
+
+
+def default_holder() -> str:
+    """host:pid:nonce, unique per process start."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+def acquire(db: Session, name: str, holder: str, ttl_seconds: float, now: Optional[datetime] = None) -> bool:
+    """
+    Take or renew lease `name` for `ttl_seconds`; True if `holder` now holds
+    it. Caller commits (promptly: the row stays write-locked until then).
+    """
+    now = now or datetime.now(timezone.utc)
+    stmt = sqlite_insert(_leases).values(
+        name=name, holder=holder, acquired_at=now, renewed_at=now, expires_at=now + timedelta(seconds=ttl_seconds),
+    )
+    mine = _leases.c.holder == stmt.excluded.holder
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[_leases.c.name],
+        set_={
+            "holder": stmt.excluded.holder,
+            "acquired_at": case((mine, _leases.c.acquired_at), else_=stmt.excluded.acquired_at),
+            "renewed_at": stmt.excluded.renewed_at,
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=or_(mine, _leases.c.expires_at <= stmt.excluded.renewed_at),
+    ))
+    return db.execute(select(_leases.c.holder).where(_leases.c.name == name)).scalar() == holder
+
+
+def release(db: Session, name: str, holder: str, now: Optional[datetime] = None) -> bool:
+    """Expire our lease now so another process can take it. Caller commits."""
+    now = now or datetime.now(timezone.utc)
+    res = db.execute(
+        update(_leases).where(_leases.c.name == name, _leases.c.holder == holder).values(expires_at=now)
+    )
+    return res.rowcount > 0
+
+
+def current_lease(db: Session, name: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """The lease row as a dict (with `live`), or None if nobody ever held it."""
+    row = db.execute(select(_leases).where(_leases.c.name == name)).mappings().first()
+    if row is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return {**row, "live": row["expires_at"] > now}
@@ -0,0 +1,285 @@
+# app/services/outbox.py
+"""
+Reminder outbox: detection writes, delivery drains.
+
+The reminder cycle and the reminder wheel only enqueue() what they find:
+one bulk INSERT per batch into `reminder_outbox`, idempotent per (habit,
+local day), so re-detecting a reminder never queues it twice. The same call
+records the habit/day in `reminder_sent`, which detection then skips. dispatch()
+drains pending rows in id order, REMINDER_DISPATCH_BATCH at a time, hands
+each batch to a sink and marks it sent. A failed batch is retried with
+exponential backoff (REMINDER_RETRY_BASE_SECONDS * 2**attempt, capped) and
+given up on ("dead") after REMINDER_MAX_ATTEMPTS.
+
+Sinks (settings.REMINDER_SINK):
+    log                     one logger line per reminder (the old behaviour)
+    stdout | file:<path>    JSON Lines
+    http(s)://...           POST {"reminders": [...]} per batch (httpx)
+
+Delivery runs as its own scheduler job, so its throughput is independent of
+detection and can be measured on its own:
+    python -m app.services.outbox --sink file:/tmp/reminders.jsonl
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Protocol, Sequence
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.db import Base, ReminderOutboxORM, ReminderSentORM, engine
+
+if TYPE_CHECKING:
+    from app.services.reminders import DueReminder
+
+logger = logging.getLogger("scheduler")
+
+_outbox = ReminderOutboxORM.__table__
+_sent = ReminderSentORM.__table__
+PENDING, SENT, DEAD = "pending", "sent", "dead"
+MAX_BACKOFF = timedelta(hours=1)
+CHUNK_ROWS = 500        # rows per multi-row statement, well inside SQLite's bound-variable limit
+
+
+@dataclass(frozen=True)
+class OutboxMessage:
+    id: int
+    user_id: str
+    habit_id: int
+    habit_name: str
+    local_day: date
+    attempts: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "habit_id": self.habit_id,
+            "habit_name": self.habit_name,
+            "day": self.local_day.isoformat(),
+        }
+
+
+def chunked(items: Sequence[Any], size: int = CHUNK_ROWS) -> Iterator[Sequence[Any]]:
+    """Consecutive slices of at most `size` items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def enqueue(db: Session, due: Iterable["DueReminder"]) -> int:
+    """
+    Queue due reminders and record them in reminder_sent, so detection skips
+    them for the rest of their day (already queued habit/days are ignored).
+    Inserts CHUNK_ROWS rows per statement. Returns rows added; caller commits.
+    """
+    rows = [
+        {"user_id": r.user_id, "habit_id": r.habit_id, "habit_name": r.habit_name, "local_day": r.day}
+        for r in due
+    ]
+    added = 0
+    for chunk in chunked(rows):
+        db.execute(
+            sqlite_insert(_sent)
+            .values([{"user_id": r["user_id"], "habit_id": r["habit_id"], "local_day": r["local_day"]} for r in chunk])
+            .on_conflict_do_nothing(index_elements=[_sent.c.habit_id, _sent.c.local_day])
+        )
+        stmt = sqlite_insert(_outbox).values(chunk).on_conflict_do_nothing(
+            index_elements=[_outbox.c.habit_id, _outbox.c.local_day]
+        )
+        added += db.execute(stmt).rowcount
+    return added
+
+
+# ---------- sinks ----------
+
+class Sink(Protocol):
+    name: str
+
+    def send(self, batch: Sequence[OutboxMessage]) -> None:
+        """Deliver the whole batch or raise."""
+
+
+class LogSink:
+    name = "log"
+
+    def send(self, batch: Sequence[OutboxMessage]) -> None:
+        for m in batch:
+            logger.info("[Reminder] User %s: %s due today", m.user_id, m.habit_name)
+
+
+class FileSink:
+    """JSON Lines to a file (appended) or, with path "-", to stdout."""
+
+    def __init__(self, path: str = "-"):
+        self.path = path
+        self.name = "stdout" if path == "-" else f"file:{path}"
+
+    def send(self, batch: Sequence[OutboxMessage]) -> None:
+        body = "".join(json.dumps(m.to_dict(), separators=(",", ":")) + "\n" for m in batch)
+        if self.path == "-":
+            sys.stdout.write(body)
+            sys.stdout.flush()
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(body)
+
+
+class WebhookSink:
+    """POSTs each batch as {"reminders": [...]}; any non-2xx answer fails the batch."""
+
+    def __init__(self, url: str, *, timeout: float = 10.0, client: Any = None):
+        import httpx
+
+        self.url = url
+        self.name = url
+        self._client = client or httpx.Client(timeout=timeout)
+
+    def send(self, batch: Sequence[OutboxMessage]) -> None:
+        r = self._client.post(self.url, json={"reminders": [m.to_dict() for m in batch]})
+        r.raise_for_status()
+
+
+def sink_from_spec(spec: str) -> Sink:
+    """"log", "stdout", "file:<path>" or an http(s) URL. Raises ValueError otherwise."""
+    spec = spec.strip()
+    if spec == "log":
+        return LogSink()
+    if spec == "stdout":
+        return FileSink("-")
+    if spec.startswith("file:") and len(spec) > 5:
+        return FileSink(spec[5:])
+    if spec.startswith(("http://", "https://")):
+        return WebhookSink(spec, timeout=settings.REMINDER_WEBHOOK_TIMEOUT_SECONDS)
+    raise ValueError(f"unknown reminder sink: {spec!r}")
+
+
+_sink: Optional[Sink] = None
+
+
+def get_sink() -> Sink:
+    """The process-wide sink built from settings.REMINDER_SINK."""
+    global _sink
+    if _sink is None:
+        _sink = sink_from_spec(settings.REMINDER_SINK)
+    return _sink
+
+
+# ---------- dispatch ----------
+
+def backoff(attempts: int) -> timedelta:
+    """Delay before retry number `attempts` (1-based)."""
+    return min(MAX_BACKOFF, timedelta(seconds=settings.REMINDER_RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+
+
+def _claim(db: Session, now: datetime, limit: int, after_id: int) -> List[OutboxMessage]:
+    rows = db.execute(
+        select(_outbox.c.id, _outbox.c.user_id, _outbox.c.habit_id, _outbox.c.habit_name,
+               _outbox.c.local_day, _outbox.c.attempts)
+        .where(_outbox.c.status == PENDING, _outbox.c.next_attempt_at <= now, _outbox.c.id > after_id)
+        .order_by(_outbox.c.id)
+        .limit(limit)
+    ).all()
+    return [OutboxMessage(*r) for r in rows]
+
+
+def dispatch(
+    db: Session,
+    sink: Optional[Sink] = None,
+    *,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Drain pending reminders whose next attempt is due into `sink` (default:
+    get_sink()), one batch at a time, committing after each. Returns
+    delivery stats, including messages per second.
+    """
+    sink = sink or get_sink()
+    batch_size = max(1, batch_size or settings.REMINDER_DISPATCH_BATCH)
+    now = now or datetime.now(timezone.utc)
+    t0 = perf_counter()
+    sent = retried = dead = batches = 0
+    after_id = 0                              # a failed batch is not retried within this call
+
+    while max_batches is None or batches < max_batches:
+        batch = _claim(db, now, batch_size, after_id)
+        if not batch:
+            break
+        batches += 1
+        after_id = batch[-1].id
+        try:
+            sink.send(batch)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:500]
+            logger.warning("Reminder sink %s failed for %s messages: %s", sink.name, len(batch), error)
+            by_attempts: Dict[int, List[int]] = defaultdict(list)
+            for m in batch:
+                by_attempts[m.attempts + 1].append(m.id)
+            for attempts, group in by_attempts.items():
+                _fail(db, group, attempts, now, error)
+                if attempts >= settings.REMINDER_MAX_ATTEMPTS:
+                    dead += len(group)
+                else:
+                    retried += len(group)
+        else:
+            db.execute(
+                update(_outbox).where(_outbox.c.id.in_([m.id for m in batch]))
+                .values(status=SENT, sent_at=now, last_error=None)
+            )
+            sent += len(batch)
+        db.commit()
+
+    seconds = perf_counter() - t0
+    return {
+        "sink": sink.name,
+        "batches": batches,
+        "sent": sent,
+        "retried": retried,
+        "dead": dead,
+        "seconds": round(seconds, 4),
+        "per_sec": round(sent / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+
+def _fail(db: Session, ids: List[int], attempts: int, now: datetime, error: str) -> None:
+    values: Dict[str, Any] = {"attempts": attempts, "last_error": error}
+    if attempts >= settings.REMINDER_MAX_ATTEMPTS:
+        values["status"] = DEAD
+    else:
+        values["next_attempt_at"] = now + backoff(attempts)
+    db.execute(update(_outbox).where(_outbox.c.id.in_(ids)).values(**values))
+
+
+def outbox_counts(db: Session) -> Dict[str, int]:
+    counts = {PENDING: 0, SENT: 0, DEAD: 0}
+    counts.update(dict(db.execute(select(_outbox.c.status, func.count()).group_by(_outbox.c.status)).all()))
+    return counts
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Drain the reminder outbox once and report delivery throughput.")
+    p.add_argument("--sink", default=None, help="sink spec (default: REMINDER_SINK)")
+    p.add_argument("--batch-size", type=int, default=None)
+    args = p.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)   # same as app startup; the CLI runs without it
+    sink = sink_from_spec(args.sink) if args.sink else get_sink()
+    with Session(engine) as session:
+        stats = dispatch(session, sink, batch_size=args.batch_size)
+        stats["outbox"] = outbox_counts(session)
+    print(json.dumps(stats), file=sys.stderr if isinstance(sink, FileSink) and sink.path == "-" else sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,189 @@
+# app/services/pools.py
+"""
+Dedicated, size-limited executors for CPU-heavy request work.
+
+Heavy analytics used to run in Starlette's shared sync thread pool, where a few
+long builds could starve cheap endpoints. A BoundedPool admits at most
+`workers + queue_limit` calls at once; anything beyond that is rejected with
+PoolSaturated so the caller can answer 503 + Retry-After instead of queueing.
+"""
+from __future__ import annotations
+import asyncio
+import functools
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(Exception):
+    """Raised when a pool's queue is full; carries a Retry-After hint in seconds."""
+
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(f"pool '{pool}' is saturated")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+def _invoke(fn: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[float, float, Any]:
+    """Runs inside the worker (thread or process); reports wall-clock start/end."""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time(), result
+
+
+def _worker_init() -> None:
+    # Spawned processes import app.db fresh; make sure no pooled sqlite
+    # connection is ever shared with the parent.
+    from app.db import engine
+    engine.dispose(close=False)
+
+
+class BoundedPool:
+    def __init__(self, name: str, *, kind: str = "thread", workers: int = 2, queue_limit: int = 8):
+        if kind not in ("thread", "process"):
+            raise ValueError("pool kind must be 'thread' or 'process'")
+        self.name = name
+        self.kind = kind
+        self.workers = max(1, int(workers))
+        self.queue_limit = max(0, int(queue_limit))
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+        # stats
+        self._in_flight = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    # ---------- lifecycle ----------
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_worker_init,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=f"pool-{self.name}"
+                )
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # ---------- admission ----------
+
+    def _retry_after(self) -> int:
+        done = self._completed
+        avg_run = (self._run_total / done) if done else 1.0
+        backlog = max(0, self._in_flight - self.workers) + 1
+        return max(1, math.ceil(avg_run * backlog / self.workers))
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_limit:
+                self._rejected += 1
+                raise PoolSaturated(self.name, self._retry_after())
+            self._in_flight += 1
+            self._submitted += 1
+
+    def _release(self, enqueued: float, fut: Future) -> None:
+        # Runs when the worker finishes, even if the awaiting request went away,
+        # so admission always reflects work actually occupying the pool.
+        with self._lock:
+            self._in_flight -= 1
+            if fut.cancelled() or fut.exception() is not None:
+                self._failed += 1
+                return
+            started, finished, _ = fut.result()
+            self._completed += 1
+            wait = max(0.0, started - enqueued)
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._run_total += max(0.0, finished - started)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run fn(*args, **kwargs) on this pool. For process pools fn, its
+        arguments and its result must be picklable (module-level functions).
+        """
+        self._admit()
+        enqueued = time.time()
+        try:
+            fut = self._get_executor().submit(_invoke, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+                self._failed += 1
+            raise
+        fut.add_done_callback(functools.partial(self._release, enqueued))
+        _, _, result = await asyncio.wrap_future(fut)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            done = self._completed
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_ms": round(1000 * self._wait_total / done, 3) if done else 0.0,
+                "max_wait_ms": round(1000 * self._wait_max, 3),
+                "avg_run_ms": round(1000 * self._run_total / done, 3) if done else 0.0,
+            }
+
+
+# ---------- registry ----------
+
+_POOLS: Dict[str, BoundedPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(name: str = "analytics") -> BoundedPool:
+    """Lazily create named pools from settings (ANALYTICS_POOL_*)."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(name)
+        if pool is None:
+            from app.core.settings import settings
+            pool = BoundedPool(
+                name,
+                kind=settings.ANALYTICS_POOL_KIND,
+                workers=settings.ANALYTICS_POOL_WORKERS,
+                queue_limit=settings.ANALYTICS_QUEUE_LIMIT,
+            )
+            _POOLS[name] = pool
+            logger.info("Pool %s created (%s, workers=%s, queue=%s)", name, pool.kind, pool.workers, pool.queue_limit)
+        return pool
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    with _POOLS_LOCK:
+        return {name: pool.stats() for name, pool in _POOLS.items()}
+
+
+def shutdown_pools() -> None:
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.shutdown()
+        _POOLS.clear()
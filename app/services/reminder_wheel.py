@@ -0,0 +1,244 @@
+# app/services/reminder_wheel.py
+"""
+Reminder wheel: fires each user's reminder at their own local time.
+
+Every user has one reminder slot per local day (reminder_schedules.local_minute,
+default settings.REMINDER_LOCAL_TIME). The wheel keeps a heap of
+(next slot as a UTC instant, user) and each tick pops only the entries whose
+instant has arrived, asks due_reminders() about exactly those users (one
+set-based call per distinct slot instant) and pushes each user's following
+slot. A tick with nothing due costs one cheap sync query.
+
+- Slots are computed per local day, so DST shifts are absorbed: a wall time
+  skipped by a spring-forward gap fires as far after the jump as it was
+  after the old midnight (02:30 -> 03:30), and a repeated fall-back time
+  fires at its first occurrence only.
+- last_fired_on is stored per user: after downtime, a slot missed by at most
+  REMINDER_CATCHUP_HOURS fires on the first tick (once, for its own local
+  day); older ones are skipped. Restarts never fire a day twice.
+- Users created or updated (timezone, reminder time) since the last tick are
+  picked up through their updated_at, so the heap never needs a rebuild.
+"""
+from __future__ import annotations
+import heapq
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.core.timezones import ZoneLike, get_zone, local_day, localize
+from app.db import ReminderScheduleORM, UserORM
+from app.services.outbox import chunked, enqueue
+from app.services.reminders import DueReminder, due_reminders
+
+_schedules = ReminderScheduleORM.__table__
+SYNC_OVERLAP = timedelta(minutes=1)     # re-read rows committed while the previous sync ran
+
+
+def parse_local_time(spec: str) -> int:
+    """"HH:MM" -> minutes past local midnight. Raises ValueError."""
+    try:
+        h, m = (int(p) for p in spec.strip().split(":"))
+    except (AttributeError, ValueError) as e:
+        raise ValueError(f"invalid local time: {spec!r}") from e
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise ValueError(f"invalid local time: {spec!r}")
+    return h * 60 + m
+
+
+def format_local_time(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def default_minute() -> int:
+    return parse_local_time(settings.REMINDER_LOCAL_TIME)
+
+
+def slot_utc(day: date, minute: int, tz: ZoneLike) -> datetime:
+    """UTC instant of local `minute` on `day` (see module docstring for DST)."""
+    return localize(datetime.combine(day, time()) + timedelta(minutes=minute), tz)
+
+
+def next_slot(minute: int, tz: ZoneLike, after: datetime) -> Tuple[date, datetime]:
+    """(local day, UTC instant) of the first slot strictly after `after`."""
+    d = local_day(after, tz) - timedelta(days=1)
+    while True:
+        at = slot_utc(d, minute, tz)
+        if at > after:
+            return d, at
+        d += timedelta(days=1)
+
+
+def last_slot(minute: int, tz: ZoneLike, now: datetime) -> Tuple[date, datetime]:
+    """(local day, UTC instant) of the latest slot at or before `now`."""
+    d = local_day(now, tz) + timedelta(days=1)
+    while True:
+        at = slot_utc(d, minute, tz)
+        if at <= now:
+            return d, at
+        d -= timedelta(days=1)
+
+
+class ReminderWheel:
+    """In-process heap of users' next reminder slots; tick() is thread-safe."""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str, int, date]] = []    # (epoch, user_id, version, local day)
+        self._users: Dict[str, Tuple[Optional[str], Optional[int], Optional[date]]] = {}
+        self._version: Dict[str, int] = {}
+        self._synced_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def next_fire(self, user_id: str) -> Optional[datetime]:
+        """Scheduled instant of the user's pending slot (None if unknown)."""
+        v = self._version.get(user_id)
+        for at, uid, ver, _ in self._heap:
+            if uid == user_id and ver == v:
+                return datetime.fromtimestamp(at, timezone.utc)
+        return None
+
+    # ---------- scheduling ----------
+
+    def _schedule(self, user_id: str, tz_name: Optional[str], minute: Optional[int],
+                  last_fired: Optional[date], now: datetime) -> None:
+        tz = get_zone(tz_name)
+        m = default_minute() if minute is None else minute
+        day, at = last_slot(m, tz, now)
+        missed = (last_fired is None or last_fired < day) and now - at <= timedelta(hours=settings.REMINDER_CATCHUP_HOURS)
+        if not missed:
+            day, at = next_slot(m, tz, now)
+            while last_fired is not None and day <= last_fired:     # e.g. timezone moved after today's slot fired
+                day, at = next_slot(m, tz, at)
+        ver = self._version.get(user_id, 0) + 1
+        self._version[user_id] = ver
+        self._users[user_id] = (tz_name, minute, last_fired)
+        heapq.heappush(self._heap, (at.timestamp(), user_id, ver, day))
+
+    def _sync(self, db: Session, now: datetime) -> int:
+        """(Re)schedule users created or changed since the last sync (everyone on the first)."""
+        started = datetime.now(timezone.utc)
+        q = (
+            select(UserORM.id, UserORM.timezone, _schedules.c.local_minute, _schedules.c.last_fired_on)
+            .outerjoin(_schedules, _schedules.c.user_id == UserORM.id)
+        )
+        if self._synced_at is not None:
+            since = self._synced_at - SYNC_OVERLAP
+            q = q.where(or_(UserORM.updated_at >= since, _schedules.c.updated_at >= since))
+        n = 0
+        for uid, tz_name, minute, last_fired in db.execute(q).all():
+            if self._users.get(uid) != (tz_name, minute, last_fired):
+                self._schedule(uid, tz_name, minute, last_fired, now)
+                n += 1
+        self._synced_at = started
+        return n
+
+    # ---------- firing ----------
+
+    def tick(self, db: Session, now: Optional[datetime] = None) -> List[DueReminder]:
+        """
+        Fire every slot that has arrived by `now`: queues the due reminders of
+        those users in the outbox, records last_fired_on and commits, and only
+        then schedules each user's next slot. On failure the session is rolled
+        back and the popped slots go back on the heap unchanged, so the next
+        tick retries them. Returns the due reminders.
+        """
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            self._sync(db, now)
+            cutoff = now.timestamp()
+            popped: List[Tuple[float, str, int, date]] = []
+            arrived: Dict[float, Dict[str, date]] = defaultdict(dict)
+            while self._heap and self._heap[0][0] <= cutoff:
+                entry = heapq.heappop(self._heap)
+                popped.append(entry)
+                at, uid, ver, day = entry
+                if self._version.get(uid) == ver:
+                    arrived[at][uid] = day
+            if not arrived:
+                return []
+
+            fired = {uid: day for group in arrived.values() for uid, day in group.items()}
+            try:
+                alive = set()
+                for ids in chunked(list(fired)):
+                    alive.update(db.execute(select(UserORM.id).where(UserORM.id.in_(ids))).scalars())
+                due: List[DueReminder] = []
+                for at, group in sorted(arrived.items()):
+                    ids = [uid for uid in group if uid in alive]
+                    if ids:
+                        due.extend(due_reminders(db, datetime.fromtimestamp(at, timezone.utc), user_ids=ids, skip_notified=True))
+
+                for ids in chunked(sorted(alive)):
+                    stmt = sqlite_insert(_schedules).values(
+                        [{"user_id": uid, "last_fired_on": fired[uid], "updated_at": now} for uid in ids]
+                    )
+                    db.execute(stmt.on_conflict_do_update(
+                        index_elements=[_schedules.c.user_id],
+                        set_={"last_fired_on": stmt.excluded.last_fired_on},
+                    ))
+                enqueue(db, due)
+                db.commit()
+            except Exception:
+                db.rollback()
+                for entry in popped:
+                    heapq.heappush(self._heap, entry)
+                raise
+
+            for uid, day in fired.items():
+                if uid in alive:
+                    tz_name, minute, _ = self._users[uid]
+                    self._schedule(uid, tz_name, minute, day, now)
+                else:                                   # user deleted: forget it
+                    self._users.pop(uid, None)
+                    self._version.pop(uid, None)
+        return due
+
+
+_wheel: Optional[ReminderWheel] = None
+_wheel_lock = threading.Lock()
+
+
+def get_wheel() -> ReminderWheel:
+    """The process-wide wheel the scheduler ticks."""
+    global _wheel
+    if _wheel is None:
+        with _wheel_lock:
+            if _wheel is None:
+                _wheel = ReminderWheel()
+    return _wheel
+
+
+# ---------- per-user reminder time ----------
+
+def reminder_schedule(db: Session, user: UserORM, now: Optional[datetime] = None) -> Dict[str, object]:
+    """The user's effective reminder time and the UTC instant of their next slot."""
+    row = db.get(ReminderScheduleORM, user.id)
+    minute = row.local_minute if row is not None else None
+    m = default_minute() if minute is None else minute
+    tz = get_zone(user.timezone)
+    _, at = next_slot(m, tz, now or datetime.now(timezone.utc))
+    return {
+        "user_id": user.id,
+        "local_time": format_local_time(m),
+        "is_default": minute is None,
+        "timezone": tz.key,
+        "next_fire_utc": at,
+    }
+
+
+def set_reminder_time(db: Session, user_id: str, minute: Optional[int]) -> None:
+    """Set (or with None, reset to the default) a user's reminder time. Caller commits."""
+    row = db.get(ReminderScheduleORM, user_id)
+    if row is None:
+        db.add(ReminderScheduleORM(user_id=user_id, local_minute=minute))
+    else:
+        row.local_minute = minute
+        row.updated_at = datetime.now(timezone.utc)     # picked up by the wheel's next sync
@@ -1,109 +1,299 @@
 # app/services/reminders.py
+"""
+Set-based reminder engine.
+
+A (user, habit) pair is due when the habit is active, has no event in the
+user's current local day and no context of the user covers that day (any
+context mutes all of a user's reminders). Instead of walking users and
+habits one query at a time, due_reminders() answers for every user at once:
+
+  1. one query for the distinct user timezones,
+  2. one query joining habits to a `day_bounds` VALUES CTE holding each
+     zone's local day and its [lo, hi) UTC bounds, with anti-joins against
+     "completed that day" and against covering contexts.
+
+"Completed" is a range probe of the (habit_id, occurred_at_utc) event index
+over the day's UTC bounds. It reads the events themselves rather than the
+habit_rollups day rows, so it holds for events no rollup was built for.
+The cycle and the wheel also pass skip_notified=True to drop habits already
+in reminder_sent for the day, so once a habit has been queued, later runs
+skip it with one more PK lookup.
+
+So a cycle costs the same two statements for ten users or ten thousand.
+
+get_due_habits() (GET /users/{id}/reminders) serves from an in-process
+due-set cache: a user's due set only depends on their local day and their
+data, so it is computed once per user per day and stored with the user's
+data version (app.services.versions), which every write to their events,
+habits, contexts or user row bumps in its own transaction. Each lookup reads
+that version (one primary-key read) and treats a different one as a miss, so
+writes committed by any process invalidate it. The version is read before
+the set is computed: a write landing in between leaves the entry tagged with
+the older version, which never matches again.
+
+run_reminder_cycle() (the full scan) pages through users by keyset
+(id > last id, REMINDER_BATCH_SIZE at a time) and fans the pages out to
+REMINDER_WORKERS threads, each with its own session; each page's due
+reminders are bulk-queued in the outbox (app.services.outbox), which a
+separate job delivers. Every cycle records its duration against
+REMINDER_CYCLE_BUDGET_SECONDS; cycle_stats() reports the recent ones, and
+an over-budget cycle is logged instead of passing unnoticed.
+"""
 from __future__ import annotations
-from datetime import datetime, timezone
-from zoneinfo import ZoneInfo
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from time import perf_counter
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
-from sqlalchemy import select, or_
+from sqlalchemy import Date, String, and_, column, exists, func, or_, select, values
+from sqlalchemy.orm import Session
 
-from app.db import UserORM, HabitORM, EventORM, ContextORM
-from app.models.schemas import ReminderDue
+from app.core.settings import settings
+from app.core.timezones import day_bounds, get_zone, local_day
+from app.db import ContextORM, EventORM, HabitORM, ReminderSentORM, UTCDateTime, UserORM
+from app.models.schemas import HabitStatus, ReminderDue
+from app.services.outbox import enqueue
+from app.services.versions import user_version
 
-# If you store status as Enum on the ORM, import that Enum;
-# otherwise we'll compare strings safely inside _is_active.
-try:
-    from app.models.schemas import HabitStatus  # your Enum lives in schemas
-except Exception:
-    HabitStatus = None
+logger = logging.getLogger("scheduler")
 
+_sent = ReminderSentORM.__table__
 
-def _local_day_bounds(as_of_utc: datetime, tz: ZoneInfo):
-    local = as_of_utc.astimezone(tz)
-    start_local = local.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_local = local.replace(hour=23, minute=59, second=59, microsecond=999_999)
-    return start_local.astimezone(timezone.utc), end_local.astimezone(timezone.utc)
 
+class DueReminder(NamedTuple):
+    user_id: str
+    habit_id: int
+    habit_name: str
+    day: date           # the user's local day the reminder is for
 
-def _is_active(status_value) -> bool:
-    """Allow either Enum or plain string for habit.status."""
-    if HabitStatus and isinstance(status_value, HabitStatus):
-        return status_value == HabitStatus.active
-    return str(status_value).lower() == "active"
 
+def _day_bounds_cte(db, as_of_utc: datetime, user_ids: Optional[List[str]]):
+    """
+    VALUES CTE (tz, day, lo, hi): every user zone's local day at as_of_utc
+    and its UTC bounds.
+    """
+    tz_key = func.coalesce(UserORM.timezone, "")
+    q = select(tz_key).distinct()
+    if user_ids is not None:
+        q = q.where(UserORM.id.in_(user_ids))
+    rows = []
+    for name in db.execute(q).scalars():
+        tz = get_zone(name)             # blank/unknown -> DEFAULT_USER_TZ, like everywhere else
+        today = local_day(as_of_utc, tz)
+        rows.append((name, today, *day_bounds(today, tz)))
+    if not rows:
+        return None
+    return values(
+        column("tz", String), column("day", Date), column("lo", UTCDateTime()), column("hi", UTCDateTime()),
+        name="day_bounds",
+    ).data(rows).cte("day_bounds")
 
-def _has_active_context(db, user_id, day_start_utc: datetime, day_end_utc: datetime) -> bool:
-    """Return True if any context overlaps [day_start_utc, day_end_utc]."""
-    user_id_str = str(user_id)  # <<< IMPORTANT for SQLite TEXT PKs
+
+def due_reminders(
+    db, as_of_utc: datetime, *, user_ids: Optional[Iterable[str]] = None, skip_notified: bool = False
+) -> List[DueReminder]:
+    """
+    Every due (user, habit) pair at `as_of_utc`, ordered by user and habit,
+    optionally restricted to `user_ids` and, with skip_notified, to habits
+    not yet notified that day. Two statements in total.
+    """
+    if as_of_utc.tzinfo is None:
+        as_of_utc = as_of_utc.replace(tzinfo=timezone.utc)
+    ids = None if user_ids is None else [str(u) for u in user_ids]
+    bounds = _day_bounds_cte(db, as_of_utc, ids)
+    if bounds is None:
+        return []
+
+    done_today = exists().where(
+        EventORM.habit_id == HabitORM.id,
+        EventORM.occurred_at_utc >= bounds.c.lo,
+        EventORM.occurred_at_utc < bounds.c.hi,
+    )
+    muted = exists().where(
+        ContextORM.user_id == UserORM.id,
+        ContextORM.start_utc < bounds.c.hi,
+        or_(ContextORM.end_utc.is_(None), ContextORM.end_utc >= bounds.c.lo),
+    )
     q = (
-        select(ContextORM.id)
-        .where(
-            ContextORM.user_id == user_id_str,
-            ContextORM.start_utc <= day_end_utc,
-            # allow open-ended contexts: end_utc IS NULL OR end_utc >= day_start
-            or_(ContextORM.end_utc == None, ContextORM.end_utc >= day_start_utc),
-        )
-        .limit(1)
+        select(UserORM.id, HabitORM.id, HabitORM.name, bounds.c.day)
+        .join(HabitORM, HabitORM.user_id == UserORM.id)
+        .join(bounds, bounds.c.tz == func.coalesce(UserORM.timezone, ""))
+        .where(and_(HabitORM.status == HabitStatus.active, ~done_today, ~muted))
+        .order_by(UserORM.id, HabitORM.id)
     )
-    return db.execute(q).first() is not None
+    if skip_notified:
+        q = q.where(~exists().where(_sent.c.habit_id == HabitORM.id, _sent.c.local_day == bounds.c.day))
+    if ids is not None:
+        q = q.where(UserORM.id.in_(ids))
+    return [DueReminder(*row) for row in db.execute(q).all()]
+
+
+# ---------- per-user due-set cache ----------
+
+class _DueSetCache:
+    """LRU of user_id -> (timezone, local day, data version, due set); thread-safe."""
 
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[Optional[str], date, int, Tuple[ReminderDue, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
 
-def get_due_habits(db, user: UserORM, as_of_utc: datetime):
+    def get(self, user_id: str, tz_name: Optional[str], day: date, version: int) -> Optional[Tuple[ReminderDue, ...]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[:3] != (tz_name, day, version):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, user_id: str, tz_name: Optional[str], day: date, version: int,
+            due: Tuple[ReminderDue, ...]) -> None:
+        with self._lock:
+            self._entries[user_id] = (tz_name, day, version, due)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max(1, settings.REMINDER_DUE_CACHE_USERS):
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_due_cache = _DueSetCache()
+
+
+def get_due_habits(db, user: UserORM, as_of_utc: datetime) -> List[ReminderDue]:
     """
     Return a list of ReminderDue for THIS user:
       - only ACTIVE habits
       - that have NO events in the user's local day window
       - and are NOT suppressed by an active context window
+    Served from the due-set cache while the user's data version is unchanged.
     """
-    tz = ZoneInfo(user.timezone or "UTC")
-    day_start_utc, day_end_utc = _local_day_bounds(as_of_utc, tz)
+    if as_of_utc.tzinfo is None:
+        as_of_utc = as_of_utc.replace(tzinfo=timezone.utc)
+    day = local_day(as_of_utc, get_zone(user.timezone))
+    version = user_version(db, user.id)
+    cached = _due_cache.get(user.id, user.timezone, day, version)
+    if cached is None:
+        cached = tuple(
+            ReminderDue(habit_id=r.habit_id, habit_name=r.habit_name)
+            for r in due_reminders(db, as_of_utc, user_ids=[user.id])
+        )
+        _due_cache.put(user.id, user.timezone, day, version, cached)
+    return list(cached)
 
-    # If any context is active for this user today, mute all reminders.
-    if _has_active_context(db, user.id, day_start_utc, day_end_utc):
-        return []
 
-    # Fetch this user's habits (owner scoped)
-    user_id_str = str(user.id)
-    habits = db.execute(
-        select(HabitORM.id, HabitORM.name, HabitORM.status).where(HabitORM.user_id == user_id_str)
-    ).all()
-
-    due: list[ReminderDue] = []
-    for hid, hname, status in habits:
-        if not _is_active(status):
-            continue
-
-        # Any event today for this habit?
-        has_event = (
-            db.execute(
-                select(EventORM.id)
-                .where(
-                    EventORM.habit_id == hid,
-                    EventORM.occurred_at_utc >= day_start_utc,
-                    EventORM.occurred_at_utc <= day_end_utc,
-                )
-                .limit(1)
-            ).first()
-            is not None
-        )
-        if not has_event:
-            due.append(ReminderDue(habit_id=hid, habit_name=hname))
+def due_cache_stats() -> Dict[str, int]:
+    return {"users": len(_due_cache), "hits": _due_cache.hits, "misses": _due_cache.misses}
+
+
+def iter_user_pages(db, batch_size: int) -> Iterator[List[str]]:
+    """User ids in ascending pages of at most `batch_size` (keyset, no OFFSET)."""
+    last: Optional[str] = None
+    while True:
+        q = select(UserORM.id).order_by(UserORM.id).limit(batch_size)
+        if last is not None:
+            q = q.where(UserORM.id > last)
+        page = list(db.execute(q).scalars())
+        if not page:
+            return
+        yield page
+        if len(page) < batch_size:
+            return
+        last = page[-1]
+
+
+def _page_due(bind, as_of_utc: datetime, user_ids: List[str]) -> List[DueReminder]:
+    with Session(bind) as session:
+        return due_reminders(session, as_of_utc, user_ids=user_ids, skip_notified=True)
+
+
+_HISTORY = 20
+_cycles: deque = deque(maxlen=_HISTORY)
+_cycles_lock = threading.Lock()
+_skipped_runs = 0
+
+
+def record_skipped_run() -> None:
+    """Count a scheduled cycle that never ran (the previous one was still going)."""
+    global _skipped_runs
+    with _cycles_lock:
+        _skipped_runs += 1
+
 
-    return due
+def cycle_stats() -> Dict[str, Any]:
+    """Recent full-scan cycles (newest last) and how many scheduled runs were skipped."""
+    with _cycles_lock:
+        return {
+            "budget_seconds": settings.REMINDER_CYCLE_BUDGET_SECONDS,
+            "skipped_runs": _skipped_runs,
+            "cycles": list(_cycles),
+        }
 
 
-def run_reminder_cycle(db, as_of_utc: datetime) -> int:
+def run_reminder_cycle(
+    db, as_of_utc: datetime, *, workers: Optional[int] = None, batch_size: Optional[int] = None
+) -> int:
     """
-    One full pass: for each user, compute due habits and log them.
-    Returns the total number of due items found.
+    One full pass: page through users by keyset, compute each page's due
+    habits on the worker pool (workers <= 1: inline on `db`) and queue them
+    in the outbox, committing per page. Returns the total number of due
+    items found.
     """
-    import logging
-    logger = logging.getLogger("scheduler")
+    workers = max(1, settings.REMINDER_WORKERS if workers is None else workers)
+    batch_size = max(1, batch_size or settings.REMINDER_BATCH_SIZE)
+    budget = float(settings.REMINDER_CYCLE_BUDGET_SECONDS)
+    t0 = perf_counter()
+    total = queued = users = pages = 0
+    over_budget = False
 
-    total = 0
-    users = db.execute(select(UserORM)).scalars().all()
+    def handle(page: List[str], due: List[DueReminder]) -> None:
+        nonlocal total, queued, users, pages, over_budget
+        users += len(page)
+        pages += 1
+        total += len(due)
+        queued += enqueue(db, due)
+        db.commit()
+        if not over_budget and perf_counter() - t0 > budget:
+            over_budget = True
+            logger.warning("Reminder cycle over its %.0fs budget after %s users; continuing", budget, users)
 
-    for user in users:
-        for item in get_due_habits(db, user, as_of_utc):
-            logger.info("[Reminder] User %s: %s due today", user.id, item.habit_name)
-            total += 1
+    if workers == 1:
+        for page in iter_user_pages(db, batch_size):
+            handle(page, due_reminders(db, as_of_utc, user_ids=page, skip_notified=True))
+    else:
+        bind = db.get_bind()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reminders") as pool:
+            pending: deque = deque()
+            for page in iter_user_pages(db, batch_size):
+                pending.append((page, pool.submit(_page_due, bind, as_of_utc, page)))
+                while len(pending) >= 2 * workers:       # bounded read-ahead
+                    done_page, fut = pending.popleft()
+                    handle(done_page, fut.result())
+            while pending:
+                done_page, fut = pending.popleft()
+                handle(done_page, fut.result())
 
+    seconds = perf_counter() - t0
+    with _cycles_lock:
+        _cycles.append({
+            "as_of": as_of_utc.isoformat(),
+            "users": users,
+            "pages": pages,
+            "workers": workers,
+            "due": total,
+            "queued": queued,
+            "seconds": round(seconds, 3),
+            "over_budget": seconds > budget,
+        })
     return total
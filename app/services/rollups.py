@@ -0,0 +1,238 @@
+# app/services/rollups.py
+"""
+Hierarchical completion rollups (day → ISO week → month → year), per habit
+and per user, maintained on event insert.
+
+A "completion" is one (habit, local day) with at least one event, so a day
+only counts the first time it is seen. Range queries are answered by
+decomposing the range into the coarsest stored periods that fit inside it,
+e.g. a five-year monthly chart reads ~60 month rows plus a few edge days.
+"""
+from __future__ import annotations
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.db import HabitORM, HabitRollupORM, UserRollupORM
+from app.services import aggregates
+
+LEVELS = ("day", "week", "month", "year")
+
+_habit_t = HabitRollupORM.__table__
+_user_t = UserRollupORM.__table__
+
+
+# ---------- calendar helpers ----------
+
+def period_start(d: date, level: str) -> date:
+    if level == "day":
+        return d
+    if level == "week":
+        return d - timedelta(days=d.weekday())
+    if level == "month":
+        return d.replace(day=1)
+    if level == "year":
+        return d.replace(month=1, day=1)
+    raise ValueError(f"unknown rollup level: {level}")
+
+
+def period_end(start: date, level: str) -> date:
+    """Last local day (inclusive) of the period starting at `start`."""
+    if level == "day":
+        return start
+    if level == "week":
+        return start + timedelta(days=6)
+    if level == "month":
+        nxt = date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+        return nxt - timedelta(days=1)
+    if level == "year":
+        return date(start.year, 12, 31)
+    raise ValueError(f"unknown rollup level: {level}")
+
+
+def _finer(level: str) -> str:
+    # weeks don't nest in months, so partial weeks/months drop straight to days
+    return "month" if level == "year" else "day"
+
+
+def cover(a: date, b: date, level: str) -> List[Tuple[str, date]]:
+    """Decompose [a, b] into (level, period_start) keys, coarsest first."""
+    out: List[Tuple[str, date]] = []
+    d = a
+    while d <= b:
+        s = period_start(d, level)
+        e = period_end(s, level)
+        if s == d and e <= b:
+            out.append((level, s))
+            d = e + timedelta(days=1)
+        else:
+            seg_end = min(e, b)
+            out.extend(cover(d, seg_end, _finer(level)))
+            d = seg_end + timedelta(days=1)
+    return out
+
+
+# ---------- maintenance ----------
+
+def _upsert(session: Session, table, key_col: str, counts: Counter) -> None:
+    if not counts:
+        return
+    stmt = sqlite_insert(table).values([
+        {key_col: owner, "level": level, "period_start": start, "completions": n}
+        for (owner, level, start), n in counts.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[key_col], table.c.level, table.c.period_start],
+        set_={"completions": table.c.completions + stmt.excluded.completions},
+    )
+    session.execute(stmt)
+
+
+def _on_insert(session: Session, events: List[aggregates.InsertedEvent]) -> None:
+    days = {(e.habit_id, e.user_id, e.local.date()) for e in events}
+
+    # Only the first event of a (habit, local day) is a new completion
+    existing = set(session.execute(
+        select(_habit_t.c.habit_id, _habit_t.c.period_start).where(
+            _habit_t.c.level == "day",
+            _habit_t.c.habit_id.in_({h for h, _, _ in days}),
+            _habit_t.c.period_start.in_({d for _, _, d in days}),
+        )
+    ).all())
+
+    habit_counts: Counter = Counter()
+    user_counts: Counter = Counter()
+    for hid, uid, d in days:
+        if (hid, d) in existing:
+            continue
+        for level in LEVELS:
+            p = period_start(d, level)
+            habit_counts[(hid, level, p)] += 1
+            user_counts[(uid, level, p)] += 1
+
+    _upsert(session, _habit_t, "habit_id", habit_counts)
+    _upsert(session, _user_t, "user_id", user_counts)
+
+
+def _clear(session: Session, user_id: str, habit_ids: List[int]) -> None:
+    if habit_ids:
+        session.execute(delete(_habit_t).where(_habit_t.c.habit_id.in_(habit_ids)))
+    session.execute(delete(_user_t).where(_user_t.c.user_id == user_id))
+
+
+aggregates.register("rollups", on_insert=_on_insert, clear=_clear)
+
+
+def forget_habit(session: Session, habit_id: int, user_id: str) -> None:
+    """
+    Subtract a habit's rollups from its user's totals; call before deleting
+    the habit (its own rows cascade with it). Caller commits.
+    """
+    own = _habit_t.alias("own")
+    match = (
+        (own.c.habit_id == habit_id)
+        & (own.c.level == _user_t.c.level)
+        & (own.c.period_start == _user_t.c.period_start)
+    )
+    session.execute(
+        update(_user_t)
+        .where(_user_t.c.user_id == str(user_id), exists().where(match))
+        .values(completions=_user_t.c.completions - select(own.c.completions).where(match).scalar_subquery())
+    )
+    session.execute(delete(_user_t).where(_user_t.c.user_id == str(user_id), _user_t.c.completions <= 0))
+
+
+def totals_drifted(session: Session, user_id: str) -> bool:
+    """
+    Whether the user's yearly totals disagree with the sum of their habits'
+    (two small indexed reads): the cheap check for rollups written out of band.
+    """
+    per_habit = session.execute(
+        select(_habit_t.c.period_start, func.sum(_habit_t.c.completions))
+        .join(HabitORM, HabitORM.id == _habit_t.c.habit_id)
+        .where(HabitORM.user_id == str(user_id), _habit_t.c.level == "year")
+        .group_by(_habit_t.c.period_start)
+    ).all()
+    per_user = session.execute(
+        select(_user_t.c.period_start, _user_t.c.completions)
+        .where(_user_t.c.user_id == str(user_id), _user_t.c.level == "year")
+    ).all()
+    return {p: n for p, n in per_habit if n} != {p: n for p, n in per_user if n}
+
+
+# ---------- reads ----------
+
+def _fetch(session: Session, keys: List[Tuple[str, date]], *, user_id: str, habit_id: Optional[int]) -> Dict[Tuple[str, date], int]:
+    by_level: Dict[str, set] = defaultdict(set)
+    for level, start in keys:
+        by_level[level].add(start)
+
+    if habit_id is not None:
+        t, owner_col, owner = _habit_t, _habit_t.c.habit_id, habit_id
+    else:
+        t, owner_col, owner = _user_t, _user_t.c.user_id, str(user_id)
+
+    found: Dict[Tuple[str, date], int] = {}
+    for level, starts in by_level.items():
+        rows = session.execute(
+            select(t.c.period_start, t.c.completions).where(
+                owner_col == owner, t.c.level == level, t.c.period_start.in_(starts)
+            )
+        ).all()
+        for start, n in rows:
+            found[(level, start)] = n
+    return found
+
+
+def trend(
+    session: Session,
+    *,
+    user_id: str,
+    start: date,
+    end: date,
+    granularity: str = "month",
+    habit_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Completion totals per `granularity` period intersecting [start, end].
+
+    Opportunities follow weekly_completion: every habit counts on every day of
+    the range (one per day when scoped to a single habit), so they are derived
+    from the habit count rather than stored.
+    """
+    if granularity not in LEVELS:
+        raise ValueError(f"granularity must be one of {', '.join(LEVELS)}")
+
+    buckets: List[Tuple[date, date, date, List[Tuple[str, date]]]] = []
+    s = period_start(start, granularity)
+    while s <= end:
+        lo, hi = max(s, start), min(period_end(s, granularity), end)
+        buckets.append((s, lo, hi, cover(lo, hi, granularity)))
+        s = period_end(s, granularity) + timedelta(days=1)
+
+    found = _fetch(session, [k for *_, keys in buckets for k in keys], user_id=user_id, habit_id=habit_id)
+
+    if habit_id is not None:
+        per_day = 1
+    else:
+        per_day = session.execute(
+            select(func.count(HabitORM.id)).where(HabitORM.user_id == str(user_id))
+        ).scalar_one()
+
+    out: List[Dict[str, Any]] = []
+    for s, lo, hi, keys in buckets:
+        days = (hi - lo).days + 1
+        completions = sum(found.get(k, 0) for k in keys)
+        opportunities = per_day * days
+        out.append({
+            "period_start": s.isoformat(),
+            "days": days,
+            "completions": completions,
+            "opportunities": opportunities,
+            "completion_pct": (completions / opportunities) if opportunities else 0.0,
+        })
+    return out
@@ -1,10 +1,14 @@
 import logging
+import threading
 from datetime import datetime, timezone
+from typing import Callable, Optional
 
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
-from zoneinfo import ZoneInfo
+
+from app.core.timezones import get_zone
 
 logger = logging.getLogger("scheduler")
 
@@ -23,10 +27,56 @@ def _reminder_job():
     finally:
         db.close()
 
+def _reminder_tick():
+    """Wheel tick: fires only the users whose local reminder time has arrived."""
+    from app.db import SessionLocal
+    from app.services.reminder_wheel import get_wheel
+
+    db = SessionLocal()
+    try:
+        due = get_wheel().tick(db)     # commits
+        if due:
+            logger.info("Reminder tick fired; %s due items.", len(due))
+    except Exception:
+        logger.exception("Reminder tick failed")
+    finally:
+        db.close()
+
+def _dispatch_job():
+    """Drain the reminder outbox into the configured sink (independent of detection)."""
+    from app.db import SessionLocal
+    from app.services.outbox import dispatch
+
+    db = SessionLocal()
+    try:
+        stats = dispatch(db)
+        if stats["batches"]:
+            logger.info("Reminder dispatch: %s", stats)
+    except Exception:
+        logger.exception("Reminder dispatch failed")
+    finally:
+        db.close()
+
+def _nightly_jobs():
+    """Queue the nightly precomputation jobs on the job runner (they run in priority order)."""
+    from app.services.jobs import submit_nightly
+
+    queued = submit_nightly()
+    logger.info("Nightly jobs queued: %s", ", ".join(queued) or "none")
+
+def _job_skipped(event):
+    """A run was dropped (previous one still running, or missed its grace time): say so."""
+    from app.services import reminders
+
+    if event.job_id == "reminders:cron":
+        reminders.record_skipped_run()
+    logger.warning("Scheduled job %s skipped its %s run", event.job_id, event.scheduled_run_time)
+
 def _create_scheduler() -> BackgroundScheduler:
     """
     One scheduler per process.
-    If REMINDER_CRON is set, use it. Otherwise fall back to REMINDER_INTERVAL_MINUTES.
+    If REMINDER_CRON is set, run the legacy full scan on it. Otherwise tick the
+    reminder wheel every REMINDER_TICK_SECONDS.
     """
     from app.core.settings import settings
 
@@ -35,8 +85,9 @@ def _create_scheduler() -> BackgroundScheduler:
         "max_instances": 1  # no overlapping jobs
     }
 
-    tz = ZoneInfo(settings.TIMEZONE)
+    tz = get_zone(settings.TIMEZONE)
     sched = BackgroundScheduler(timezone=tz, job_defaults=job_defaults)
+    sched.add_listener(_job_skipped, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
 
     if settings.REMINDER_CRON:  # prefer CRON when provided
         trigger = CronTrigger.from_crontab(settings.REMINDER_CRON, timezone=tz)
@@ -49,21 +100,136 @@ def _create_scheduler() -> BackgroundScheduler:
         )
         logger.info("Scheduler configured with CRON=%s TZ=%s", settings.REMINDER_CRON, settings.TIMEZONE)
     else:
-        minutes = int(settings.REMINDER_INTERVAL_MINUTES)
+        seconds = int(settings.REMINDER_TICK_SECONDS)
         sched.add_job(
-            _reminder_job,
-            trigger=IntervalTrigger(minutes=minutes),
-            id="reminders:interval",
+            _reminder_tick,
+            trigger=IntervalTrigger(seconds=seconds),
+            id="reminders:wheel",
             replace_existing=True,
-            misfire_grace_time=60,
+            misfire_grace_time=seconds,
+        )
+        logger.info("Scheduler configured with reminder wheel tick=%ss default time=%s",
+                    seconds, settings.REMINDER_LOCAL_TIME)
+
+    sched.add_job(
+        _dispatch_job,
+        trigger=IntervalTrigger(seconds=int(settings.REMINDER_DISPATCH_SECONDS)),
+        id="reminders:outbox",
+        replace_existing=True,
+        misfire_grace_time=int(settings.REMINDER_DISPATCH_SECONDS),
+    )
+
+    if settings.JOBS_NIGHTLY_CRON:
+        sched.add_job(
+            _nightly_jobs,
+            trigger=CronTrigger.from_crontab(settings.JOBS_NIGHTLY_CRON, timezone=tz),
+            id="jobs:nightly",
+            replace_existing=True,
+            misfire_grace_time=3600,
         )
-        logger.info("Scheduler configured with interval=%s min TZ=%s", minutes, settings.TIMEZONE)
 
     return sched
 
+LEASE_NAME = "scheduler"
+
+class SchedulerLeader:
+    """
+    Runs the job scheduler only while this process holds the "scheduler"
+    lease. Every process started by `uvicorn --workers N` runs one of these:
+    a heartbeat thread renews the lease (or tries to take it) every
+    SCHEDULER_HEARTBEAT_SECONDS. The holder starts the jobs; a process whose
+    renewal fails stops them at once. When a holder dies its lease expires
+    after SCHEDULER_LEASE_SECONDS and the next heartbeat elsewhere takes over.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], BackgroundScheduler] = _create_scheduler,
+        *,
+        holder: Optional[str] = None,
+        session_factory=None,
+    ):
+        from app.services.leases import default_holder
+
+        self.factory = factory
+        self.holder = holder or default_holder()
+        self._session_factory = session_factory
+        self._sched: Optional[BackgroundScheduler] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._sched is not None
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.db import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def heartbeat(self) -> bool:
+        """Renew or try to take the lease, then start/stop the jobs to match."""
+        from app.core.settings import settings
+        from app.services import leases
+
+        try:
+            with self._session() as db:
+                held = leases.acquire(db, LEASE_NAME, self.holder, settings.SCHEDULER_LEASE_SECONDS)
+                db.commit()
+        except Exception:
+            logger.exception("Scheduler lease heartbeat failed; not running jobs")
+            held = False
+
+        with self._lock:
+            if held and self._sched is None and not self._stop.is_set():
+                self._sched = self.factory()
+                self._sched.start()
+                logger.info("Scheduler lease acquired by %s; jobs started", self.holder)
+            elif not held and self._sched is not None:
+                self._stop_jobs()
+                logger.warning("Scheduler lease lost by %s; jobs stopped", self.holder)
+        return held
+
+    def _stop_jobs(self) -> None:
+        sched, self._sched = self._sched, None
+        if sched is not None:
+            sched.shutdown(wait=False)
+
+    def _run(self) -> None:
+        from app.core.settings import settings
+
+        while not self._stop.wait(settings.SCHEDULER_HEARTBEAT_SECONDS):
+            self.heartbeat()
+
+    def start(self) -> None:
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._run, name="scheduler-lease", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the heartbeat and the jobs; hand the lease over if we held it."""
+        from app.services import leases
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._lock:
+            was_leader = self._sched is not None
+            self._stop_jobs()
+        if was_leader:
+            try:
+                with self._session() as db:
+                    leases.release(db, LEASE_NAME, self.holder)
+                    db.commit()
+            except Exception:
+                logger.exception("Could not release the scheduler lease; it expires on its own")
+
 def start_scheduler(app) -> None:
     """
-    Start once per worker. Safe in dev. Respects TESTING/DISABLE_SCHEDULER.
+    Start the lease heartbeat once per worker; whichever worker holds the
+    lease runs the jobs. Respects TESTING/DISABLE_SCHEDULER.
     """
     from app.core.settings import settings
 
@@ -74,10 +240,10 @@ def start_scheduler(app) -> None:
         logger.info("Scheduler already present on app.state; skipping")
         return
 
-    sched = _create_scheduler()
-    sched.start()
-    app.state.scheduler = sched
-    logger.info("Scheduler started")
+    leader = SchedulerLeader()
+    leader.start()
+    app.state.scheduler = leader
+    logger.info("Scheduler heartbeat started as %s (leader=%s)", leader.holder, leader.is_leader)
 
 def shutdown_scheduler(app) -> None:
     sched = getattr(app.state, "scheduler", None)
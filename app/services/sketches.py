@@ -0,0 +1,247 @@
+# app/services/sketches.py
+"""
+Persisted quantile sketches over local completion time-of-day.
+
+Completion times live on a small bounded domain (minutes of a day), so the
+sketch is a fixed-bin histogram at 15-minute resolution: 96 counters, exact
+to within one bin, and mergeable by element-wise addition, which is what
+t-digest/KLL buy on unbounded domains. One lifetime row and one row per ISO
+week are kept per habit. Day ranges merge the weekly rows of the weeks they
+cover whole and sketch their partial edge weeks (at most six days at each
+end) from the events, so a range never reaches past its days.
+"""
+from __future__ import annotations
+import math
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.timezones import day_bounds, to_local
+from app.db import EventORM, HabitTimeSketchORM
+from app.services import aggregates
+
+BIN_MINUTES = 15
+N_BINS = 24 * 60 // BIN_MINUTES
+ALL = "all"
+
+_table = HabitTimeSketchORM.__table__
+
+
+class TimeOfDaySketch:
+    __slots__ = ("bins",)
+
+    def __init__(self, bins: Optional[List[int]] = None):
+        self.bins = list(bins) if bins else [0] * N_BINS
+
+    @classmethod
+    def from_times(cls, times: Iterable[datetime]) -> "TimeOfDaySketch":
+        sk = cls()
+        for t in times:
+            sk.add(t)
+        return sk
+
+    @classmethod
+    def from_minutes(cls, minutes: Iterable[int]) -> "TimeOfDaySketch":
+        """Sketch of local minutes-after-midnight (0..1439)."""
+        sk = cls()
+        bins = sk.bins
+        for m in minutes:
+            bins[m // BIN_MINUTES] += 1
+        return sk
+
+    def add(self, local: datetime, n: int = 1) -> None:
+        self.bins[(local.hour * 60 + local.minute) // BIN_MINUTES] += n
+
+    def merge(self, other: "TimeOfDaySketch") -> "TimeOfDaySketch":
+        self.bins = [a + b for a, b in zip(self.bins, other.bins)]
+        return self
+
+    @property
+    def count(self) -> int:
+        return sum(self.bins)
+
+    def _value_at_rank(self, rank: int) -> int:
+        seen = 0
+        for i, n in enumerate(self.bins):
+            seen += n
+            if rank < seen:
+                return i * BIN_MINUTES
+        return (N_BINS - 1) * BIN_MINUTES
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Minute-of-day at quantile q, interpolating between neighbouring ranks
+        like statistics.median does for even counts. None when empty.
+        """
+        n = self.count
+        if n == 0:
+            return None
+        pos = q * (n - 1)
+        lo, hi = math.floor(pos), math.ceil(pos)
+        v_lo = self._value_at_rank(lo)
+        if hi == lo:
+            return float(v_lo)
+        v_hi = self._value_at_rank(hi)
+        return v_lo + (v_hi - v_lo) * (pos - lo)
+
+    def summary(self) -> Dict[str, Optional[str]]:
+        """p10 / median / p90 as "HH:MM" strings."""
+        return {
+            "p10": minute_to_hhmm(self.quantile(0.10)),
+            "median": minute_to_hhmm(self.quantile(0.50)),
+            "p90": minute_to_hhmm(self.quantile(0.90)),
+        }
+
+
+def minute_to_hhmm(minute: Optional[float]) -> Optional[str]:
+    if minute is None:
+        return None
+    m = int(minute)
+    return f"{m // 60:02d}:{m % 60:02d}"
+
+
+def _monday_of(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def _week_key(d: date) -> str:
+    return _monday_of(d).isoformat()
+
+
+def _split_weeks(
+    since: Optional[date], until: Optional[date]
+) -> Tuple[Optional[date], Optional[date], List[Tuple[date, date]]]:
+    """
+    [since, until] as the Mondays of its first and last whole ISO week (None:
+    unbounded; first > last: no whole week) plus the partial edge spans.
+    """
+    first = None if since is None else _monday_of(since + timedelta(days=6))
+    last = None if until is None else _monday_of(until + timedelta(days=1)) - timedelta(days=7)
+    edges = []
+    if since is not None and since < first:
+        edges.append((since, first - timedelta(days=1) if until is None else min(first - timedelta(days=1), until)))
+    if until is not None and until.weekday() != 6 and (first is None or _monday_of(until) >= first):
+        lo = _monday_of(until)
+        edges.append((lo if since is None else max(lo, since), until))
+    return first, last, edges
+
+
+# ---------- maintenance ----------
+
+def _on_insert(session: Session, events: List[aggregates.InsertedEvent]) -> None:
+    deltas: Dict[Tuple[int, str], TimeOfDaySketch] = defaultdict(TimeOfDaySketch)
+    tz_by_habit: Dict[int, str] = {}
+    for e in events:
+        deltas[(e.habit_id, ALL)].add(e.local)
+        deltas[(e.habit_id, _week_key(e.local.date()))].add(e.local)
+        tz_by_habit[e.habit_id] = str(e.local.tzinfo)
+
+    existing = session.execute(
+        select(_table.c.habit_id, _table.c.period, _table.c.bins).where(
+            _table.c.habit_id.in_({h for h, _ in deltas}),
+            _table.c.period.in_({p for _, p in deltas}),
+        )
+    ).all()
+    current = {(hid, period): bins for hid, period, bins in existing}
+
+    values = []
+    for (hid, period), delta in deltas.items():
+        if (hid, period) in current:
+            delta.merge(TimeOfDaySketch(current[(hid, period)]))
+        values.append({"habit_id": hid, "period": period, "tz": tz_by_habit[hid], "bins": delta.bins})
+
+    stmt = sqlite_insert(_table).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.habit_id, _table.c.period],
+        set_={"bins": stmt.excluded.bins, "tz": stmt.excluded.tz},
+    )
+    session.execute(stmt)
+
+
+def _clear(session: Session, user_id: str, habit_ids: List[int]) -> None:
+    if habit_ids:
+        session.execute(delete(_table).where(_table.c.habit_id.in_(habit_ids)))
+
+
+aggregates.register("time_sketches", on_insert=_on_insert, clear=_clear)
+
+
+# ---------- reads ----------
+
+def load_sketches(
+    session: Session,
+    habit_ids: Iterable[int],
+    *,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    tz: Optional[str] = None,
+) -> Dict[int, TimeOfDaySketch]:
+    """
+    One merged sketch per habit. Without since/until this is the lifetime row;
+    otherwise it covers exactly the local days [since, until]: the weekly rows
+    of whole weeks plus the edge days' events, cut in `tz` (default: the zone
+    the habit's rows were filled in). If `tz` is given, habits whose bins were
+    filled in a different zone are left out so callers can fall back.
+    """
+    ids = list(habit_ids)
+    if not ids:
+        return {}
+    q = select(_table.c.habit_id, _table.c.tz, _table.c.bins).where(_table.c.habit_id.in_(ids))
+    edges: List[Tuple[date, date]] = []
+    if since is None and until is None:
+        q = q.where(_table.c.period == ALL)
+    else:
+        first, last, edges = _split_weeks(since, until)
+        q = q.where(_table.c.period != ALL)
+        if first is not None:
+            q = q.where(_table.c.period >= first.isoformat())
+        if last is not None:
+            q = q.where(_table.c.period <= last.isoformat())
+        if first is not None and last is not None and first > last:
+            q = None                    # no whole week in range: edges only
+
+    out: Dict[int, TimeOfDaySketch] = {}
+    zones: Dict[int, str] = {}
+    mismatched = set()
+    for hid, row_tz, bins in session.execute(q).all() if q is not None else ():
+        zones[hid] = row_tz
+        if tz is not None and row_tz != tz:
+            mismatched.add(hid)
+            continue
+        out.setdefault(hid, TimeOfDaySketch()).merge(TimeOfDaySketch(bins))
+
+    if edges:
+        for hid, row_tz in session.execute(
+            select(_table.c.habit_id, _table.c.tz)
+            .where(_table.c.habit_id.in_([h for h in ids if h not in zones]), _table.c.period == ALL)
+        ).all():
+            zones[hid] = row_tz
+            if tz is not None and row_tz != tz:
+                mismatched.add(hid)
+        for lo, hi in edges:
+            # a day either side covers every zone; each event is then cut in its habit's zone
+            for hid, ts in session.execute(
+                select(EventORM.habit_id, EventORM.occurred_at_utc).where(
+                    EventORM.habit_id.in_(ids),
+                    EventORM.occurred_at_utc >= day_bounds(lo - timedelta(days=1), "UTC")[0],
+                    EventORM.occurred_at_utc < day_bounds(hi + timedelta(days=1), "UTC")[1],
+                )
+            ).all():
+                zone = tz or zones.get(hid)
+                if hid in mismatched or zone is None:
+                    continue
+                local = to_local(ts, zone)
+                if lo <= local.date() <= hi:
+                    out.setdefault(hid, TimeOfDaySketch()).add(local)
+    for hid in mismatched:
+        out.pop(hid, None)
+    return out
+
+
+def recent_sketches(session: Session, habit_ids: Iterable[int], *, today: date, weeks: int = 4) -> Dict[int, TimeOfDaySketch]:
+    """Sliding window over the last `weeks` * 7 days up to `today` (recent median hour etc.)."""
+    return load_sketches(session, habit_ids, since=today - timedelta(weeks=weeks, days=-1), until=today)
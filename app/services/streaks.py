@@ -1,19 +1,25 @@
 from __future__ import annotations
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import Dict, Any, Iterable, Set, List
 from zoneinfo import ZoneInfo
+
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.core.timezones import get_zone, local_day, local_days
 from app.db import EventORM, UserORM
 
-def _local_date(dt_utc: datetime, tz: ZoneInfo) -> datetime.date:
-    return dt_utc.astimezone(tz).date()
-
 
 class NotFound(Exception):
     """Raised when a requested entity doesn’t exist."""
     pass
 
+
+def user_zone(db: Session, user_id: str | int) -> ZoneInfo:
+    """Zone the user's local days are cut in (DEFAULT_USER_TZ without a valid one)."""
+    return get_zone(db.execute(select(UserORM.timezone).where(UserORM.id == str(user_id))).scalar())
+
+
 def compute_streaks(
     db: Session,
     habit_id: int,
@@ -30,9 +36,7 @@ def compute_streaks(
     - last_completed = most recent completed local date <= as_of_local.date()
     """
 
-    # Load user to get timezone
-    user: UserORM | None = db.get(UserORM, user_id)
-    tz = ZoneInfo(user.timezone if user and user.timezone else "UTC")
+    tz = user_zone(db, user_id)
 
     # Fetch all events for this habit
     events: List[EventORM] = (
@@ -44,21 +48,28 @@ def compute_streaks(
     if not events:
         return {"current": 0, "max": 0, "last_completed": None}
 
-    # Default as_of to the latest event timestamp if not provided
+    days = local_days((ev.occurred_at_utc for ev in events), tz)
+    # Default as_of to the latest event if not provided
     if as_of is None:
-        as_of = events[-1].occurred_at_utc
+        return latest_streaks(days)
     if as_of.tzinfo is None:
         as_of = as_of.replace(tzinfo=timezone.utc)
 
-    as_of_local = as_of.astimezone(tz)
-    as_of_local_day = as_of_local.date()
-
     # Collapse to unique local days, *only up to as_of_local_day*
-    unique_days: Set[datetime.date] = set()
-    for ev in events:
-        d = _local_date(ev.occurred_at_utc, tz)
-        if d <= as_of_local_day:
-            unique_days.add(d)
+    return streaks_from_days(days, local_day(as_of, tz))
+
+
+def latest_streaks(days: Iterable[date]) -> Dict[str, Any]:
+    """Streaks as of the latest completed local day (compute_streaks' default)."""
+    days = set(days)
+    if not days:
+        return {"current": 0, "max": 0, "last_completed": None}
+    return streaks_from_days(days, max(days))
+
+
+def streaks_from_days(days: Iterable[date], as_of_local_day: date) -> Dict[str, Any]:
+    """Streak math over completed local days (duplicates allowed), up to as_of_local_day."""
+    unique_days: Set[date] = {d for d in days if d <= as_of_local_day}
 
     if not unique_days:
         # No completed days on/before as_of
@@ -81,10 +92,9 @@ def compute_streaks(
         max_streak = cur_run
 
     # Compute current streak as of as_of_local_day
-    days_set = set(days_sorted)
     current = 0
     d = as_of_local_day
-    while d in days_set:
+    while d in unique_days:
         current += 1
         d = d - timedelta(days=1)
 
@@ -0,0 +1,56 @@
+# app/services/time_buckets.py
+from __future__ import annotations
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from app.core.settings import settings
+
+
+# ---------- Parsing ----------
+
+def parse_time_buckets(spec: str) -> List[Tuple[str, int, int]]:
+    """
+    Parse a TIME_BUCKETS spec like "morning=5-11,night=22-5" into
+    (name, start_hour, end_hour) tuples. Raises ValueError on bad input.
+    """
+    parts = [p.strip() for p in spec.split(",") if p.strip()]
+    out: List[Tuple[str, int, int]] = []
+    for p in parts:
+        name, rng = p.split("=")
+        s, e = rng.split("-")
+        start_h, end_h = int(s), int(e)
+        if not (0 <= start_h <= 24 and 0 <= end_h <= 24):
+            raise ValueError(f"bucket hours out of range: {p!r}")
+        out.append((name.strip(), start_h, end_h))
+    if not out:
+        raise ValueError("empty time bucket spec")
+    return out
+
+
+def hour_to_bucket(hour: int, buckets: List[Tuple[str, int, int]]) -> Optional[str]:
+    for name, start_h, end_h in buckets:
+        if start_h < end_h:
+            if start_h <= hour < end_h:
+                return name
+        else:  # wrap-around like 22-5
+            if hour >= start_h or hour < end_h:
+                return name
+    return None
+
+
+# ---------- Lookup tables ----------
+
+@lru_cache(maxsize=32)
+def _table_for(spec: str) -> Tuple[Tuple[str, ...], Tuple[Optional[str], ...]]:
+    buckets = parse_time_buckets(spec)
+    names = tuple(dict.fromkeys(name for name, _, _ in buckets))
+    table = tuple(hour_to_bucket(h, buckets) for h in range(24))
+    return names, table
+
+
+def bucket_table(spec: Optional[str] = None) -> Tuple[Tuple[str, ...], Tuple[Optional[str], ...]]:
+    """
+    Return (bucket_names, hour→bucket table of 24 entries) for a spec.
+    Defaults to settings.TIME_BUCKETS, read on every call so .env/monkeypatch apply.
+    """
+    return _table_for(spec or settings.TIME_BUCKETS)
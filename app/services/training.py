@@ -0,0 +1,206 @@
+# app/services/training.py
+"""
+Supervised training examples for completion prediction.
+
+Each example is (features of habit h on local day d, labels), where label
+`h`-days-ahead is "h was completed on d + h" for every requested horizon
+(default next day only; e.g. horizons=(1, 7)).
+
+Features come from the materialized store (load_feature_columns), i.e. the
+same values /analytics/features serves, and each user is read ONCE over
+[start, end + max horizon]: a day was completed iff its current_streak is
+positive, so the labels are read off the same columns a few rows further
+on. Examples are yielded one at a time and written as JSON Lines.
+
+Time-based splits: with `validation_from`, days >= validation_from go to
+"validation" and days whose every label day is before it go to "train";
+days in between are dropped so no train label peeks into validation.
+
+CLI:
+    python -m app.services.training --start 2025-01-01 --end 2025-06-30 \
+        --horizons 1,7 --validation-from 2025-06-01 --out training/
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, Optional, Sequence, TextIO, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.db import Base, engine
+from app.services.feature_export import all_user_ids
+from app.services.feature_store import load_feature_columns
+from app.services.features import FeatureColumns
+
+TRAIN = "train"
+VALIDATION = "validation"
+
+
+@dataclass(slots=True)
+class TrainingExample:
+    user_id: str
+    habit_id: int
+    day: date
+    features: Dict[str, Any]
+    labels: Dict[int, bool]         # horizon in days -> completed on day + horizon
+    split: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "user_id": self.user_id,
+            "habit_id": self.habit_id,
+            "day": self.day.isoformat(),
+            "split": self.split,
+            **self.features,
+            **{f"label_{h}d": int(v) for h, v in self.labels.items()},
+        }, separators=(",", ":"))
+
+
+def parse_horizons(spec: str) -> Tuple[int, ...]:
+    """"1,7" -> (1, 7). Raises ValueError on empty or non-positive horizons."""
+    out = sorted({int(p) for p in spec.split(",") if p.strip()})
+    if not out or out[0] < 1:
+        raise ValueError(f"invalid horizons: {spec!r}")
+    return tuple(out)
+
+
+def _features(cols: FeatureColumns, i: int) -> Dict[str, Any]:
+    """Model inputs of row i (identifiers and the label source excluded)."""
+    k = cols.habit_idx[i]
+    f: Dict[str, Any] = {
+        "dow": (cols.day_ordinal[i] - 1) % 7,
+        "current_streak": cols.current_streak[i],
+        "hour_bucket": cols.hour_bucket[i],
+        "difficulty": cols.difficulty[k],
+        "active": cols.active[k],
+        "is_travel": bool(cols.is_travel[i]),
+        "is_exam": bool(cols.is_exam[i]),
+        "is_illness": bool(cols.is_illness[i]),
+        "context_tags": list(cols.context_labels.tags(cols.context_mask[i])),
+        "slip_7d_flag": bool(cols.slip_7d_flag[i]),
+    }
+    for w, col in cols.rates.items():
+        f[f"rate_{w}d"] = col[i]
+    for name in ("completion_p10_min", "completion_median_min", "completion_p90_min"):
+        v = getattr(cols, name)[i]
+        f[name] = None if v != v else v
+    return f
+
+
+def _split(day: date, last_label_day: date, validation_from: Optional[date]) -> Optional[str]:
+    if validation_from is None:
+        return None
+    if day >= validation_from:
+        return VALIDATION
+    return TRAIN if last_label_day < validation_from else ""    # "" = embargoed
+
+
+def iter_examples(
+    session: Session,
+    user_ids: Sequence[str],
+    start: date,
+    end: date,
+    *,
+    horizons: Sequence[int] = (1,),
+    validation_from: Optional[date] = None,
+    label_through: Optional[date] = None,
+    tz_name: Optional[str] = None,
+) -> Iterator[TrainingExample]:
+    """
+    Yield labeled examples for every habit of every user and day in
+    [start, end], user by user. Days whose label day is after `label_through`
+    (default: today, UTC) are skipped, since their outcome is not known yet.
+    Materializes store rows as needed and commits per user.
+    """
+    if start > end:
+        raise ValueError("start must be <= end")
+    horizons = tuple(sorted(set(horizons)))
+    h_max = horizons[-1]
+    label_through = label_through or datetime.now(timezone.utc).date()
+    last_day = min(end, label_through - timedelta(days=h_max))
+    if last_day < start:
+        return
+    span = (last_day - start).days + 1 + h_max         # rows per habit in the read
+
+    for uid in user_ids:
+        cols = load_feature_columns(session, uid, start, last_day + timedelta(days=h_max), tz_name)
+        session.commit()
+        streak = cols.current_streak
+        for k, hid in enumerate(cols.habit_ids):
+            base = k * span                              # rows are habit-major, one per day
+            for j in range(span - h_max):
+                i = base + j
+                day = date.fromordinal(cols.day_ordinal[i])
+                split = _split(day, day + timedelta(days=h_max), validation_from)
+                if split == "":
+                    continue
+                yield TrainingExample(
+                    user_id=uid,
+                    habit_id=hid,
+                    day=day,
+                    features=_features(cols, i),
+                    labels={h: streak[i + h] > 0 for h in horizons},
+                    split=split,
+                )
+
+
+def write_examples(
+    out: str,
+    user_ids: Sequence[str],
+    start: date,
+    end: date,
+    **kwargs: Any,
+) -> Dict[str, int]:
+    """
+    Stream examples to JSON Lines. Without validation_from everything goes to
+    `out` (a file); with it, `out` is a directory holding train.jsonl and
+    validation.jsonl. Returns per-split counts.
+    """
+    counts: Dict[str, int] = {}
+    files: Dict[Optional[str], TextIO] = {}
+    split_mode = kwargs.get("validation_from") is not None
+    if split_mode:
+        os.makedirs(out, exist_ok=True)
+    try:
+        with Session(engine) as session:
+            for ex in iter_examples(session, user_ids, start, end, **kwargs):
+                f = files.get(ex.split)
+                if f is None:
+                    path = os.path.join(out, f"{ex.split}.jsonl") if split_mode else out
+                    f = files[ex.split] = open(path, "w", encoding="utf-8")
+                f.write(ex.to_json())
+                f.write("\n")
+                key = ex.split or "all"
+                counts[key] = counts.get(key, 0) + 1
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
+
+
+# ---------- CLI ----------
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Write labeled next-day completion examples as JSON Lines.")
+    p.add_argument("--start", required=True, type=date.fromisoformat)
+    p.add_argument("--end", required=True, type=date.fromisoformat)
+    p.add_argument("--out", required=True, help="output .jsonl file (a directory with --validation-from)")
+    p.add_argument("--horizons", default="1", type=parse_horizons, help='label horizons in days, e.g. "1,7"')
+    p.add_argument("--validation-from", type=date.fromisoformat, default=None)
+    p.add_argument("--user", action="append", dest="users", help="user id (repeatable); default: all users")
+    args = p.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)   # same as app startup; the CLI runs without it
+    counts = write_examples(
+        args.out, args.users or all_user_ids(), args.start, args.end,
+        horizons=args.horizons, validation_from=args.validation_from,
+    )
+    print(json.dumps({"out": args.out, **counts}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+# app/services/versions.py
+"""
+Per-user data versions.
+
+Every flush that writes a user's events, habits, contexts or user row bumps
+that user's counter in `user_data_versions`, inside the same transaction, so
+a version can never be read without the data it stands for. Anything shared
+by all users (a newly trained forecast model) bumps the "*" row. Derived
+tables (rollups, features, ...) are rebuilt from those writes and need no
+bump of their own.
+
+data_versions() reads everything an ETag needs in one statement; see
+app.etags for the conditional-GET dependency built on it. user_version()
+is the single-row read other per-user caches validate against.
+"""
+from __future__ import annotations
+from itertools import chain
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.db import ContextORM, EventORM, ForecastModelORM, HabitORM, UserDataVersionORM, UserORM
+
+_versions = UserDataVersionORM.__table__
+GLOBAL = "*"
+
+
+def touched_users(session: Session) -> Set[str]:
+    """Ids of users whose own data the pending flush writes (one owner query for events)."""
+    users: Set[str] = set()
+    habit_ids: Set[int] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, EventORM):
+            habit_ids.add(obj.habit_id)
+        elif isinstance(obj, (HabitORM, ContextORM)):
+            users.add(obj.user_id)
+        elif isinstance(obj, UserORM):
+            users.add(obj.id)
+    habit_ids.discard(None)
+    if habit_ids:
+        users.update(session.execute(
+            select(HabitORM.user_id).where(HabitORM.id.in_(habit_ids))
+        ).scalars())
+    users.discard(None)
+    return users
+
+
+def bump(session: Session, user_ids: Iterable[str]) -> None:
+    """Increment the versions of `user_ids` (creating them at 1). Caller commits."""
+    ids = sorted(set(user_ids))
+    if not ids:
+        return
+    stmt = sqlite_insert(_versions).values([{"user_id": uid, "version": 1} for uid in ids])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[_versions.c.user_id],
+        set_={"version": _versions.c.version + 1},
+    ))
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_written(session: Session, flush_context) -> None:
+    users = touched_users(session)
+    if any(isinstance(obj, ForecastModelORM) for obj in session.new):
+        users.add(GLOBAL)
+    bump(session, users)
+
+
+def user_version(db: Session, user_id: str) -> int:
+    """One user's version (0 before their first write); a primary-key read."""
+    return db.execute(select(_versions.c.version).where(_versions.c.user_id == str(user_id))).scalar() or 0
+
+
+def data_versions(
+    db: Session, user_ids: Iterable[str]
+) -> Tuple[Dict[str, Tuple[int, Optional[str]]], int]:
+    """
+    ({user_id: (version, timezone)} for the users that exist, global
+    version), in a single statement.
+    """
+    ids = [str(u) for u in user_ids]
+    shared = select(_versions.c.version).where(_versions.c.user_id == GLOBAL).scalar_subquery()
+    rows = db.execute(
+        select(UserORM.id, UserORM.timezone, _versions.c.version, shared)
+        .outerjoin(_versions, _versions.c.user_id == UserORM.id)
+        .where(UserORM.id.in_(ids))
+    ).all()
+    if not rows:
+        return {}, db.execute(select(shared)).scalar() or 0
+    return {uid: (v or 0, tz) for uid, tz, v, _ in rows}, rows[0][3] or 0
@@ -0,0 +1,56 @@
+# app/services/windows.py
+from __future__ import annotations
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.settings import settings
+
+# Always computed: they back the public last_7d / last_30d fields.
+REQUIRED_WINDOWS: Tuple[int, ...] = (7, 30)
+
+
+def parse_windows(spec: str) -> Tuple[int, ...]:
+    """
+    Parse a FEATURE_WINDOWS spec like "3,7,14,30,90" into sorted, unique day
+    counts (7 and 30 are always included). Raises ValueError on bad input.
+    """
+    out = set(REQUIRED_WINDOWS)
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        w = int(part)
+        if not 1 <= w <= 3660:
+            raise ValueError(f"window out of range: {part!r}")
+        out.add(w)
+    return tuple(sorted(out))
+
+
+@lru_cache(maxsize=16)
+def _windows_for(spec: str) -> Tuple[int, ...]:
+    return parse_windows(spec)
+
+
+def feature_windows(spec: Optional[str] = None) -> Tuple[int, ...]:
+    """Windows for `spec`, or for settings.FEATURE_WINDOWS (read on every call)."""
+    return _windows_for(spec if spec is not None else settings.FEATURE_WINDOWS)
+
+
+def warmup_days(windows: Sequence[int]) -> int:
+    """Days of history needed before the first output day so every window is full."""
+    return max(windows) - 1
+
+
+def rolling_rates(flags: Sequence[int], windows: Sequence[int], first: int) -> Dict[int, List[float]]:
+    """
+    Trailing completion rate over each window for positions first..len-1 of a
+    0/1 daily series. One prefix sum serves every window, so each output is
+    O(1) whatever the window length; positions with less history than the
+    window count the missing days as misses (denominator is always w).
+    """
+    cs = [0, *accumulate(flags)]
+    n = len(flags)
+    return {
+        w: [round((cs[j + 1] - cs[max(0, j + 1 - w)]) / w, 4) for j in range(first, n)]
+        for w in windows
+    }
@@ -247,6 +247,76 @@ def test_features_multiple_habits_two_rows_per_day(client):
         assert 0.0 <= row["last_7d_completion_rate"] <= 1.0
         assert 0.0 <= row["last_30d_completion_rate"] <= 1.0
 
+def test_features_are_paged_by_cursor(client):
+    r = client.post("/users", json={
+        "email": f"paged+{uuid4().hex[:8]}@example.com",
+        "name": "Paged User",
+        "timezone": "UTC",
+    })
+    assert r.status_code in (200, 201), r.text
+    user_id = r.json()["id"]
+    from app.auth import get_current_user
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=user_id)
+    for name in ("H1", "H2"):
+        r = client.post("/habits/", json={"user_id": user_id, "name": name, "status": "active"})
+        assert r.status_code in (200, 201), r.text
+
+    params = {"start": "2025-09-01", "end": "2025-09-04", "limit": 3}
+    pages = []
+    while True:
+        r = client.get("/analytics/features", params=params)
+        assert r.status_code == 200, r.text
+        pages.append([(row["habit_id"], row["day"]) for row in r.json()])
+        if "X-Next-Cursor" not in r.headers:
+            break
+        assert 'rel="next"' in r.headers["Link"]
+        params["cursor"] = r.headers["X-Next-Cursor"]
+
+    assert [len(p) for p in pages] == [3, 3, 2]
+    rows = [row for p in pages for row in p]
+    assert rows == sorted(rows) and len(set(rows)) == 8
+
+    r = client.get("/analytics/features", params={**params, "cursor": "not-a-cursor"})
+    assert r.status_code == 400
+
+
+def test_feature_dataset_matches_the_features_endpoint(client):
+    from app.services.feature_dataset import iter_dataset
+
+    r = client.post("/users", json={
+        "email": f"dataset+{uuid4().hex[:8]}@example.com",
+        "name": "Dataset User",
+        "timezone": "UTC",
+    })
+    assert r.status_code in (200, 201), r.text
+    user_id = r.json()["id"]
+    from app.auth import get_current_user
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=user_id)
+    r = client.post("/habits/", json={"user_id": user_id, "name": "Read", "status": "active"})
+    assert r.status_code in (200, 201), r.text
+    habit_id = r.json()["id"]
+    # Misses from Sep 2 make Sep 4 a slip, although the window only starts on Sep 3
+    for day in ("2025-08-20", "2025-08-31", "2025-09-01"):
+        r = client.post("/events/", json={"habit_id": habit_id, "occurred_at": f"{day}T21:00:00Z"})
+        assert r.status_code in (200, 201), r.text
+
+    r = client.get("/analytics/features", params={"start": "2025-09-03", "end": "2025-09-06"})
+    assert r.status_code == 200, r.text
+    api = [
+        (row["day"], row["current_streak"], row["last_7d_completion_rate"],
+         row["last_30d_completion_rate"], row["slip"], row["median_completion_bucket"])
+        for row in r.json()
+    ]
+    assert [slip for *_, slip, _ in api] == [False, True, True, True]
+
+    [(uid, cols)] = list(iter_dataset([user_id], date(2025, 9, 3), date(2025, 9, 6), workers=1))
+    assert uid == user_id
+    assert [
+        (row.day.isoformat(), row.current_streak, row.last_7d_rate, row.last_30d_rate, row.slip_7d_flag, row.hour_bucket)
+        for row in cols
+    ] == api
+
+
 def test_features_no_events_single_day_defaults(client):
     """
     No events for the day → defaults:
@@ -288,7 +358,7 @@ def test_features_no_events_single_day_defaults(client):
     assert row["last_30d_completion_rate"] == 0.0
     assert row["current_streak"] == 0
     assert row["median_completion_bucket"] is None
-    assert row["context"] == {"travel": False, "exam": False, "illness": False}
+    assert row["context"] == {"travel": False, "exam": False, "illness": False, "custom": False, "tags": []}
     assert row["slip"] is False
 
 def test_features_slip_flag_toggles_on_three_misses_then_resets(client):
@@ -363,3 +433,184 @@ def test_features_slip_flag_toggles_on_three_misses_then_resets(client):
     assert d3["slip"] is False
     assert d4["slip"] is True
     assert d5["slip"] is False
+
+
+def test_heatmap_custom_bucket_spec(client):
+    r = client.post("/users", json={
+        "email": f"hmspec+{uuid4().hex[:8]}@example.com",
+        "name": "Heatmap Spec User",
+        "timezone": "America/Phoenix",
+    })
+    assert r.status_code in (200, 201), r.text
+    user_id = r.json()["id"]
+    _override_auth_with(SimpleNamespace(id=user_id))
+
+    r = client.post("/habits/", json={"user_id": user_id, "name": "HM2", "status": "active"})
+    assert r.status_code in (200, 201), r.text
+    habit_id = r.json()["id"]
+
+    mon = date(2025, 9, 1)
+    for hour in (8, 23):
+        ts = datetime(mon.year, mon.month, mon.day, hour, 0, 0, tzinfo=PHX)
+        r = client.post("/events/", json={"habit_id": habit_id, "occurred_at": ts.isoformat()})
+        assert r.status_code in (200, 201), r.text
+
+    params = {"start": mon.isoformat(), "end": (mon + timedelta(days=6)).isoformat()}
+    r = client.get("/analytics/heatmap", params={**params, "buckets": "am=0-12,pm=12-24"})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["counts"]["Mon"] == {"am": 1, "pm": 1}
+    assert body["total_events"] == 2
+
+    # default spec comes from TIME_BUCKETS, so 23:00 lands in "night"
+    r = client.get("/analytics/heatmap", params=params)
+    assert r.json()["counts"]["Mon"]["night"] == 1
+
+    r = client.get("/analytics/heatmap", params={**params, "buckets": "nonsense"})
+    assert r.status_code == 400
+
+    _clear_auth_override()
+
+
+def test_trend_endpoint_month_buckets(client):
+    r = client.post("/users", json={
+        "email": f"trend+{uuid4().hex[:8]}@example.com",
+        "name": "Trend User",
+        "timezone": "America/Phoenix",
+    })
+    assert r.status_code in (200, 201), r.text
+    user_id = r.json()["id"]
+    _override_auth_with(SimpleNamespace(id=user_id))
+
+    r = client.post("/habits/", json={"user_id": user_id, "name": "Trend", "status": "active"})
+    assert r.status_code in (200, 201), r.text
+    habit_id = r.json()["id"]
+
+    for d in ["2025-07-04", "2025-07-05", "2025-08-20"]:
+        r = client.post("/events/", json={"habit_id": habit_id, "occurred_at": f"{d}T18:00:00Z"})
+        assert r.status_code in (200, 201), r.text
+
+    r = client.get("/analytics/trend", params={"granularity": "month", "start": "2025-07-01", "end": "2025-09-30"})
+    assert r.status_code == 200, r.text
+    buckets = r.json()["buckets"]
+    assert [b["period_start"] for b in buckets] == ["2025-07-01", "2025-08-01", "2025-09-01"]
+    assert [b["completions"] for b in buckets] == [2, 1, 0]
+    assert buckets[0]["opportunities"] == 31
+
+    r = client.get("/analytics/trend", params={"granularity": "fortnight"})
+    assert r.status_code == 422
+
+    _clear_auth_override()
+
+
+@pytest.mark.parametrize("tz_name", ["America/Phoenix", None])
+def test_dashboard_matches_individual_endpoints(client, tz_name):
+    r = client.post("/users", json={
+        "email": f"dash+{uuid4().hex[:8]}@example.com",
+        "name": "Dashboard User",
+        "timezone": tz_name,
+    })
+    assert r.status_code in (200, 201), r.text
+    assert r.json()["timezone"] == tz_name
+    user_id = r.json()["id"]
+    _override_auth_with(SimpleNamespace(id=user_id))
+
+    habit_ids = []
+    for name in ("Dash A", "Dash B"):
+        r = client.post("/habits/", json={"user_id": user_id, "name": name, "status": "active"})
+        assert r.status_code in (200, 201), r.text
+        habit_ids.append(r.json()["id"])
+
+    today_phx = datetime.now(timezone.utc).astimezone(PHX).date()
+    for back in (0, 1, 2, 20, 21, 22, 23):
+        d = today_phx - timedelta(days=back)
+        ts = datetime(d.year, d.month, d.day, 7, 30, tzinfo=PHX)
+        r = client.post("/events/", json={"habit_id": habit_ids[0], "occurred_at": ts.isoformat()})
+        assert r.status_code in (200, 201), r.text
+    for back in (20, 21, 22, 23, 24):
+        d = today_phx - timedelta(days=back)
+        ts = datetime(d.year, d.month, d.day, 19, 0, tzinfo=PHX)
+        r = client.post("/events/", json={"habit_id": habit_ids[1], "occurred_at": ts.isoformat()})
+        assert r.status_code in (200, 201), r.text
+
+    r = client.get("/analytics/dashboard")
+    assert r.status_code == 200, r.text
+    dash = r.json()
+
+    assert dash["weekly"] == client.get("/analytics/weekly").json()
+    heat = client.get("/analytics/heatmap").json()
+    assert dash["heatmap"]["counts"] == heat["counts"]
+    assert dash["heatmap"]["total_events"] == heat["total_events"]
+    assert dash["slips"] == client.get("/analytics/slips").json()
+
+    by_habit = {s["habit_id"]: s for s in dash["streaks"]}
+    for hid in habit_ids:
+        streak = client.get(f"/habits/{hid}/streak").json()
+        assert {k: by_habit[hid][k] for k in ("current", "max", "last_completed")} == streak
+
+    assert set(dash["timings_ms"]) == {"load", "weekly", "heatmap", "slips", "streaks"}
+
+    _clear_auth_override()
+
+
+def test_startup_backfills_aggregates_for_existing_events():
+    # Events written before the aggregates existed never went through the
+    # insert hook: raw Core inserts stand in for them.
+    from sqlalchemy import delete, insert
+    from app.db import AggregateBackfillORM, Base, EventORM, HabitORM, UserORM, engine
+    from app.models.schemas import HabitStatus
+    from app.services.analytics import completion_trend, habit_heatmap, weekly_completion
+    from app.services.time_buckets import bucket_table
+
+    tz = ZoneInfo("America/Phoenix")
+    user_id = str(uuid4())
+    days = [date(2025, 9, 1) + timedelta(days=i) for i in range(5)]        # 5/7
+    days += [date(2025, 9, 8) + timedelta(days=i) for i in range(7)]       # 7/7
+    stamps = [datetime(d.year, d.month, d.day, 15, tzinfo=timezone.utc) for d in days]
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UserORM).values(
+            id=user_id, name="Backfill", email=f"backfill+{user_id[:8]}@example.com", timezone="America/Phoenix",
+        ))
+        habit_id = conn.execute(insert(HabitORM).values(
+            user_id=user_id, name="Stretch", name_canonical="stretch", status=HabitStatus.active,
+        )).inserted_primary_key[0]
+        conn.execute(insert(EventORM), [{"habit_id": habit_id, "occurred_at_utc": ts} for ts in stamps])
+        conn.execute(delete(AggregateBackfillORM))
+
+    with TestClient(app):
+        pass
+
+    # scan baseline
+    per_week = {}
+    for ts in stamps:
+        local = ts.astimezone(tz).date()
+        monday = local - timedelta(days=local.weekday())
+        per_week.setdefault(monday, set()).add(local)
+    expected_weekly = [(m.isoformat(), round(len(per_week[m]) / 7, 3)) for m in sorted(per_week)]
+
+    weekly = weekly_completion(user_id, date(2025, 9, 1), date(2025, 9, 14))
+    assert [(w["week_start"], round(w["completion_pct"], 3)) for w in weekly] == expected_weekly
+    assert [v for _, v in expected_weekly] == [0.714, 1.0]
+
+    for scope in (None, habit_id):
+        trend = completion_trend(user_id, date(2025, 9, 1), date(2025, 9, 14), granularity="week", habit_id=scope)
+        assert [(b["period_start"], b["completions"]) for b in trend["buckets"]] == [
+            (m.isoformat(), len(per_week[m])) for m in sorted(per_week)
+        ]
+    month = completion_trend(user_id, date(2025, 9, 1), date(2025, 9, 30), granularity="month")
+    assert month["buckets"][0]["completions"] == len(stamps)
+
+    _, table = bucket_table()
+    dow_keys = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    expected = {}
+    for ts in stamps:
+        local = ts.astimezone(tz)
+        key = (dow_keys[local.weekday()], table[local.hour])
+        expected[key] = expected.get(key, 0) + 1
+
+    heat = habit_heatmap(user_id, date(2025, 9, 1), date(2025, 9, 14))
+    assert heat["total_events"] == len(stamps)
+    got = {(d, b): n for d, row in heat["counts"].items() for b, n in row.items() if n}
+    assert got == expected
@@ -0,0 +1,52 @@
+# tests/test_context_flags.py
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+from app.db import ContextORM
+from app.models.schemas import ContextKind
+from app.services.context_flags import CUSTOM, TRAVEL, context_masks
+from app.services.feature_store import load_feature_columns
+from app.services.features import build_daily_features_columnar
+
+
+def _ctx(kind, start, end=None, **data):
+    return SimpleNamespace(kind=kind, start_utc=start, end_utc=end, data=data)
+
+
+def _utc(y, m, d, h=12):
+    return datetime(y, m, d, h, tzinfo=timezone.utc)
+
+
+def test_sweep_matches_day_by_day_expansion_with_overlaps_and_tags():
+    contexts = [
+        _ctx(ContextKind.travel, _utc(2025, 9, 2), _utc(2025, 9, 4)),
+        _ctx(ContextKind.travel, _utc(2025, 9, 3), _utc(2025, 9, 6)),     # overlaps the first
+        _ctx(ContextKind.custom, _utc(2025, 9, 5), None, tags=["Conference", "move"]),
+        _ctx(ContextKind.custom, _utc(2025, 8, 1), _utc(2025, 9, 1, 3), tag="move"),
+        _ctx(ContextKind.exam, _utc(2025, 10, 1)),                         # after the range
+    ]
+    m = context_masks(contexts, "UTC", date(2025, 9, 1), date(2025, 9, 8))
+
+    assert [bool(m[date(2025, 9, d)] & TRAVEL) for d in range(1, 9)] == \
+        [False, True, True, True, True, True, False, False]
+    assert m.tags(date(2025, 9, 1)) == ("custom", "move")
+    assert m.tags(date(2025, 9, 3)) == ()
+    assert m.tags(date(2025, 9, 8)) == ("custom", "conference", "move")
+    assert m.flags(date(2025, 9, 8)) == {"travel": False, "exam": False, "illness": False}
+    assert m[date(2025, 9, 8)] & CUSTOM and m[date(2025, 9, 9)] == 0
+
+
+def test_custom_contexts_reach_features_and_store(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="UTC")
+    habit = habit_factory(user_id=user.id)
+    event_factory(habit_id=habit.id, occurred_at_utc=_utc(2025, 9, 1))    # tracked (stored) from Sep 1
+    db_session.add(ContextORM(user_id=user.id, kind=ContextKind.custom, data={"tag": "wedding"},
+                              start_utc=_utc(2025, 9, 2, 0), end_utc=_utc(2025, 9, 3, 0)))
+    db_session.commit()
+
+    built = build_daily_features_columnar(db_session, user.id, date(2025, 9, 1), date(2025, 9, 4), "UTC")
+    stored = load_feature_columns(db_session, user.id, date(2025, 9, 1), date(2025, 9, 4), "UTC")
+    expected = [(), ("custom", "wedding"), ("custom", "wedding"), ()]
+    assert [r.context_tags for r in built] == expected
+    assert [r.context_tags for r in stored] == expected
+    assert not any(r.is_travel for r in built)
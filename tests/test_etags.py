@@ -0,0 +1,82 @@
+# tests/test_etags.py
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from app.db import ContextORM
+from app.etags import matches
+from app.models.schemas import ContextKind
+
+
+def _statements(session, fn):
+    seen = []
+    listener = lambda *args: seen.append(args[2])
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        return fn(), len(seen)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_if_none_match_parsing():
+    assert matches('"a"', '"a"') and matches('W/"a"', '"a"') and matches('"b", "a"', '"a"') and matches("*", '"a"')
+    assert not matches(None, '"a"') and not matches('"b"', '"a"')
+
+
+def test_writes_change_the_tag_and_reads_revalidate(client, db_session, user_override, user_factory,
+                                                    habit_factory, event_factory):
+    user = user_override(user_factory(timezone="America/Phoenix"))
+    habit = habit_factory(user_id=user.id, name="etag")
+
+    r = client.get("/habits/users/me")
+    tag = r.headers["ETag"]
+    assert r.status_code == 200 and tag.startswith('"') and r.headers["Cache-Control"] == "private, no-cache"
+
+    r, n = _statements(db_session, lambda: client.get("/habits/users/me", headers={"If-None-Match": tag}))
+    assert r.status_code == 304 and r.content == b"" and r.headers["ETag"] == tag
+    assert n == 1                                       # only the version read
+    assert client.get("/habits/users/me?only_active=true").headers["ETag"] != tag    # per URL
+
+    # someone else's write leaves the tag alone; our own event changes it
+    habit_factory(user_id=user_factory().id, name="other")
+    assert client.get("/habits/users/me", headers={"If-None-Match": tag}).status_code == 304
+    event_factory(habit_id=habit.id, occurred_at_utc=datetime.now(timezone.utc))
+    r = client.get("/habits/users/me", headers={"If-None-Match": tag})
+    assert r.status_code == 200 and r.headers["ETag"] != tag
+
+    streak = client.get(f"/habits/{habit.id}/streak")
+    assert client.get(f"/habits/{habit.id}/streak", headers={"If-None-Match": streak.headers["ETag"]}).status_code == 304
+
+
+def test_analytics_answer_304_without_computing(client, user_override, user_factory, habit_factory, monkeypatch):
+    import app.routers.analytics as analytics_router
+
+    user = user_override(user_factory(timezone="Asia/Tokyo"))
+    habit_factory(user_id=user.id, name="etag-analytics")
+    weekly = client.get("/analytics/weekly")
+    features = client.get("/analytics/features", params={"start": "2025-09-01", "end": "2025-09-03"})
+    assert weekly.status_code == features.status_code == 200
+    assert "ETag" in features.headers and features.headers["ETag"] != weekly.headers["ETag"]
+
+    def boom(*args, **kwargs):
+        raise AssertionError("computed despite a matching ETag")
+
+    monkeypatch.setattr(analytics_router, "weekly_completion", boom)
+    monkeypatch.setattr(analytics_router, "daily_features_page", boom)
+    assert client.get("/analytics/weekly", headers={"If-None-Match": weekly.headers["ETag"]}).status_code == 304
+    assert client.get(
+        "/analytics/features", params={"start": "2025-09-01", "end": "2025-09-03"},
+        headers={"If-None-Match": features.headers["ETag"]},
+    ).status_code == 304
+
+
+def test_context_list_tags(client, db_session, user_override, user_factory):
+    user = user_override(user_factory())
+    full = client.get("/contexts").headers["ETag"]
+    assert client.get("/contexts?active_only=true").headers["ETag"] != full
+    db_session.add(ContextORM(user_id=user.id, kind=ContextKind.exam,
+                              start_utc=datetime.now(timezone.utc) - timedelta(days=1)))
+    db_session.commit()
+    r = client.get("/contexts", headers={"If-None-Match": full})
+    assert r.status_code == 200 and len(r.json()) == 1
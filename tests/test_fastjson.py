@@ -0,0 +1,50 @@
+# tests/test_fastjson.py
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.core import fastjson
+from app.core.settings import settings
+
+
+def _both_ways(client, monkeypatch, url):
+    monkeypatch.setattr(settings, "FAST_JSON", False)
+    slow = client.get(url)
+    monkeypatch.setattr(settings, "FAST_JSON", True)
+    fast = client.get(url)
+    assert slow.status_code == fast.status_code == 200
+    return slow, fast
+
+
+def test_fast_path_matches_response_model(client, monkeypatch, user_override, user_factory,
+                                          habit_factory, event_factory):
+    user = user_override(user_factory())
+    habit = habit_factory(user_id=user.id, name="fast")
+    habit_factory(user_id=user.id, name="paused", status="paused")
+    t0 = datetime(2025, 9, 10, 12, 0, 0, 250000, tzinfo=timezone.utc)
+    for k in range(3):
+        event_factory(habit_id=habit.id, occurred_at_utc=t0 + timedelta(hours=k))
+
+    slow, fast = _both_ways(client, monkeypatch, f"/events/habits/{habit.id}")
+    assert fast.json() == slow.json() and len(fast.json()) == 3
+    assert fast.json()[-1]["occurred_at_utc"] == "2025-09-10T12:00:00.250000Z"
+
+    slow, fast = _both_ways(client, monkeypatch, "/habits/users/me")
+    assert fast.json() == slow.json() and {h["status"] for h in fast.json()} == {"active", "paused"}
+    assert fast.headers["ETag"] == slow.headers["ETag"]          # dependency headers survive
+
+
+def test_fallback_encoder_gives_the_same_bytes(monkeypatch):
+    from app.models.schemas import Difficulty
+
+    data = [{"at": datetime(2025, 9, 10, tzinfo=timezone.utc), "d": Difficulty.hard, "x": None}]
+    fast = fastjson.dumps(data)
+    monkeypatch.setattr(fastjson, "orjson", None)
+    assert fastjson.dumps(data) == fast == b'[{"at":"2025-09-10T00:00:00Z","d":"hard","x":null}]'
+
+
+def test_benchmark_runs():
+    out = fastjson.benchmark(200, repeat=1)
+    assert out["rows"] == 200
+    for label in ("events", "habits", "features"):
+        assert set(out[label]) == {"response_model_ms", "fast_path_ms", "stdlib_json_ms"}
+    json.dumps(out)
@@ -0,0 +1,62 @@
+# tests/test_feature_dataset.py
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.db import Base, EventORM, HabitORM, UserORM
+from app.services.feature_dataset import build_dataset, iter_dataset, read_only_engine
+
+
+@pytest.fixture
+def dataset_db(tmp_path):
+    path = tmp_path / "dataset.db"
+    eng = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=eng)
+    users = []
+    with Session(eng) as s:
+        for i in range(7):
+            u = UserORM(name=f"U{i}", email=f"ds{i}+{uuid.uuid4().hex}@example.com", timezone="UTC")
+            s.add(u)
+            s.flush()
+            h = HabitORM(user_id=u.id, name="Walk", name_canonical="walk")
+            s.add(h)
+            s.flush()
+            for d in range(i):
+                s.add(EventORM(habit_id=h.id, occurred_at_utc=datetime(2025, 5, 1, 8, tzinfo=timezone.utc) + timedelta(days=d)))
+            users.append(u.id)
+        s.commit()
+    eng.dispose()
+    return str(path), users
+
+
+def test_parallel_build_matches_serial_and_keeps_order(dataset_db):
+    path, users = dataset_db
+    start, end = date(2025, 5, 1), date(2025, 5, 10)
+
+    serial = [(uid, list(cols.current_streak)) for uid, cols in
+              iter_dataset(users, start, end, workers=1, chunk_size=3, tz_name="UTC", db_path=path)]
+    stats = {}
+    parallel = [(uid, list(cols.current_streak)) for uid, cols in
+                iter_dataset(users, start, end, workers=2, chunk_size=2, tz_name="UTC", db_path=path, stats=stats)]
+
+    assert [uid for uid, _ in parallel] == users
+    assert parallel == serial
+    assert serial[3][1][:4] == [1, 2, 3, 0]
+    assert stats["users"] == 7 and stats["rows"] == 70 and stats["chunks"] == 4
+    assert stats["rows_per_sec"] > 0
+
+
+def test_workers_cannot_write(dataset_db):
+    path, users = dataset_db
+    ro = read_only_engine(path)
+    try:
+        with ro.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("DELETE FROM users"))
+    finally:
+        ro.dispose()
+    assert build_dataset(users[:2], date(2025, 5, 1), date(2025, 5, 2), workers=1, db_path=path)["rows"] == 4
@@ -0,0 +1,109 @@
+# tests/test_feature_export.py
+import io
+import uuid
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_user
+from app.db import Base, EventORM, HabitORM, UserORM, engine
+from app.main import app
+from app.services import feature_export
+from app.services.features import build_daily_features_columnar
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def app_db_session():
+    # The exporter opens its own sessions on the app engine, like the analytics services
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as s:
+        yield s
+
+
+def _user_with_events(session, n_events):
+    u = UserORM(name="Exp", email=f"exp+{uuid.uuid4().hex}@example.com", timezone="UTC")
+    session.add(u)
+    session.flush()
+    h = HabitORM(user_id=u.id, name="Run", name_canonical="run")
+    session.add(h)
+    session.flush()
+    for d in range(1, n_events + 1):
+        session.add(EventORM(habit_id=h.id, occurred_at_utc=datetime(2025, 3, d, 7, 30, tzinfo=timezone.utc)))
+    session.commit()
+    return u.id, h.id
+
+
+def test_export_directory_is_memory_mappable_and_chunked_by_user(app_db_session, tmp_path):
+    u1, h1 = _user_with_events(app_db_session, 3)
+    u2, _ = _user_with_events(app_db_session, 0)
+    start, end = date(2025, 3, 1), date(2025, 3, 5)
+
+    out = tmp_path / "features"
+    summary = feature_export.export_features(str(out), [u1, u2], start, end, tz_name="UTC")
+    assert summary["users"] == 2 and summary["rows"] == 10
+    assert feature_export.read_npy_shape(str(out / "habit_id.npy")) == (10,)
+
+    data = feature_export.load_feature_export(str(out))
+    assert isinstance(data["last_7d_rate"], np.memmap)
+    assert data["day"].dtype == np.dtype("datetime64[D]")
+    assert list(data["users"]) == [u1, u2]
+
+    lo, hi = data["user_offsets"][0], data["user_offsets"][1]
+    assert data["habit_id"][lo:hi].tolist() == [h1] * 5
+    assert data["day"][lo].astype(object) == start
+    assert data["current_streak"][lo:hi].tolist() == [1, 2, 3, 0, 0]
+    assert data["slip_7d_flag"].dtype == np.bool_
+
+    expected = build_daily_features_columnar(app_db_session, u1, start, end, "UTC")
+    assert data["last_30d_rate"][lo:hi].tolist() == list(expected.last_30d_rate)
+    assert data["completion_median_min"][lo] == 7 * 60 + 30
+    assert np.isnan(data["completion_median_min"][hi])   # second user has no completions
+
+
+def test_export_endpoint_returns_npz(app_db_session):
+    uid, _ = _user_with_events(app_db_session, 2)
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=uid)
+    try:
+        with TestClient(app) as c:
+            r = c.get("/analytics/features/export", params={"start": "2025-03-01", "end": "2025-03-02"})
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/octet-stream"
+    with np.load(io.BytesIO(r.content)) as npz:
+        assert npz["habit_id"].shape == (2,)
+        assert list(npz["users"]) == [uid]
+
+
+def test_export_endpoint_limits_users_and_span(app_db_session, monkeypatch, tmp_path):
+    import tempfile
+    from app.core.settings import settings
+
+    uid, _ = _user_with_events(app_db_session, 2)
+    monkeypatch.setattr(settings, "FEATURE_EXPORT_MAX_USERS", 2)
+    monkeypatch.setattr(settings, "FEATURE_EXPORT_MAX_DAYS", 31)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=uid)
+    try:
+        with TestClient(app) as c:
+            too_long = c.get("/analytics/features/export", params={"start": "2025-01-01", "end": "2025-03-01"})
+            too_many = c.get("/analytics/features/export", params={
+                "start": "2025-03-01", "end": "2025-03-02", "user_id": ["a", "b", "c"],
+            })
+            repeated = c.get("/analytics/features/export", params={
+                "start": "2025-03-01", "end": "2025-03-02", "user_id": [uid] * 5,
+            })
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert too_long.status_code == 400 and too_many.status_code == 400
+    assert repeated.status_code == 200 and "attachment" in repeated.headers["content-disposition"]
+    with np.load(io.BytesIO(repeated.content)) as npz:
+        assert list(npz["users"]) == [uid]
+    assert list(tmp_path.iterdir()) == []           # the temporary archive is removed once sent
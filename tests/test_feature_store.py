@@ -0,0 +1,201 @@
+# tests/test_feature_store.py
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.db import ContextORM, DailyFeatureORM, FeatureWatermarkORM
+from app.models.schemas import ContextKind
+from app.services.feature_store import (
+    decode_cursor, encode_cursor, load_feature_columns, load_feature_page, materialize_user, plan_page,
+)
+
+TZ = "UTC"
+
+
+def _at(d: date, hour: int = 9) -> datetime:
+    return datetime(d.year, d.month, d.day, hour, tzinfo=timezone.utc)
+
+
+def _mark(db_session, habit_id):
+    return db_session.get(FeatureWatermarkORM, habit_id)
+
+
+def test_materializes_only_past_the_watermark(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone=TZ)
+    habit = habit_factory(user_id=user.id)
+    first = date(2025, 9, 1)
+    for i in (0, 1, 2):
+        event_factory(habit_id=habit.id, occurred_at_utc=_at(first + timedelta(days=i)))
+
+    assert materialize_user(db_session, user.id, through=date(2025, 9, 10), tz_name=TZ) == 10
+    assert materialize_user(db_session, user.id, through=date(2025, 9, 10), tz_name=TZ) == 0
+    assert materialize_user(db_session, user.id, through=date(2025, 9, 12), tz_name=TZ) == 2
+    assert _mark(db_session, habit.id).computed_through == date(2025, 9, 12)
+
+    # A new event for an already-computed day only dirties the span from that day
+    event_factory(habit_id=habit.id, occurred_at_utc=_at(date(2025, 9, 11)))
+    db_session.expire_all()
+    assert _mark(db_session, habit.id).dirty_from == date(2025, 9, 11)
+    assert materialize_user(db_session, user.id, through=date(2025, 9, 12), tz_name=TZ) == 2
+
+    row = db_session.get(DailyFeatureORM, (habit.id, date(2025, 9, 12)))
+    assert row.current_streak == 0 and row.miss_streak == 1
+    assert db_session.get(DailyFeatureORM, (habit.id, date(2025, 9, 11))).current_streak == 1
+
+
+def test_watermark_created_concurrently_is_updated(db_session, user_factory, habit_factory, event_factory, monkeypatch):
+    from sqlalchemy import insert
+    from app.services import feature_store
+
+    user = user_factory(timezone=TZ)
+    habit = habit_factory(user_id=user.id)
+    event_factory(habit_id=habit.id, occurred_at_utc=_at(date(2025, 9, 1)))
+    compute = feature_store._compute_rows
+
+    def racing(*args, **kwargs):
+        # another worker writes the watermark after this one read none
+        db_session.execute(insert(FeatureWatermarkORM).values(
+            habit_id=habit.id, user_id=user.id, tz=TZ, windows="", computed_through=date(2025, 8, 31),
+        ))
+        monkeypatch.setattr(feature_store, "_compute_rows", compute)
+        return compute(*args, **kwargs)
+
+    monkeypatch.setattr(feature_store, "_compute_rows", racing)
+    assert materialize_user(db_session, user.id, through=date(2025, 9, 5), tz_name=TZ) == 5
+    assert _mark(db_session, habit.id).computed_through == date(2025, 9, 5)
+
+
+def test_incremental_rows_match_a_full_recompute(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone=TZ)
+    habit = habit_factory(user_id=user.id)
+    for d in (3, 4, 5, 9, 10, 20):
+        event_factory(habit_id=habit.id, occurred_at_utc=_at(date(2025, 9, d), 7 + d % 5))
+
+    materialize_user(db_session, user.id, through=date(2025, 9, 12), tz_name=TZ)
+    event_factory(habit_id=habit.id, occurred_at_utc=_at(date(2025, 9, 1)))   # backfill before first day
+    ctx = ContextORM(user_id=user.id, kind=ContextKind.travel,
+                     start_utc=_at(date(2025, 9, 15), 0), end_utc=_at(date(2025, 9, 17), 12))
+    db_session.add(ctx)
+    db_session.commit()
+    materialize_user(db_session, user.id, through=date(2025, 9, 25), tz_name=TZ)
+
+    def snapshot():
+        return [
+            (r.day, r.last_7d_rate, r.last_30d_rate, r.current_streak, r.miss_streak,
+             r.completion_median_min, r.is_travel)
+            for r in db_session.query(DailyFeatureORM)
+            .filter(DailyFeatureORM.habit_id == habit.id).order_by(DailyFeatureORM.day)
+        ]
+
+    incremental = snapshot()
+    assert incremental[0][0] == date(2025, 9, 1)
+    assert [r[6] for r in incremental if r[6]] == [True] * 3
+
+    db_session.delete(_mark(db_session, habit.id))
+    db_session.flush()
+    materialize_user(db_session, user.id, through=date(2025, 9, 25), tz_name=TZ)
+    assert snapshot() == incremental
+
+
+def test_range_read_is_window_independent(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone=TZ)
+    habit = habit_factory(user_id=user.id)
+    event_factory(habit_id=habit.id, occurred_at_utc=_at(date(2025, 9, 1), 16))
+
+    # Sep 2..4 are misses: slip shows on Sep 4 whether or not the window starts there
+    wide = load_feature_columns(db_session, user.id, date(2025, 9, 1), date(2025, 9, 5), TZ)
+    narrow = load_feature_columns(db_session, user.id, date(2025, 9, 4), date(2025, 9, 4), TZ)
+    assert [r.slip_7d_flag for r in wide] == [False, False, False, True, True]
+    assert narrow[0].slip_7d_flag is True
+    assert narrow[0].hour_bucket == wide[3].hour_bucket == "afternoon"
+    assert narrow[0].completion_median_min == 16 * 60
+
+    # Days before the habit was tracked read back as empty rows
+    before = load_feature_columns(db_session, user.id, date(2025, 8, 30), date(2025, 8, 31), TZ)
+    assert [(r.current_streak, r.last_30d_rate, r.hour_bucket) for r in before] == [(0, 0.0, None)] * 2
+
+
+def test_first_read_writes_only_its_range(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone=TZ)
+    habit = habit_factory(user_id=user.id)
+    for d in (1, 2, 3, 10, 19, 20):
+        event_factory(habit_id=habit.id, occurred_at_utc=_at(date(2025, 9, d)))
+
+    def rows():
+        return {
+            r.day: (r.current_streak, r.miss_streak, r.last_7d_rate, r.completion_median_min)
+            for r in db_session.query(DailyFeatureORM).filter_by(habit_id=habit.id)
+        }
+
+    # Streaks and trailing windows of a late first read match a read from the first day
+    load_feature_columns(db_session, user.id, date(2025, 9, 20), date(2025, 9, 22), TZ)
+    late = rows()
+    assert sorted(late) == [date(2025, 9, 20), date(2025, 9, 21), date(2025, 9, 22)]
+    assert late[date(2025, 9, 20)][:2] == (2, 0)
+
+    load_feature_columns(db_session, user.id, date(2025, 9, 5), date(2025, 9, 22), TZ)
+    extended = rows()
+    assert min(extended) == date(2025, 9, 5) and extended[date(2025, 9, 9)][:2] == (0, 6)
+    assert {d: extended[d] for d in late} == late
+
+    # Rows stay in the user's zone: another one is refused rather than recomputed
+    with pytest.raises(ValueError):
+        load_feature_columns(db_session, user.id, date(2025, 9, 5), date(2025, 9, 22), "Asia/Tokyo")
+    assert _mark(db_session, habit.id).tz == TZ
+
+
+def test_window_change_recomputes_with_extra_rates(db_session, user_factory, habit_factory, event_factory, monkeypatch):
+    from app.core.settings import settings
+
+    user = user_factory(timezone=TZ)
+    habit = habit_factory(user_id=user.id)
+    for d in (1, 2, 3):
+        event_factory(habit_id=habit.id, occurred_at_utc=_at(date(2025, 9, d)))
+    materialize_user(db_session, user.id, through=date(2025, 9, 5), tz_name=TZ)
+
+    monkeypatch.setattr(settings, "FEATURE_WINDOWS", "3,7,30")
+    assert materialize_user(db_session, user.id, through=date(2025, 9, 5), tz_name=TZ) == 5
+    assert _mark(db_session, habit.id).windows == "3,7,30"
+    cols = load_feature_columns(db_session, user.id, date(2025, 9, 3), date(2025, 9, 5), TZ)
+    assert list(cols.rates[3]) == [1.0, round(2 / 3, 4), round(1 / 3, 4)]
+    assert list(cols.last_7d_rate) == [round(3 / 7, 4)] * 3
+
+
+def test_plan_page_walks_the_habit_day_grid():
+    start, end = date(2025, 9, 1), date(2025, 9, 4)
+    spans, nxt = plan_page([1, 2, 3], start, end, after=None, limit=6)
+    assert spans == [(1, start, end), (2, start, date(2025, 9, 2))]
+    assert nxt == (2, date(2025, 9, 2))
+
+    spans, nxt = plan_page([1, 2, 3], start, end, after=nxt, limit=6)
+    assert spans == [(2, date(2025, 9, 3), end), (3, start, end)]
+    assert nxt is None
+
+    # A page that ends exactly on a habit's last day still points past it
+    assert plan_page([1, 2], start, end, after=None, limit=4) == ([(1, start, end)], (1, end))
+    assert plan_page([1, 2], start, end, after=(2, end), limit=4) == ([], None)
+    assert decode_cursor(encode_cursor((12, end))) == (12, end)
+
+
+def test_feature_pages_match_the_full_read(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone=TZ)
+    habits = [habit_factory(user_id=user.id, name=f"h{k}") for k in range(3)]
+    for k, h in enumerate(habits):
+        for d in range(1, 8, k + 1):
+            event_factory(habit_id=h.id, occurred_at_utc=_at(date(2025, 9, d)))
+    start, end = date(2025, 9, 3), date(2025, 9, 8)
+
+    # The first page only materializes its own habits, through its own last day
+    cols, cursor = load_feature_page(db_session, user.id, start, end, limit=4, tz_name=TZ)
+    assert len(cols) == 4 and cursor == (habits[0].id, date(2025, 9, 6))
+    assert _mark(db_session, habits[0].id).computed_through == date(2025, 9, 6)
+    assert _mark(db_session, habits[1].id) is None
+
+    paged = [(r.habit_id, r.day, r.current_streak, r.last_7d_rate) for r in cols]
+    while cursor is not None:
+        cols, cursor = load_feature_page(db_session, user.id, start, end, limit=4, after=cursor, tz_name=TZ)
+        assert 0 < len(cols) <= 4
+        paged += [(r.habit_id, r.day, r.current_streak, r.last_7d_rate) for r in cols]
+
+    full = load_feature_columns(db_session, user.id, start, end, TZ)
+    assert paged == [(r.habit_id, r.day, r.current_streak, r.last_7d_rate) for r in full]
@@ -211,3 +211,87 @@ def test_time_buckets_env_changes_bucket(db_session, monkeypatch):
     assert r2.hour_bucket == "onlybucket"
     # Ensure the bucket label actually changed
     assert r1.hour_bucket != r2.hour_bucket
+
+
+def test_columnar_matches_rows_and_encodes_public_json(db_session):
+    import dataclasses
+    import json
+    import pickle
+    from typing import List
+    from pydantic import TypeAdapter
+    from app.models.schemas import FeaturePublic
+    from app.services.analytics import features_json
+    from app.services.features import build_daily_features_columnar
+
+    user_id = _mk_user_id()
+    h1 = _mk_habit(db_session, user_id, "Read")
+    h2 = _mk_habit(db_session, user_id, 'Say "hi"')
+    start, end = date(2025, 9, 1), date(2025, 9, 10)
+    for d in (1, 2, 3, 8):
+        _add_event(db_session, h1.id, datetime(2025, 9, d, 15, 0, tzinfo=pytz.UTC))
+    _add_event(db_session, h2.id, datetime(2025, 9, 5, 3, 0, tzinfo=pytz.UTC))
+
+    cols = build_daily_features_columnar(db_session, user_id, start, end, tz_name="America/Phoenix")
+    rows = build_daily_features(db_session, user_id, start, end, tz_name="America/Phoenix")
+    assert len(cols) == len(rows) == 20
+
+    # Views expose exactly the FeatureRow attributes
+    for view, row in zip(cols, rows):
+        for f in dataclasses.fields(row):
+            assert getattr(view, f.name) == getattr(row, f.name), f.name
+    assert cols[-1].day == end and cols[-1].dow == end.weekday()
+
+    # Columns are compact and picklable (they cross process-pool boundaries)
+    assert len(pickle.loads(pickle.dumps(cols))) == 20
+
+    names = {h1.id: h1.name, h2.id: h2.name}
+    payload = json.loads(features_json(cols, names))
+    validated = TypeAdapter(List[FeaturePublic]).validate_python(payload)
+    assert [p.model_dump(mode="json") for p in validated] == payload
+    assert payload[0]["dow"] == "Mon" and payload[0]["current_streak"] == 1
+    assert payload[10]["habit_name"] == 'Say "hi"'
+
+
+def test_configurable_windows_use_long_backfill(db_session, monkeypatch):
+    from app.services.features import build_daily_features_columnar
+    from app.services.windows import parse_windows
+
+    assert parse_windows("90, 3,14") == (3, 7, 14, 30, 90)
+    with pytest.raises(ValueError):
+        parse_windows("0")
+
+    user_id = _mk_user_id()
+    h = _mk_habit(db_session, user_id)
+    # One completion 60 days before start: only the 90-day window can see it
+    _add_event(db_session, h.id, datetime(2025, 7, 3, 12, 0, tzinfo=pytz.UTC))
+    _add_event(db_session, h.id, datetime(2025, 9, 1, 12, 0, tzinfo=pytz.UTC))
+    start, end = date(2025, 9, 1), date(2025, 9, 3)
+
+    default = build_daily_features(db_session, user_id, start, end, tz_name="UTC")
+    monkeypatch.setattr(settings, "FEATURE_WINDOWS", "3,14,90")
+    cols = build_daily_features_columnar(db_session, user_id, start, end, tz_name="UTC")
+
+    assert sorted(cols.rates) == [3, 7, 14, 30, 90]
+    assert list(cols.rates[90]) == [round(2 / 90, 4)] * 3
+    assert list(cols.rates[3]) == [round(1 / 3, 4)] * 3
+    assert [(r.last_7d_rate, r.last_30d_rate, r.current_streak) for r in cols] == \
+        [(r.last_7d_rate, r.last_30d_rate, r.current_streak) for r in default]
+    assert cols[0].window_rates[14] == round(1 / 14, 4)
+
+
+def test_features_default_to_the_users_timezone(db_session, monkeypatch):
+    from app.db import UserORM
+
+    user = UserORM(name="Tz", email=f"tz+{uuid.uuid4().hex}@example.com", timezone="Asia/Tokyo")
+    db_session.add(user)
+    db_session.commit()
+    h = _mk_habit(db_session, user.id)
+    # 20:00 UTC on Sep 1 is Sep 2 in Tokyo
+    _add_event(db_session, h.id, datetime(2025, 9, 1, 20, 0, tzinfo=pytz.UTC))
+    monkeypatch.setattr(settings, "TIMEZONE", "UTC")
+
+    rows = build_daily_features(db_session, user.id, date(2025, 9, 1), date(2025, 9, 2))
+    assert [r.current_streak for r in rows] == [0, 1]
+    assert rows[1].completion_median_min == 5 * 60
+    utc_rows = build_daily_features(db_session, user.id, date(2025, 9, 1), date(2025, 9, 2), tz_name="UTC")
+    assert [r.current_streak for r in utc_rows] == [1, 0]
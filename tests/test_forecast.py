@@ -0,0 +1,131 @@
+# tests/test_forecast.py
+from datetime import date, datetime, timedelta, timezone
+from time import perf_counter
+
+import pytest
+
+from app.services import forecast
+from app.services.feature_store import materialize_user
+from app.services.forecast import (
+    DEFAULT_MODEL, FEATURES, feature_vector, fit_logistic, forecast_user, get_model, reload_model, save_model,
+)
+
+NOW = datetime(2025, 9, 20, 18, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_model():
+    reload_model()
+    yield
+    reload_model()
+
+
+def test_scores_from_stored_state(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="UTC")
+    steady = habit_factory(user_id=user.id, name="Steady")
+    lapsed = habit_factory(user_id=user.id, name="Lapsed")
+    for d in range(1, 20):                                   # every day through yesterday
+        event_factory(habit_id=steady.id, occurred_at_utc=datetime(2025, 9, d, 8, tzinfo=timezone.utc))
+    event_factory(habit_id=lapsed.id, occurred_at_utc=datetime(2025, 9, 1, 8, tzinfo=timezone.utc))
+    event_factory(habit_id=lapsed.id, occurred_at_utc=NOW - timedelta(hours=2))   # done today
+    materialize_user(db_session, user.id, through=date(2025, 9, 20), tz_name="UTC")   # what the nightly job does
+    db_session.commit()
+
+    out = forecast_user(db_session, user.id, now=NOW)
+    assert out["today"] == date(2025, 9, 20) and out["model_version"] == 0
+    by_name = {h["habit_name"]: h for h in out["habits"]}
+    assert by_name["Lapsed"]["completed_today"] is True and by_name["Lapsed"]["p_today"] == 1.0
+    assert by_name["Steady"]["completed_today"] is False
+    assert by_name["Steady"]["p_today"] > 0.8 > by_name["Lapsed"]["p_tomorrow"]
+
+    with pytest.raises(LookupError):
+        forecast_user(db_session, user.id, habit_id=10**9, now=NOW)
+
+
+def test_serving_reads_without_writing(db_session, user_factory, habit_factory, event_factory):
+    from sqlalchemy import event
+
+    from app.db import FeatureWatermarkORM
+
+    user = user_factory(timezone="UTC")
+    habit = habit_factory(user_id=user.id, name="Fresh")
+    event_factory(habit_id=habit.id, occurred_at_utc=NOW - timedelta(hours=1))
+
+    writes = []
+
+    def listener(conn, cursor, statement, params, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            writes.append(statement)
+
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        out = forecast_user(db_session, user.id, now=NOW)
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+    assert writes == [] and not db_session.new and not db_session.dirty
+    assert db_session.get(FeatureWatermarkORM, habit.id) is None
+    # nothing materialized yet: today's state still comes from today's event
+    h = out["habits"][0]
+    assert h["completed_today"] is True and h["p_today"] == 1.0
+    fresh = feature_vector(round(1 / 7, 4), round(1 / 30, 4), 1, False, date(2025, 9, 21).weekday(), False)
+    assert h["p_tomorrow"] == round(forecast.DEFAULT_MODEL.score([fresh])[0], 4)
+
+
+def test_events_after_materialization_move_the_forecast(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="America/Los_Angeles")    # west of UTC: NOW is still the morning of Sep 20
+    habit = habit_factory(user_id=user.id, name="Late")
+    for d in range(10, 19):
+        event_factory(habit_id=habit.id, occurred_at_utc=datetime(2025, 9, d, 16, tzinfo=timezone.utc))
+    materialize_user(db_session, user.id, through=date(2025, 9, 20))
+    db_session.commit()
+    before = forecast_user(db_session, user.id, now=NOW)["habits"][0]
+    assert before["completed_today"] is False
+
+    event_factory(habit_id=habit.id, occurred_at_utc=NOW - timedelta(minutes=5))
+    after = forecast_user(db_session, user.id, now=NOW)["habits"][0]
+    assert after["completed_today"] is True and after["p_today"] == 1.0
+    assert after["p_tomorrow"] > before["p_tomorrow"]
+
+
+def test_stored_model_is_loaded_once_and_replaced_on_save(db_session, user_factory, habit_factory):
+    user = user_factory(timezone="UTC")
+    habit_factory(user_id=user.id)
+    assert get_model(db_session) is DEFAULT_MODEL
+
+    row = save_model(db_session, 5.0, [0.0] * len(FEATURES))
+    model = get_model(db_session)
+    assert model.version == row.id and get_model() is model
+    out = forecast_user(db_session, user.id, now=NOW)
+    assert out["model_version"] == row.id
+    assert out["habits"][0]["p_tomorrow"] == round(1 / (1 + pow(2.718281828459045, -5.0)), 4)
+
+
+def test_fit_recovers_coefficients_and_scoring_is_fast():
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(3)
+    X = rng.random((4000, len(FEATURES)))
+    true_w = np.array([2.0, 1.0, 0.5, -1.0, -0.5, -0.8])
+    y = (rng.random(4000) < 1 / (1 + np.exp(-(X @ true_w - 1.0)))).astype(float)
+    b, w = fit_logistic(X, y, l2=0.0)
+    assert abs(b + 1.0) < 0.35 and np.allclose(w, true_w, atol=0.5)
+
+    rows = [feature_vector(0.5, 0.4, k, k % 4 == 0, k % 7, False) for k in range(100)]   # 50 habits x 2 days
+    DEFAULT_MODEL.score(rows)
+    t = perf_counter()
+    DEFAULT_MODEL.score(rows)
+    assert perf_counter() - t < 0.001
+
+
+def test_habit_forecast_endpoint(client, db_session, user_factory, habit_factory, user_override):
+    owner = user_factory(timezone="UTC")
+    habit = habit_factory(user_id=owner.id)
+    user_override(owner)
+    r = client.get(f"/habits/{habit.id}/forecast")
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert [h["habit_id"] for h in body["habits"]] == [habit.id]
+    assert 0.0 < body["habits"][0]["p_tomorrow"] < 1.0
+
+    other = habit_factory(user_id=user_factory().id)
+    assert client.get(f"/habits/{other.id}/forecast").status_code == 404
@@ -0,0 +1,66 @@
+# tests/test_hour_counts.py
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+from app.services import aggregates
+from app.services.hour_counts import hour_of_week_counts
+from app.services.time_buckets import bucket_table
+
+PHX = ZoneInfo("America/Phoenix")
+
+
+def _utc(dt):
+    return dt.astimezone(timezone.utc)
+
+
+def test_counters_follow_local_hour_of_week(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="America/Phoenix")
+    habit = habit_factory(user_id=user.id)
+
+    # Mon 2025-09-01 08:xx local twice, Wed 2025-09-03 23:30 local (06:30Z Thu)
+    event_factory(habit_id=habit.id, occurred_at_utc=_utc(datetime(2025, 9, 1, 8, 5, tzinfo=PHX)))
+    event_factory(habit_id=habit.id, occurred_at_utc=_utc(datetime(2025, 9, 1, 8, 50, tzinfo=PHX)))
+    event_factory(habit_id=habit.id, occurred_at_utc=_utc(datetime(2025, 9, 3, 23, 30, tzinfo=PHX)))
+
+    grid = hour_of_week_counts(db_session, start=date(2025, 9, 1), end=date(2025, 9, 7), user_id=user.id)
+    assert len(grid) == 168
+    assert grid[0 * 24 + 8] == 2
+    assert grid[2 * 24 + 23] == 1
+    assert sum(grid) == 3
+
+
+def test_window_edges_drop_days_outside_range(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="America/Phoenix")
+    habit = habit_factory(user_id=user.id)
+
+    event_factory(habit_id=habit.id, occurred_at_utc=_utc(datetime(2025, 9, 1, 9, 0, tzinfo=PHX)))   # Mon
+    event_factory(habit_id=habit.id, occurred_at_utc=_utc(datetime(2025, 9, 5, 9, 0, tzinfo=PHX)))   # Fri
+
+    grid = hour_of_week_counts(db_session, start=date(2025, 9, 3), end=date(2025, 9, 10), habit_ids=[habit.id])
+    assert grid[0 * 24 + 9] == 0
+    assert grid[4 * 24 + 9] == 1
+
+
+def test_rebuild_rebuckets_after_timezone_change(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="America/Phoenix")
+    habit = habit_factory(user_id=user.id)
+    event_factory(habit_id=habit.id, occurred_at_utc=datetime(2025, 9, 2, 15, 0, tzinfo=timezone.utc))  # Tue
+
+    user.timezone = "UTC"
+    aggregates.rebuild_user(db_session, user.id)
+    db_session.commit()
+
+    grid = hour_of_week_counts(db_session, start=date(2025, 9, 1), end=date(2025, 9, 7), user_id=user.id)
+    assert grid[1 * 24 + 15] == 1
+    assert grid[1 * 24 + 8] == 0
+
+
+def test_bucket_table_follows_spec():
+    names, table = bucket_table("morning=5-11,afternoon=11-17,evening=17-22,night=22-5")
+    assert names == ("morning", "afternoon", "evening", "night")
+    assert table[5] == "morning" and table[11] == "afternoon"
+    assert table[23] == "night" and table[4] == "night"
+
+    names, table = bucket_table("am=0-12,pm=12-24")
+    assert names == ("am", "pm")
+    assert set(table[:12]) == {"am"} and set(table[12:]) == {"pm"}
@@ -0,0 +1,120 @@
+# tests/test_jobs.py
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import ReminderOutboxORM, ReminderSentORM
+from app.services import jobs
+
+
+@pytest.fixture
+def sessions(db_session):
+    return lambda: Session(db_session.get_bind())
+
+
+@pytest.fixture
+def sliced():
+    """A job that handles one item per slice and has no time for a second one."""
+    items = ["a", "b", "c"]
+    seen = []
+
+    @jobs.job("test:sliced", budget_seconds=0)
+    def work(db, ctx):
+        start = items.index(ctx.cursor) + 1 if ctx.cursor else 0
+        for item in items[start:]:
+            seen.append(item)
+            ctx.add(10)
+            ctx.cursor = item
+            if ctx.out_of_time():
+                return item if item != items[-1] else None
+        return None
+
+    yield seen
+    jobs._REGISTRY.pop("test:sliced")
+
+
+def test_partial_runs_resume_from_their_cursor(sessions, sliced):
+    runs = [jobs.run_job("test:sliced", session_factory=sessions) for _ in range(4)]
+    assert [r["status"] for r in runs] == ["partial", "partial", "ok", "partial"]
+    assert [r["cursor"] for r in runs[:2]] == ["a", "b"]
+    assert sliced == ["a", "b", "c", "a"]           # a finished job starts over
+    assert runs[0]["rows"] == 10 and runs[0]["finished_at"] >= runs[0]["started_at"]
+
+
+def test_runner_resumes_partial_jobs_until_they_finish(db_session, sessions, sliced, monkeypatch):
+    from app.core.settings import settings
+
+    db_session.execute(jobs._runs.delete().where(jobs._runs.c.job == "test:sliced"))   # start a fresh chain
+    db_session.commit()
+    monkeypatch.setattr(settings, "JOBS_RESUME_DELAY_SECONDS", 0)
+    runner = jobs.JobRunner(session_factory=sessions)
+    runner.submit("test:sliced")
+    runner.join()
+    runs = jobs.job_runs(db_session, name="test:sliced")[::-1]
+    assert [(r["status"], r["trigger"]) for r in runs] == [("partial", "manual"), ("partial", "resume"), ("ok", "resume")]
+    assert sliced == ["a", "b", "c"]
+
+    # past the deadline a partial run waits for its next scheduled run
+    monkeypatch.setattr(settings, "JOBS_RESUME_DEADLINE_SECONDS", 0)
+    runner.submit("test:sliced")
+    runner.join()
+    assert sliced == ["a", "b", "c", "a"] and runner.queued() == []
+    runner.shutdown()
+
+
+def test_failures_are_recorded(db_session, sessions):
+    @jobs.job("test:broken")
+    def broken(db, ctx):
+        ctx.add(1)
+        raise RuntimeError("boom")
+
+    try:
+        run = jobs.run_job("test:broken", trigger="admin", session_factory=sessions)
+    finally:
+        jobs._REGISTRY.pop("test:broken")
+    assert run["status"] == "error" and run["error"] == "RuntimeError: boom"
+    assert jobs.job_runs(db_session, name="test:broken")[0]["trigger"] == "admin"
+
+
+def test_prune_keeps_only_recent_rows(db_session, sessions, user_factory, habit_factory):
+    user = user_factory()
+    habit = habit_factory(user_id=user.id, name="prune")
+    today = datetime.now(timezone.utc).date()
+    old = datetime.now(timezone.utc) - timedelta(days=60)
+    for d in (date(2024, 1, 1), today):
+        db_session.add(ReminderSentORM(habit_id=habit.id, local_day=d, user_id=user.id))
+    db_session.add_all([
+        ReminderOutboxORM(user_id=user.id, habit_id=habit.id, local_day=date(2024, 1, 1), habit_name="p",
+                          status="sent", created_at=old),
+        ReminderOutboxORM(user_id=user.id, habit_id=habit.id, local_day=date(2024, 1, 2), habit_name="p",
+                          status="pending", created_at=old),
+    ])
+    db_session.commit()
+
+    run = jobs.run_job("maintenance:prune", session_factory=sessions)
+    assert run["status"] == "ok" and run["rows"] >= 2
+    assert db_session.execute(
+        select(ReminderSentORM.local_day).where(ReminderSentORM.habit_id == habit.id)
+    ).scalars().all() == [today]
+    assert db_session.execute(
+        select(ReminderOutboxORM.status).where(ReminderOutboxORM.habit_id == habit.id)
+    ).scalars().all() == ["pending"]                # undelivered rows are never pruned
+
+
+def test_admin_triggers_run_in_priority_order(client, sessions, monkeypatch):
+    runner = jobs.JobRunner(session_factory=sessions)
+    monkeypatch.setattr(jobs, "_runner", runner)
+
+    assert client.post("/admin/jobs/nope/run").status_code == 404
+    assert [j["name"] for j in client.get("/admin/jobs").json()][:4] == [
+        "rollups:rebuild", "features:materialize", "maintenance:prune", "maintenance:optimize",
+    ]
+    r = client.post("/admin/jobs/maintenance:optimize/run")
+    assert r.status_code == 202 and r.json() == {"job": "maintenance:optimize", "queued": True}
+    runner.join()
+
+    runs = client.get("/admin/jobs/runs", params={"job": "maintenance:optimize"}).json()
+    assert runs[0]["status"] == "ok" and runs[0]["trigger"] == "admin"
+    runner.shutdown()
@@ -0,0 +1,67 @@
+# tests/test_leases.py
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from app.services import leases
+from app.services.scheduler import LEASE_NAME, SchedulerLeader
+
+T0 = datetime(2025, 9, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def test_one_holder_until_the_lease_expires(db_session):
+    name = "test:expiry"
+    assert leases.acquire(db_session, name, "a", 30, now=T0)
+    assert not leases.acquire(db_session, name, "b", 30, now=T0 + timedelta(seconds=5))
+    assert leases.acquire(db_session, name, "a", 30, now=T0 + timedelta(seconds=20))      # renewal
+    assert not leases.acquire(db_session, name, "b", 30, now=T0 + timedelta(seconds=45))  # renewed to 0:50
+
+    # a stops renewing: b takes over once the lease runs out, and a cannot come back
+    assert leases.acquire(db_session, name, "b", 30, now=T0 + timedelta(seconds=50))
+    assert not leases.acquire(db_session, name, "a", 30, now=T0 + timedelta(seconds=55))
+    lease = leases.current_lease(db_session, name, now=T0 + timedelta(seconds=55))
+    assert lease["holder"] == "b" and lease["live"]
+    assert lease["acquired_at"] == T0 + timedelta(seconds=50)
+
+    # release hands over immediately; releasing someone else's lease does nothing
+    assert not leases.release(db_session, name, "a", now=T0 + timedelta(seconds=56))
+    assert leases.release(db_session, name, "b", now=T0 + timedelta(seconds=56))
+    assert leases.acquire(db_session, name, "a", 30, now=T0 + timedelta(seconds=57))
+    db_session.commit()
+
+
+class _FakeJobs:
+    def __init__(self):
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def shutdown(self, wait=True):
+        self.running = False
+
+
+def test_only_the_lease_holder_runs_jobs(db_session, client):
+    sessions = lambda: Session(db_session.get_bind())
+    jobs = []
+
+    def factory():
+        jobs.append(_FakeJobs())
+        return jobs[-1]
+
+    first = SchedulerLeader(factory, holder="worker-1", session_factory=sessions)
+    second = SchedulerLeader(factory, holder="worker-2", session_factory=sessions)
+    assert first.heartbeat() and first.is_leader
+    assert not second.heartbeat() and not second.is_leader
+    assert first.heartbeat() and len(jobs) == 1 and jobs[0].running      # renewing keeps the same jobs
+
+    body = client.get("/admin/scheduler").json()
+    assert body["lease"]["holder"] == "worker-1" and body["lease"]["live"]
+
+    # the holder shuts down: its jobs stop, the lease is released and the next heartbeat fails over
+    first.shutdown()
+    assert not jobs[0].running
+    assert second.heartbeat() and second.is_leader and jobs[1].running
+    assert client.get("/admin/scheduler").json()["lease"]["holder"] == "worker-2"
+    second.shutdown()
+    assert leases.current_lease(db_session, LEASE_NAME)["live"] is False
@@ -0,0 +1,110 @@
+# tests/test_outbox.py
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+from app.core.settings import settings
+from app.db import ReminderOutboxORM
+from app.services.outbox import FileSink, WebhookSink, dispatch, enqueue, outbox_counts, sink_from_spec
+from app.services.reminders import DueReminder
+
+
+@pytest.fixture
+def queued(db_session, user_factory, habit_factory):
+    db_session.execute(delete(ReminderOutboxORM))       # the test DB is shared with the reminder cycle tests
+    user = user_factory()
+    habits = [habit_factory(user_id=user.id, name=f"h{k}") for k in range(3)]
+    due = [DueReminder(user.id, h.id, h.name, date(2025, 9, 10)) for h in habits]
+    assert enqueue(db_session, due) == 3
+    assert enqueue(db_session, due) == 0                 # same habit/day is only queued once
+    db_session.commit()
+    return due
+
+
+class _Recorder:
+    name = "recorder"
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches = []
+
+    def send(self, batch):
+        if self.fail:
+            raise ConnectionError("sink down")
+        self.batches.append([m.habit_id for m in batch])
+
+
+def test_dispatch_drains_in_batches(db_session, queued, tmp_path):
+    now = datetime.now(timezone.utc)
+    path = tmp_path / "reminders.jsonl"
+    stats = dispatch(db_session, FileSink(str(path)), batch_size=2, now=now)
+    assert (stats["batches"], stats["sent"], stats["retried"]) == (2, 3, 0)
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["habit_id"] for line in lines] == [r.habit_id for r in queued]
+    assert lines[0]["day"] == "2025-09-10"
+    assert outbox_counts(db_session)["sent"] == 3
+    assert dispatch(db_session, FileSink(str(path)), now=now)["sent"] == 0
+
+
+def test_failed_batches_back_off_then_die(db_session, queued, monkeypatch):
+    now = datetime.now(timezone.utc)
+    monkeypatch.setattr(settings, "REMINDER_MAX_ATTEMPTS", 2)
+    down = _Recorder(fail=True)
+    assert dispatch(db_session, down, now=now)["retried"] == 3
+    row = db_session.query(ReminderOutboxORM).first()
+    assert row.attempts == 1 and row.next_attempt_at == now + timedelta(seconds=settings.REMINDER_RETRY_BASE_SECONDS)
+    assert "sink down" in row.last_error
+
+    assert dispatch(db_session, down, now=now + timedelta(seconds=1))["batches"] == 0     # still backing off
+    assert dispatch(db_session, down, now=now + timedelta(minutes=5))["dead"] == 3
+    assert outbox_counts(db_session)["dead"] == 3
+
+
+def test_webhook_sink_posts_batches(db_session, queued):
+    now = datetime.now(timezone.utc)
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(json.loads(request.content))
+        return httpx.Response(500 if len(seen) == 1 else 204)
+
+    sink = WebhookSink("http://reminders.local/hook", client=httpx.Client(transport=httpx.MockTransport(handler)))
+    assert dispatch(db_session, sink, now=now)["retried"] == 3          # first POST answered 500
+    assert dispatch(db_session, sink, now=now + timedelta(minutes=5))["sent"] == 3
+    assert [r["habit_id"] for r in seen[1]["reminders"]] == [r.habit_id for r in queued]
+
+
+def test_sink_specs():
+    assert sink_from_spec("stdout").name == "stdout"
+    assert sink_from_spec("file:/tmp/x.jsonl").name == "file:/tmp/x.jsonl"
+    assert isinstance(sink_from_spec("https://example.invalid/hook"), WebhookSink)
+    with pytest.raises(ValueError):
+        sink_from_spec("smtp://nope")
+
+
+def test_enqueue_inserts_in_chunks(db_session, user_factory, habit_factory):
+    from sqlalchemy import event
+    from app.services.outbox import CHUNK_ROWS
+
+    user = user_factory()
+    habit = habit_factory(user_id=user.id, name="chunked")
+    start = date(2020, 1, 1)
+    due = [DueReminder(user.id, habit.id, habit.name, start + timedelta(days=k)) for k in range(2 * CHUNK_ROWS + 1)]
+
+    inserts = []
+    bind = db_session.get_bind()
+
+    def count(conn, cursor, statement, params, context, executemany):
+        if statement.startswith("INSERT"):
+            inserts.append(statement)
+
+    event.listen(bind, "before_cursor_execute", count)
+    try:
+        assert enqueue(db_session, due) == len(due)
+    finally:
+        event.remove(bind, "before_cursor_execute", count)
+    assert len(inserts) == 2 * 3                        # reminder_sent + reminder_outbox per chunk
+    db_session.rollback()
@@ -0,0 +1,70 @@
+# tests/test_pools.py
+import asyncio
+import math
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.auth import get_current_user
+from app.routers import analytics as analytics_router
+from app.services.pools import BoundedPool, PoolSaturated
+
+
+def test_bounded_pool_rejects_when_queue_full():
+    pool = BoundedPool("t", kind="thread", workers=1, queue_limit=1)
+    gate = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(gate.wait, 5))
+        queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        assert pool.stats()["queue_depth"] == 1
+
+        with pytest.raises(PoolSaturated) as exc:
+            await pool.run(lambda: "rejected")
+        assert exc.value.retry_after >= 1
+
+        gate.set()
+        return await running, await queued
+
+    try:
+        assert asyncio.run(scenario()) == (True, "queued")
+    finally:
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["max_wait_ms"] > 0
+
+
+def test_process_pool_runs_picklable_calls():
+    pool = BoundedPool("p", kind="process", workers=1, queue_limit=0)
+    try:
+        assert asyncio.run(pool.run(math.factorial, 10)) == 3628800
+    finally:
+        pool.shutdown()
+
+
+def test_analytics_endpoint_returns_503_with_retry_after(monkeypatch):
+    class _Saturated:
+        async def run(self, fn, *args, **kwargs):
+            raise PoolSaturated("analytics", 7)
+
+    monkeypatch.setattr(analytics_router, "get_pool", lambda name="analytics": _Saturated())
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id="busy-user")
+    try:
+        with TestClient(app) as c:
+            r = c.get("/analytics/weekly")
+            assert r.status_code == 503
+            assert r.headers["Retry-After"] == "7"
+
+            # cheap endpoints are unaffected
+            assert c.get("/ping").status_code == 200
+            assert isinstance(c.get("/admin/pools").json(), dict)
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
@@ -0,0 +1,103 @@
+# tests/test_reminder_wheel.py
+from datetime import date, datetime, timezone
+
+from app.db import ReminderScheduleORM
+from app.services.reminder_wheel import (
+    ReminderWheel, last_slot, next_slot, parse_local_time, set_reminder_time, slot_utc,
+)
+
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_slots_across_dst_transitions():
+    ny = "America/New_York"
+    # 02:30 does not exist on 2025-03-09: it fires at 03:30 EDT
+    assert slot_utc(date(2025, 3, 9), parse_local_time("02:30"), ny) == _utc(2025, 3, 9, 7, 30)
+    # 01:30 happens twice on 2025-11-02: only the first (EDT) one is a slot
+    assert slot_utc(date(2025, 11, 2), parse_local_time("01:30"), ny) == _utc(2025, 11, 2, 5, 30)
+    # 09:00 local moves by an hour in UTC across the switch
+    assert next_slot(540, ny, _utc(2025, 3, 8, 15)) == (date(2025, 3, 9), _utc(2025, 3, 9, 13))
+    assert last_slot(540, ny, _utc(2025, 3, 9, 12, 59)) == (date(2025, 3, 8), _utc(2025, 3, 8, 14))
+
+
+def test_wheel_fires_only_arrived_users(db_session, user_factory, habit_factory):
+    phx = user_factory(timezone="America/Phoenix")              # default 09:00 = 16:00 UTC
+    tokyo = user_factory(timezone="Asia/Tokyo")
+    set_reminder_time(db_session, tokyo.id, parse_local_time("07:00"))   # 22:00 UTC the day before
+    db_session.commit()
+    phx_habit = habit_factory(user_id=phx.id, name="phx")
+    tokyo_habit = habit_factory(user_id=tokyo.id, name="tokyo")
+    mine = {phx.id, tokyo.id}
+
+    def fired(wheel, now):
+        due = wheel.tick(db_session, now)
+        return {(r.user_id, r.habit_id, r.day) for r in due if r.user_id in mine}
+
+    wheel = ReminderWheel()
+    assert fired(wheel, _utc(2025, 9, 10, 5)) == set()        # both last slots are outside the catch-up window
+    assert wheel.next_fire(phx.id) == _utc(2025, 9, 10, 16)
+    assert wheel.next_fire(tokyo.id) == _utc(2025, 9, 10, 22)
+
+    assert fired(wheel, _utc(2025, 9, 10, 16)) == {(phx.id, phx_habit.id, date(2025, 9, 10))}
+    assert fired(wheel, _utc(2025, 9, 10, 16, 1)) == set()
+    assert fired(wheel, _utc(2025, 9, 10, 22)) == {(tokyo.id, tokyo_habit.id, date(2025, 9, 11))}
+    assert db_session.get(ReminderScheduleORM, phx.id).last_fired_on == date(2025, 9, 10)
+
+    # Restart after downtime: Phoenix's Sept 11 slot was missed 2h ago and catches up once;
+    # Tokyo's last slot already fired, so it just waits for the next one
+    restarted = ReminderWheel()
+    assert fired(restarted, _utc(2025, 9, 11, 18)) == {(phx.id, phx_habit.id, date(2025, 9, 11))}
+    assert fired(restarted, _utc(2025, 9, 11, 18, 5)) == set()
+    assert restarted.next_fire(tokyo.id) == _utc(2025, 9, 11, 22)
+
+    # A timezone change is picked up by the next tick's sync
+    phx.timezone = "Europe/Berlin"
+    db_session.commit()
+    restarted.tick(db_session, _utc(2025, 9, 11, 18, 10))
+    assert restarted.next_fire(phx.id) == _utc(2025, 9, 12, 7)
+
+
+def test_failed_tick_keeps_slots_for_the_next_one(db_session, user_factory, habit_factory, monkeypatch):
+    import pytest
+    from app.services import reminder_wheel
+
+    user = user_factory(timezone="America/Phoenix")
+    habit = habit_factory(user_id=user.id, name="retry")
+    wheel = ReminderWheel()
+    wheel.tick(db_session, _utc(2025, 9, 10, 5))
+
+    def broken(db, due):
+        raise RuntimeError("outbox unavailable")
+
+    with monkeypatch.context() as m:
+        m.setattr(reminder_wheel, "enqueue", broken)
+        with pytest.raises(RuntimeError):
+            wheel.tick(db_session, _utc(2025, 9, 10, 16))
+    # nothing was recorded and the slot is still pending
+    assert db_session.get(ReminderScheduleORM, user.id) is None
+    assert wheel.next_fire(user.id) == _utc(2025, 9, 10, 16)
+
+    due = wheel.tick(db_session, _utc(2025, 9, 10, 16, 1))
+    assert [(r.habit_id, r.day) for r in due if r.user_id == user.id] == [(habit.id, date(2025, 9, 10))]
+    assert db_session.get(ReminderScheduleORM, user.id).last_fired_on == date(2025, 9, 10)
+    assert wheel.next_fire(user.id) == _utc(2025, 9, 11, 16)
+
+
+def test_reminder_time_endpoint(client, user_factory):
+    user = user_factory(timezone="America/Phoenix")
+    r = client.get(f"/users/{user.id}/reminder-time")
+    assert r.status_code == 200, r.text
+    assert r.json()["local_time"] == "09:00" and r.json()["is_default"] is True
+
+    r = client.put(f"/users/{user.id}/reminder-time", json={"local_time": "07:45"})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["local_time"] == "07:45" and body["is_default"] is False
+    assert body["timezone"] == "America/Phoenix"
+    assert datetime.fromisoformat(body["next_fire_utc"]).minute == 45
+
+    assert client.put(f"/users/{user.id}/reminder-time", json={"local_time": "25:00"}).status_code == 422
+    r = client.put(f"/users/{user.id}/reminder-time", json={"local_time": None})
+    assert r.json()["is_default"] is True
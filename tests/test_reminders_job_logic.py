@@ -6,4 +6,170 @@ from app.services import reminders
 def test_run_reminder_cycle_smoke():
     with SessionLocal() as db:
         count = reminders.run_reminder_cycle(db, datetime.now(timezone.utc))
-        assert isinstance(count, int)
\ No newline at end of file
+        assert isinstance(count, int)
+
+def _count_statements(session, fn):
+    from sqlalchemy import event
+    statements = []
+    listener = lambda *args: statements.append(args[2])   # (conn, cursor, statement, ...)
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return result, len(statements)
+
+
+def test_due_reminders_are_set_based(db_session, user_factory, habit_factory, event_factory):
+    from datetime import timedelta
+    from app.db import ContextORM
+    from app.models.schemas import ContextKind
+
+    now = datetime(2025, 9, 10, 18, 0, tzinfo=timezone.utc)
+
+    mine = set()                        # the test DB is shared; only look at this test's users
+
+    def add_user(k, tz):
+        u = user_factory(timezone=tz)
+        mine.add(u.id)
+        habits = [habit_factory(user_id=u.id, name=f"u{k}-h{j}") for j in range(3)]
+        return u, habits
+
+    phx, phx_habits = add_user(0, "America/Phoenix")
+    tokyo, tokyo_habits = add_user(1, "Asia/Tokyo")
+    muted, _ = add_user(2, "UTC")
+    habit_factory(user_id=phx.id, name="paused", status="paused")
+    # Done today in Phoenix (Sept 10); Tokyo is already on Sept 11, so Sept 10 there was yesterday
+    event_factory(habit_id=phx_habits[0].id, occurred_at_utc=now - timedelta(hours=2))
+    event_factory(habit_id=tokyo_habits[0].id, occurred_at_utc=now - timedelta(hours=20))
+    db_session.add(ContextORM(user_id=muted.id, kind=ContextKind.illness,
+                              start_utc=now - timedelta(days=2), end_utc=None))
+    db_session.commit()
+
+    due, small = _count_statements(db_session, lambda: reminders.due_reminders(db_session, now))
+    due = [r for r in due if r.user_id in mine]
+    assert {(r.user_id, r.habit_id) for r in due} == (
+        {(phx.id, h.id) for h in phx_habits[1:]} | {(tokyo.id, h.id) for h in tokyo_habits}
+    )
+    assert {r.day for r in due if r.user_id == tokyo.id} == {now.date() + timedelta(days=1)}
+
+    for k in range(3, 23):
+        add_user(k, ("Europe/Berlin", "America/New_York", None)[k % 3])
+    due, large = _count_statements(db_session, lambda: reminders.due_reminders(db_session, now))
+    assert len([r for r in due if r.user_id in mine]) == 5 + 20 * 3
+    assert large == small == 2
+
+    # A cycle queues them; later cycles skip habits already notified that day
+    reminders.run_reminder_cycle(db_session, now)
+    assert [r for r in reminders.due_reminders(db_session, now, skip_notified=True) if r.user_id in mine] == []
+    assert len([r for r in reminders.due_reminders(db_session, now) if r.user_id in mine]) == 5 + 20 * 3
+
+
+def test_cycle_pages_users_across_workers(tmp_path, monkeypatch, caplog):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.core.settings import settings
+    from app.db import Base, HabitORM, UserORM
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'cycle.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as s:
+        for k in range(7):
+            u = UserORM(name=f"u{k}", email=f"cycle{k}@example.com", timezone=("UTC", "Asia/Tokyo")[k % 2])
+            s.add(u)
+            s.flush()
+            s.add_all([HabitORM(user_id=u.id, name=f"h{j}", name_canonical=f"h{j}") for j in range(2)])
+        s.commit()
+
+    now = datetime(2025, 9, 10, 12, tzinfo=timezone.utc)
+    monkeypatch.setattr(settings, "REMINDER_CYCLE_BUDGET_SECONDS", 0)
+    with Session(engine) as s:
+        assert reminders.run_reminder_cycle(s, now, workers=3, batch_size=2) == 14
+        assert reminders.run_reminder_cycle(s, now, workers=1, batch_size=3) == 0     # all notified already
+    engine.dispose()
+
+    last = reminders.cycle_stats()["cycles"][-2]
+    assert (last["users"], last["pages"], last["workers"], last["due"]) == (7, 4, 3, 14)
+    assert last["over_budget"] is True
+    assert "over its 0s budget" in caplog.text
+
+
+def test_completion_is_probed_from_the_users_local_day_events(db_session, user_factory, habit_factory, event_factory):
+    from datetime import date
+    from app.db import HabitRollupORM, UserORM
+
+    now = datetime(2025, 9, 10, 18, 0, tzinfo=timezone.utc)
+    user = user_factory(timezone="America/Phoenix")
+    logged, yesterday, rolled = (habit_factory(user_id=user.id, name=n) for n in ("logged", "yesterday", "rolled"))
+    event_factory(habit_id=logged.id, occurred_at_utc=datetime(2025, 9, 10, 17, tzinfo=timezone.utc))
+    # 05:00 UTC is still 9/9 in Phoenix
+    event_factory(habit_id=yesterday.id, occurred_at_utc=datetime(2025, 9, 10, 5, tzinfo=timezone.utc))
+    # a rollup day row without events behind it does not count
+    db_session.add(HabitRollupORM(habit_id=rolled.id, level="day", period_start=date(2025, 9, 10), completions=1))
+
+    # Without a zone the reminder day is cut in DEFAULT_USER_TZ (Phoenix): 17:00 UTC is 10:00 there
+    bare = UserORM(name="bare", email="bare-reminders@example.com", timezone=None)
+    db_session.add(bare)
+    db_session.commit()
+    bare_habit = habit_factory(user_id=bare.id, name="bare")
+    event_factory(habit_id=bare_habit.id, occurred_at_utc=datetime(2025, 9, 10, 17, tzinfo=timezone.utc))
+
+    due = reminders.due_reminders(db_session, now, user_ids=[user.id, bare.id])
+    assert sorted(d.habit_name for d in due) == ["rolled", "yesterday"]
+
+
+def test_due_set_is_cached_until_the_users_data_version_moves(db_session, user_factory, habit_factory, event_factory):
+    from datetime import timedelta
+    from app.db import ContextORM
+    from app.models.schemas import ContextKind, HabitStatus
+    from app.services import versions
+
+    now = datetime(2025, 9, 10, 18, 0, tzinfo=timezone.utc)
+    user = user_factory(timezone="America/Phoenix")
+    other = user_factory(timezone="America/Phoenix")
+    a = habit_factory(user_id=user.id, name="cache-a")
+    b = habit_factory(user_id=user.id, name="cache-b")
+    habit_factory(user_id=other.id, name="cache-other")
+
+    def poll(u=user, at=now):
+        db_session.refresh(u)           # the endpoint loads the user itself; count only the due-set work
+        due, n = _count_statements(db_session, lambda: reminders.get_due_habits(db_session, u, at))
+        return {d.habit_id for d in due}, n
+
+    # a miss is the version read plus the two due_reminders statements; a hit is the version read
+    assert poll() == ({a.id, b.id}, 3)
+    assert poll() == ({a.id, b.id}, 1)
+    assert poll(at=now + timedelta(hours=5)) == ({a.id, b.id}, 1)   # 16:00 Phoenix, still Sept 10
+    poll(other)
+
+    event_factory(habit_id=a.id, occurred_at_utc=now - timedelta(hours=1))
+    assert poll() == ({b.id}, 3)
+    assert poll(other)[1] == 1                                      # other users keep their sets
+
+    b.status = HabitStatus.paused
+    db_session.commit()
+    assert poll() == (set(), 3)
+    b.status = HabitStatus.active
+    db_session.commit()
+    assert poll() == ({b.id}, 3)
+
+    ctx = ContextORM(user_id=user.id, kind=ContextKind.travel, start_utc=now - timedelta(days=3), end_utc=None)
+    db_session.add(ctx)
+    db_session.commit()
+    assert poll() == (set(), 3)
+    ctx.end_utc = now - timedelta(days=1)   # ended before Sept 10 even started
+    db_session.commit()
+    assert poll() == ({b.id}, 3)
+
+    # A new local day recomputes; an uncommitted change does not invalidate
+    assert poll(at=now + timedelta(days=1)) == ({a.id, b.id}, 3)
+    b.status = HabitStatus.paused
+    db_session.flush()
+    db_session.rollback()
+    assert poll(at=now + timedelta(days=1))[1] == 1
+
+    # A write committed by another worker only shows up as a newer version
+    versions.bump(db_session, [user.id])
+    db_session.commit()
+    assert poll(at=now + timedelta(days=1))[1] == 3
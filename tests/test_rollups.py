@@ -0,0 +1,132 @@
+# tests/test_rollups.py
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.db import HabitRollupORM, UserRollupORM
+from app.services.rollups import cover, trend
+
+PHX = ZoneInfo("America/Phoenix")
+
+
+def _phx(y, m, d, h=9):
+    return datetime(y, m, d, h, 0, tzinfo=PHX).astimezone(timezone.utc)
+
+
+def test_cover_uses_coarsest_periods():
+    keys = cover(date(2021, 1, 1), date(2025, 12, 31), "year")
+    assert keys == [("year", date(y, 1, 1)) for y in range(2021, 2026)]
+
+    # Mid-month start/end: edge days + whole months in between
+    keys = cover(date(2025, 1, 30), date(2025, 4, 2), "month")
+    assert ("month", date(2025, 2, 1)) in keys and ("month", date(2025, 3, 1)) in keys
+    assert [k for k in keys if k[0] == "day"] == [
+        ("day", date(2025, 1, 30)), ("day", date(2025, 1, 31)),
+        ("day", date(2025, 4, 1)), ("day", date(2025, 4, 2)),
+    ]
+
+    # five years, month granularity → tens of keys, not thousands
+    assert len(cover(date(2020, 3, 15), date(2025, 3, 14), "year")) < 60
+
+
+def test_same_day_events_count_once_at_every_level(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="America/Phoenix")
+    habit = habit_factory(user_id=user.id)
+
+    event_factory(habit_id=habit.id, occurred_at_utc=_phx(2025, 9, 1, 8))
+    event_factory(habit_id=habit.id, occurred_at_utc=_phx(2025, 9, 1, 20))
+    event_factory(habit_id=habit.id, occurred_at_utc=_phx(2025, 9, 2))
+
+    rows = {
+        (r.level, r.period_start): r.completions
+        for r in db_session.query(HabitRollupORM).filter(HabitRollupORM.habit_id == habit.id)
+    }
+    assert rows[("day", date(2025, 9, 1))] == 1
+    assert rows[("week", date(2025, 9, 1))] == 2
+    assert rows[("month", date(2025, 9, 1))] == 2
+    assert rows[("year", date(2025, 1, 1))] == 2
+
+    user_year = db_session.query(UserRollupORM).filter(
+        UserRollupORM.user_id == user.id, UserRollupORM.level == "year"
+    ).one()
+    assert user_year.completions == 2
+
+
+def test_trend_months_and_habit_scope(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="America/Phoenix")
+    h1 = habit_factory(user_id=user.id, name="A")
+    h2 = habit_factory(user_id=user.id, name="B")
+
+    for d in (1, 2, 3):
+        event_factory(habit_id=h1.id, occurred_at_utc=_phx(2024, 1, d))
+    event_factory(habit_id=h2.id, occurred_at_utc=_phx(2024, 2, 10))
+    event_factory(habit_id=h2.id, occurred_at_utc=_phx(2025, 6, 30))
+
+    out = trend(db_session, user_id=user.id, start=date(2024, 1, 1), end=date(2025, 12, 31), granularity="month")
+    assert len(out) == 24
+    assert out[0]["period_start"] == "2024-01-01"
+    assert out[0]["completions"] == 3
+    assert out[0]["opportunities"] == 2 * 31
+    assert out[1]["completions"] == 1
+    assert sum(b["completions"] for b in out) == 5
+
+    years = trend(db_session, user_id=user.id, start=date(2024, 1, 2), end=date(2025, 12, 31),
+                  granularity="year", habit_id=h1.id)
+    assert [b["completions"] for b in years] == [2, 0]   # Jan 1 is outside the range
+    assert years[0]["days"] == 365
+
+
+def _user_rows(db_session, user_id):
+    return {
+        (r.level, r.period_start): r.completions
+        for r in db_session.query(UserRollupORM).filter(UserRollupORM.user_id == user_id)
+    }
+
+
+def test_deleting_a_habit_subtracts_its_rollups(db_session, user_factory, habit_factory, event_factory, monkeypatch):
+    from app import crud
+    from app.services import aggregates
+
+    user = user_factory(timezone="America/Phoenix")
+    keep, drop = habit_factory(user_id=user.id, name="keep"), habit_factory(user_id=user.id, name="drop")
+    for d in (1, 2):
+        event_factory(habit_id=keep.id, occurred_at_utc=_phx(2025, 9, d))
+    for d in (2, 3):
+        event_factory(habit_id=drop.id, occurred_at_utc=_phx(2025, 9, d))
+    event_factory(habit_id=drop.id, occurred_at_utc=_phx(2024, 5, 1))
+
+    monkeypatch.setattr(aggregates, "rebuild_user", lambda *a, **k: pytest.fail("no replay on delete"))
+    assert crud.habits.delete(db_session, habit_id=drop.id, user_id=user.id)
+    db_session.expire_all()
+
+    rows = _user_rows(db_session, user.id)
+    assert rows[("day", date(2025, 9, 2))] == 1 and ("day", date(2025, 9, 3)) not in rows
+    assert rows[("year", date(2025, 1, 1))] == 2 and ("year", date(2024, 1, 1)) not in rows
+    assert db_session.query(HabitRollupORM).filter(HabitRollupORM.habit_id == drop.id).count() == 0
+
+
+def test_nightly_job_replays_only_drifted_users(db_session, user_factory, habit_factory, event_factory, monkeypatch):
+    from sqlalchemy.orm import Session
+    from app.services import aggregates, jobs
+
+    clean, drifted = (user_factory(timezone="America/Phoenix") for _ in range(2))
+    for u in (clean, drifted):
+        h = habit_factory(user_id=u.id)
+        event_factory(habit_id=h.id, occurred_at_utc=_phx(2025, 9, 1))
+    db_session.query(UserRollupORM).filter(UserRollupORM.user_id == drifted.id).delete()
+    db_session.commit()
+
+    replayed = []
+    rebuild = aggregates.rebuild_user
+
+    def spy(session, user_id, names=None):
+        replayed.append(user_id)
+        return rebuild(session, user_id, names)
+
+    monkeypatch.setattr(aggregates, "rebuild_user", spy)
+    run = jobs.run_job("rollups:rebuild", session_factory=lambda: Session(db_session.get_bind()))
+    assert run["status"] == "ok"
+    assert drifted.id in replayed and clean.id not in replayed
+    db_session.expire_all()
+    assert _user_rows(db_session, drifted.id)[("year", date(2025, 1, 1))] == 1
@@ -0,0 +1,81 @@
+# tests/test_sketches.py
+from datetime import date, datetime, timezone
+from statistics import median
+from zoneinfo import ZoneInfo
+
+from app.db import HabitTimeSketchORM
+from app.services.features import build_daily_features
+from app.services.sketches import TimeOfDaySketch, load_sketches, recent_sketches
+
+PHX = ZoneInfo("America/Phoenix")
+
+
+def _phx(y, m, d, h, mi=0):
+    return datetime(y, m, d, h, mi, tzinfo=PHX).astimezone(timezone.utc)
+
+
+def test_sketch_quantiles_match_exact_median_on_bin_edges():
+    hours = [6, 7, 7, 8, 9, 21]
+    sk = TimeOfDaySketch.from_times(datetime(2025, 1, 1, h) for h in hours)
+    assert sk.count == 6
+    assert sk.quantile(0.5) == median(hours) * 60
+    assert sk.quantile(0.0) == 6 * 60
+    assert sk.quantile(1.0) == 21 * 60
+    assert TimeOfDaySketch().quantile(0.5) is None
+
+    merged = TimeOfDaySketch.from_times([datetime(2025, 1, 1, 6)]).merge(
+        TimeOfDaySketch.from_times([datetime(2025, 1, 1, 10, 40)])
+    )
+    assert merged.summary() == {"p10": "06:27", "median": "08:15", "p90": "10:03"}  # 10:40 → 10:30 bin
+
+
+def test_sketches_maintained_on_insert_and_windowed_by_week(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="America/Phoenix")
+    habit = habit_factory(user_id=user.id)
+
+    event_factory(habit_id=habit.id, occurred_at_utc=_phx(2025, 9, 1, 7))    # Mon, week of 9/1
+    event_factory(habit_id=habit.id, occurred_at_utc=_phx(2025, 9, 3, 8))
+    event_factory(habit_id=habit.id, occurred_at_utc=_phx(2025, 9, 22, 20))  # week of 9/22
+
+    rows = {
+        r.period: r for r in
+        db_session.query(HabitTimeSketchORM).filter(HabitTimeSketchORM.habit_id == habit.id)
+    }
+    assert set(rows) == {"all", "2025-09-01", "2025-09-22"}
+    assert rows["all"].tz == "America/Phoenix"
+    assert sum(rows["all"].bins) == 3
+
+    lifetime = load_sketches(db_session, [habit.id])[habit.id]
+    assert lifetime.quantile(0.5) == 8 * 60
+
+    early = load_sketches(db_session, [habit.id], since=date(2025, 9, 2), until=date(2025, 9, 10))[habit.id]
+    assert early.count == 1   # only the days asked for, though the week of 9/1 is partial
+
+    # Sub-week and week-aligned ranges are exact as well
+    assert load_sketches(db_session, [habit.id], since=date(2025, 9, 3), until=date(2025, 9, 3))[habit.id].count == 1
+    assert load_sketches(db_session, [habit.id], since=date(2025, 9, 1), until=date(2025, 9, 7))[habit.id].count == 2
+    assert load_sketches(db_session, [habit.id], since=date(2025, 8, 25), until=date(2025, 9, 2))[habit.id].count == 1
+    assert habit.id not in load_sketches(db_session, [habit.id], since=date(2025, 9, 4), until=date(2025, 9, 21))
+
+    recent = recent_sketches(db_session, [habit.id], today=date(2025, 9, 24), weeks=1)[habit.id]
+    assert recent.summary()["median"] == "20:00"
+
+    # sketches filled in another zone are not reused
+    assert load_sketches(db_session, [habit.id], tz="UTC") == {}
+
+
+def test_features_use_sketch_quantiles_and_fall_back_across_zones(db_session, user_factory, habit_factory, event_factory):
+    user = user_factory(timezone="America/Phoenix")
+    habit = habit_factory(user_id=user.id)
+    for d, h in ((1, 6), (2, 7), (3, 9)):
+        event_factory(habit_id=habit.id, occurred_at_utc=_phx(2025, 9, d, h))
+
+    event_factory(habit_id=habit.id, occurred_at_utc=_phx(2025, 9, 5, 22))   # same ISO week, after the range
+
+    rows = build_daily_features(db_session, user.id, date(2025, 9, 3), date(2025, 9, 3), tz_name="America/Phoenix")
+    assert rows[0].completion_median_min == 7 * 60
+    assert rows[0].completion_p10_min < rows[0].completion_median_min < rows[0].completion_p90_min
+
+    # Features built in UTC re-derive from the loaded events (Phoenix is UTC-7)
+    utc_rows = build_daily_features(db_session, user.id, date(2025, 9, 3), date(2025, 9, 3), tz_name="UTC")
+    assert utc_rows[0].completion_median_min == 14 * 60
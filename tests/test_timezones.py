@@ -0,0 +1,46 @@
+# tests/test_timezones.py
+import random
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.core.timezones import DEFAULT_USER_TZ, day_bounds_utc, get_zone, local_day_ordinals, local_days, zone_table
+
+
+@pytest.mark.parametrize("name", ["America/New_York", "America/Santiago", "Australia/Lord_Howe", "Asia/Kolkata"])
+def test_batch_conversions_match_zoneinfo(name):
+    z = ZoneInfo(name)
+    rng = random.Random(7)
+    epochs = [rng.randint(0, 3_000_000_000) for _ in range(2000)]
+    assert list(local_day_ordinals(epochs, name)) == \
+        [datetime.fromtimestamp(e, z).date().toordinal() for e in epochs]
+
+    # Santiago switches at local midnight, so some days start at 01:00 or repeat 23:00
+    days = [date(2015, 1, 1) + timedelta(days=i) for i in range(3 * 366)]
+    for d, (start, end) in zip(days, day_bounds_utc(days, name)):
+        assert start == datetime(d.year, d.month, d.day, tzinfo=z).astimezone(timezone.utc)
+        nxt = d + timedelta(days=1)
+        assert end == datetime(nxt.year, nxt.month, nxt.day, tzinfo=z).astimezone(timezone.utc)
+
+
+def test_registry_is_cached_and_falls_back():
+    assert get_zone("Europe/Paris") is get_zone("Europe/Paris")
+    assert zone_table("Europe/Paris") is zone_table(get_zone("Europe/Paris"))
+    assert get_zone("Not/AZone").key == DEFAULT_USER_TZ
+    assert get_zone(None).key == DEFAULT_USER_TZ
+    assert get_zone(None, "UTC").key == "UTC"
+    # Naive datetimes are taken as UTC; instants past the table still convert
+    assert local_days([datetime(2025, 3, 9, 3), datetime(2099, 7, 1, 3, tzinfo=timezone.utc)], "America/New_York") == \
+        [date(2025, 3, 8), date(2099, 6, 30)]
+
+
+def test_services_share_one_default_zone(db_session, user_factory):
+    from app.services import aggregates, analytics
+    from app.services.features import feature_tz_name
+
+    user = user_factory(timezone_str=None)
+    assert feature_tz_name(db_session, user.id) == DEFAULT_USER_TZ
+    assert analytics._user_tz(db_session, user.id).key == DEFAULT_USER_TZ
+    assert aggregates._zone(None).key == DEFAULT_USER_TZ
+    assert aggregates._zone("Not/AZone").key == DEFAULT_USER_TZ
@@ -0,0 +1,47 @@
+# tests/test_training.py
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.services import training
+from app.services.training import iter_examples, parse_horizons
+
+
+def _at(d: int) -> datetime:
+    return datetime(2025, 9, d, 9, tzinfo=timezone.utc)
+
+
+def test_labels_come_from_later_days_in_one_read(db_session, user_factory, habit_factory, event_factory, monkeypatch):
+    user = user_factory(timezone="UTC")
+    habit = habit_factory(user_id=user.id)
+    for d in (2, 3, 8, 9):
+        event_factory(habit_id=habit.id, occurred_at_utc=_at(d))
+
+    reads = []
+    real = training.load_feature_columns
+    monkeypatch.setattr(training, "load_feature_columns", lambda *a, **k: reads.append(a[2:4]) or real(*a, **k))
+
+    examples = list(iter_examples(db_session, [user.id], date(2025, 9, 1), date(2025, 9, 5),
+                                  horizons=(1, 7), label_through=date(2025, 9, 30)))
+    assert reads == [(date(2025, 9, 1), date(2025, 9, 12))]
+    assert [e.day.day for e in examples] == [1, 2, 3, 4, 5]
+    assert [e.labels[1] for e in examples] == [True, True, False, False, False]
+    assert [e.labels[7] for e in examples] == [True, True, False, False, False]
+    assert examples[2].features["current_streak"] == 2 and examples[2].features["rate_7d"] == round(2 / 7, 4)
+
+    row = json.loads(examples[0].to_json())
+    assert row["label_1d"] == 1 and row["label_7d"] == 1 and row["split"] is None
+
+
+def test_time_split_embargoes_rows_whose_labels_cross_the_cutoff(db_session, user_factory, habit_factory):
+    user = user_factory(timezone="UTC")
+    habit_factory(user_id=user.id)
+    examples = list(iter_examples(db_session, [user.id], date(2025, 9, 1), date(2025, 9, 20),
+                                  horizons=(1, 7), validation_from=date(2025, 9, 10),
+                                  label_through=date(2025, 9, 25)))
+    split = {e.day.day: e.split for e in examples}
+    assert [d for d, s in split.items() if s == "train"] == [1, 2]       # d + 7 < Sep 10
+    assert [d for d, s in split.items() if s == "validation"] == list(range(10, 19))   # labels known through Sep 25
+    with pytest.raises(ValueError):
+        parse_horizons("0,1")